@@ -1,11 +1,20 @@
 import streamlit as st
-import matplotlib.pyplot as plt
-import matplotlib.patches as patches
-import numpy as np
-import string
-from shapely.geometry import Polygon
 from streamlit_autorefresh import st_autorefresh
 
+from orapa import metrics
+
+# Moduły gry (numpy, tablice położeń, komponenty, magazyn) importujemy
+# dopiero za lobby – ekran wyboru pokoju ich nie potrzebuje, a świeży
+# proces serwera pokazuje go szybciej. Patrz "python -m orapa.bench startup".
+
+# st.experimental_rerun zostało w nowszym Streamlit zastąpione przez st.rerun
+rerun = getattr(st, "rerun", None) or st.experimental_rerun
+
+# Co ile sekund sprawdzamy, czy w pokoju coś się zmieniło. Z działającym
+# powiadamianiem (orapa.hub) to tylko zabezpieczenie, więc rzadko.
+ROOM_POLL_INTERVAL = 1.5
+ROOM_PUSH_FALLBACK_INTERVAL = 15
+
 # ---------------------------------------------------------
 # Konfiguracja plansz (dwa widoki)
 # ---------------------------------------------------------
@@ -20,55 +29,10 @@ BOARD_CONFIGS = {
     },
 }
 
-# Ikony kolorów (dla przycisków)
-Y_ICON = "🟨"   # żółty trójkąt
-W_ICON = "⬜"   # białe figury + przezroczysty trójkąt
-B_ICON = "🟦"   # niebieski trójkąt + jasnoniebieski kwadrat
-R_ICON = "🟥"   # czerwony równoległobok
-
-ROWS = 8
-COLS = 10
-
 
 # ---------------------------------------------------------
-# Stan JEDNEJ planszy
+# Plansze gracza
 # ---------------------------------------------------------
-def make_single_board():
-    return {
-        # Żółty trójkąt
-        "y_cx": 3.0,
-        "y_cy": 3.0,
-        "y_ori": 0,
-        # Biały trójkąt
-        "w_cx": 3.0,
-        "w_cy": 5.0,
-        "w_ori": 0,
-        # Niebieski trójkąt
-        "b_cx": 7.0,
-        "b_cy": 3.0,
-        "b_ori": 0,
-        # Biały kwadrat (romb)
-        "s_cx": 6.0,
-        "s_cy": 6.0,
-        "s_ori": 0,
-        # Czerwony równoległobok
-        "r_cx": 4.0,
-        "r_cy": 2.0,
-        "r_ori": 0,
-        "r_flip": False,
-        # Przezroczysty trójkąt (hyp = 2)
-        "t2_cx": 2.0,
-        "t2_cy": 2.0,
-        "t2_ori": 0,
-        # Jasnoniebieski kwadrat 1x1
-        "lb_x": 1.0,
-        "lb_y": 1.0,
-        # Status sprawdzania
-        "layout_valid": None,
-        "layout_msg": "",
-    }
-
-
 def make_empty_boards():
     """Dwie plansze: Twoja + Twoje zgadywanie przeciwnika (obie prywatne)."""
     return {
@@ -78,73 +42,52 @@ def make_empty_boards():
 
 
 # ---------------------------------------------------------
-# Globalny magazyn POKOI (wspólny tylko dla czatu i stanu gry)
-# rooms = {
-#   room_code: {
-#       "chat": [...],
-#       "players": {
-#           nickname: {
-#               "ready": bool,
-#               "green_locked": dict | None
-#           },
+# Magazyn POKOI (wspólny dla czatu i stanu gry) – SQLite w orapa.db,
+# patrz orapa.store. Pokój w pamięci ma kształt:
+# {
+#   "chat": [...],
+#   "players": {
+#       nickname: {
+#           "ready": bool,
+#           "green_locked": Board | None,   # orapa.board
+#           "answers": [36 x int] | None,   # odpowiedzi na strzały
+#           "probes": [{"entry", "answer"}, ...]
 #       },
-#       "game_over": bool,
-#       "winner": str | None
-#   }
+#   },
+#   "game_over": bool,
+#   "winner": str | None,
+#   "version": int                      # podbijany przy każdej zmianie
 # }
+# Zmiany idą wyłącznie przez metody magazynu (zapis do bazy w tle).
 # ---------------------------------------------------------
 @st.cache_resource
-def get_rooms():
-    return {}
-
-
-rooms = get_rooms()
-
-
-def ensure_room(room_code: str):
-    if room_code not in rooms:
-        rooms[room_code] = {
-            "chat": [],
-            "players": {},
-            "game_over": False,
-            "winner": None,
-        }
-    return rooms[room_code]
-
-
-def ensure_player_entry(room_data, nickname: str):
-    players = room_data.setdefault("players", {})
-    if nickname not in players:
-        players[nickname] = {
-            "ready": False,
-            "green_locked": None,
-        }
-    return players[nickname]
-
-
-def boards_equal(b1, b2, tol=1e-6):
-    """Porównuje dwa stany planszy (pozycje/obroty figur)."""
-    if b1 is None or b2 is None:
-        return False
-    keys = [
-        "y_cx", "y_cy", "y_ori",
-        "w_cx", "w_cy", "w_ori",
-        "b_cx", "b_cy", "b_ori",
-        "s_cx", "s_cy", "s_ori",
-        "r_cx", "r_cy", "r_ori", "r_flip",
-        "t2_cx", "t2_cy", "t2_ori",
-        "lb_x", "lb_y",
-    ]
-    for k in keys:
-        v1 = b1.get(k)
-        v2 = b2.get(k)
-        if isinstance(v1, float) or isinstance(v2, float):
-            if v1 is None or v2 is None or abs(v1 - v2) > tol:
-                return False
-        else:
-            if v1 != v2:
-                return False
-    return True
+def get_store():
+    return RoomStore()
+
+
+@st.cache_resource
+def get_hub():
+    return RoomHub(get_store())
+
+
+# Pomiary (orapa.metrics): liczniki zawsze, czasy sekcji tylko w przebiegach
+# wylosowanych z ORAPA_METRICS_SAMPLE; tekst Prometheusa pod
+# http://…:ORAPA_METRICS_PORT/metrics, gdy port jest ustawiony.
+@st.cache_resource
+def get_metrics():
+    store = get_store()
+    hub = get_hub()
+    metrics.add_gauge(metrics.process_stats)
+    metrics.add_gauge(store.room_stats)
+    metrics.add_gauge(lambda: [(f"orapa_store_{k}", {}, v) for k, v in store.stats().items()])
+    metrics.add_gauge(lambda: [("orapa_hub_wakeups", {}, hub.wakeups),
+                               ("orapa_hub_skipped_running", {}, hub.skipped)])
+    if metrics.METRICS_PORT:
+        metrics.REGISTRY.serve(metrics.METRICS_PORT)
+    return metrics.REGISTRY
+
+
+metrics.begin_run()
 
 
 # ---------------------------------------------------------
@@ -200,21 +143,99 @@ if not nick_clean:
 st.session_state.nickname = nick_clean
 nickname = st.session_state.nickname
 
-# Autoodświeżanie całej appki co 1.5 s (czat + stan gry)
-st_autorefresh(interval=1500, key="chat_autorefresh")
+# ---------------------------------------------------------
+# Moduły gry – dopiero teraz (patrz importy na górze)
+# ---------------------------------------------------------
+from orapa.board import Board  # noqa: E402
+from orapa.components import board_actions, board_view, chat_view, heat_overlay  # noqa: E402
+from orapa.deduce import CANDIDATES_PATH, Deduction  # noqa: E402
+from orapa.engine import boards_equal  # noqa: E402
+from orapa.events import encode_board, encode_moves  # noqa: E402
+from orapa.geometry import PIECE_STYLES, make_single_board  # noqa: E402
+from orapa.legality import PIECE_NAMES, check_layout  # noqa: E402
+from orapa.placements import PIECES, get_tables  # noqa: E402
+from orapa.rays import ENTRY_LABELS, answer_table, describe_answer, probe  # noqa: E402
+from orapa.solver import random_layouts  # noqa: E402
+from orapa.hub import RoomHub, current_session_id  # noqa: E402
+from orapa.store import RoomStore  # noqa: E402
+
+store = get_store()
+hub = get_hub()
+get_metrics()
+
+
+# Zbiór kandydatów do dedukcji (orapa.deduce) – tylko gdy plik istnieje
+# i ma policzone odpowiedzi; pliki są mapowane, wspólne dla wszystkich sesji.
+@st.cache_resource
+def get_deduction():
+    try:
+        return Deduction.open(CANDIDATES_PATH, build=False)
+    except (OSError, ValueError):
+        return None
+
+
+HEAT_OFF = "wyłączona"
+HEAT_ALL = "wszystkie figury"
+
+
+def session_deduction(probes):
+    """Kandydaci po strzałach gracza; kolejne strzały zawężają zbiór z sesji."""
+    base = get_deduction()
+    if base is None:
+        return None
+    probes = [(p["entry"], p["answer"]) for p in probes]
+    ded = st.session_state.get("deduction")
+    try:
+        if ded is None:
+            raise ValueError
+        ded.extend(probes)
+    except ValueError:
+        ded = base.fork().extend(probes)
+    st.session_state.deduction = ded
+    return ded
 
 # ---------------------------------------------------------
 # Inicjalizacja pokoju i gracza
 # ---------------------------------------------------------
-room_data = ensure_room(room_code)
-player_entry = ensure_player_entry(room_data, nickname)
+with metrics.span("room"):
+    room_data = store.room(room_code)
+    player_entry = store.ensure_player(room_code, nickname)
 players = room_data["players"]
+metrics.inc("orapa_reruns_total", room=room_code)
+metrics.inc("orapa_session_reruns_total", session=current_session_id() or nickname)
+
+# Wersja pokoju, którą ten przebieg rysuje. Jeśli coś zmieni ją w trakcie
+# przebiegu, następne sprawdzenie i tak wywoła pełne odświeżenie.
+st.session_state.rendered_version = room_data["version"]
+hub.subscribe(room_code, current_session_id(), room_data["version"])
+
+# ---------------------------------------------------------
+# Odświeżanie: zmiany w pokoju budzą sesję przez hub (orapa.hub). Dodatkowo
+# co ROOM_POLL_INTERVAL (albo rzadziej, gdy hub działa) sprawdzamy tylko
+# licznik wersji pokoju (mały fragment), a cały skrypt puszczamy dopiero,
+# gdy się zmienił. Starszy Streamlit bez st.fragment – st_autorefresh całej
+# appki; czat i tak wysyła wtedy tylko nowe wiadomości.
+# ---------------------------------------------------------
+poll_interval = ROOM_PUSH_FALLBACK_INTERVAL if hub.enabled else ROOM_POLL_INTERVAL
+
+if hasattr(st, "fragment"):
+    @st.fragment(run_every=poll_interval)
+    def watch_room():
+        get_store().touch_player(room_code, nickname)     # sygnał życia gracza
+        metrics.inc("orapa_room_polls_total")
+        if get_store().room(room_code)["version"] != st.session_state.get("rendered_version"):
+            rerun()
+
+    watch_room()
+else:
+    st_autorefresh(interval=int(poll_interval * 1000), key="chat_autorefresh")
 
 # ---------------------------------------------------------
 # Inicjalizacja prywatnych plansz w sesji
 # ---------------------------------------------------------
 if "boards" not in st.session_state:
     st.session_state.boards = make_empty_boards()
+    store.log_event(room_code, "i", nickname)
 
 if "current_board" not in st.session_state:
     st.session_state.current_board = "zielona"
@@ -226,369 +247,26 @@ state = boards[board_key]
 BG_COLOR = BOARD_CONFIGS[board_key]["bg"]
 board_title = BOARD_CONFIGS[board_key]["label"]
 
+# Ruchy figur to odczyty z tablicy przejść (orapa.placements)
+tables = get_tables()
+
 # Sterowanie figurami:
 # - na zielonej planszy blokujemy edycję po START (ready=True)
 # - na fioletowej planszy zawsze można edytować (zgadywanie)
 controls_enabled = not (board_key == "zielona" and player_entry["ready"])
 
-
-# ---------------------------------------------------------
-# Geometria figur (bazowa w (0,0))
-# ---------------------------------------------------------
-BASE_YELLOW = np.array([
-    [-1.0, -1.0],
-    [ 1.0, -1.0],
-    [-1.0,  1.0],
-])
-
-BASE_SMALL_TRI = np.array([
-    [-2.0,  0.0],
-    [ 2.0,  0.0],
-    [ 0.0,  2.0],
-])
-
-BASE_SQUARE_DIAMOND = np.array([
-    [-1.0,  0.0],
-    [ 0.0, -1.0],
-    [ 1.0,  0.0],
-    [ 0.0,  1.0],
-])
-
-SCALE_TRI2 = 0.9
-BASE_TRI_HYP2 = SCALE_TRI2 * np.array([
-    [-1.0, 0.0],
-    [ 1.0, 0.0],
-    [ 0.0, 1.0],
-])
-
-BASE_PAR_INT = np.array([
-    [0.0, 0.0],
-    [2.0, 0.0],
-    [3.0, 1.0],
-    [1.0, 1.0],
-])
-
-ROT_MATS = [
-    np.array([[1.0, 0.0],
-              [0.0, 1.0]]),
-    np.array([[0.0, -1.0],
-              [1.0,  0.0]]),
-    np.array([[-1.0,  0.0],
-              [ 0.0, -1.0]]),
-    np.array([[ 0.0, 1.0],
-              [-1.0, 0.0]]),
-]
-
-
-def yellow_vertices(cx, cy, ori):
-    M = ROT_MATS[ori % 4]
-    offs = BASE_YELLOW @ M.T
-    return offs + np.array([cx, cy])
-
-
-def small_tri_vertices(cx, cy, ori):
-    M = ROT_MATS[ori % 4]
-    offs = BASE_SMALL_TRI @ M.T
-    return offs + np.array([cx, cy])
-
-
-def square_diamond_vertices(cx, cy, ori):
-    M = ROT_MATS[ori % 4]
-    offs = BASE_SQUARE_DIAMOND @ M.T
-    return offs + np.array([cx, cy])
-
-
-def tri_hyp2_vertices(cx, cy, ori):
-    M = ROT_MATS[ori % 4]
-    offs = BASE_TRI_HYP2 @ M.T
-    return offs + np.array([cx, cy])
-
-
-def red_vertices(rx, ry, ori, flip):
-    base = BASE_PAR_INT.copy()
-    if flip:
-        base[:, 0] *= -1.0
-    M = ROT_MATS[ori % 4]
-    offs = base @ M.T
-    return offs + np.array([rx, ry])
-
-
-def lightblue_vertices(lx, ly):
-    base = np.array([
-        [0.0, 0.0],
-        [1.0, 0.0],
-        [1.0, 1.0],
-        [0.0, 1.0],
-    ])
-    return base + np.array([lx, ly])
-
-
-def clamp_center(cx, cy, ori, vertex_func):
-    verts = vertex_func(cx, cy, ori)
-    minx, maxx = verts[:, 0].min(), verts[:, 0].max()
-    miny, maxy = verts[:, 1].min(), verts[:, 1].max()
-
-    if minx < 0:
-        cx += -minx
-    if maxx > COLS:
-        cx -= (maxx - COLS)
-
-    verts = vertex_func(cx, cy, ori)
-    miny, maxy = verts[:, 1].min(), verts[:, 1].max()
-
-    if miny < 0:
-        cy += -miny
-    if maxy > ROWS:
-        cy -= (maxy - ROWS)
-
-    return float(cx), float(cy)
-
-
-def clamp_parallelogram(rx, ry, ori, flip):
-    verts = red_vertices(rx, ry, ori, flip)
-    minx, maxx = verts[:, 0].min(), verts[:, 0].max()
-    miny, maxy = verts[:, 1].min(), verts[:, 1].max()
-
-    if minx < 0:
-        rx += -minx
-    if maxx > COLS:
-        rx -= (maxx - COLS)
-
-    verts = red_vertices(rx, ry, ori, flip)
-    miny, maxy = verts[:, 1].min(), verts[:, 1].max()
-
-    if miny < 0:
-        ry += -miny
-    if maxy > ROWS:
-        ry -= (maxy - ROWS)
-
-    return float(round(rx)), float(round(ry))
-
-
-def clamp_lightblue(lx, ly):
-    verts = lightblue_vertices(lx, ly)
-    minx, maxx = verts[:, 0].min(), verts[:, 0].max()
-    miny, maxy = verts[:, 1].min(), verts[:, 1].max()
-
-    if minx < 0:
-        lx += -minx
-    if maxx > COLS:
-        lx -= (maxx - COLS)
-    if miny < 0:
-        ly += -miny
-    if maxy > ROWS:
-        ly -= (maxy - ROWS)
-
-    return float(lx), float(ly)
-
-
-# ---------------------------------------------------------
-# Poligony i sprawdzanie ułożenia (dla JEDNEJ planszy/state)
-# ---------------------------------------------------------
-def get_all_polygons(state):
-    shapes = []
-
-    shapes.append(("Żółty trójkąt",
-                   Polygon(yellow_vertices(state["y_cx"],
-                                           state["y_cy"],
-                                           state["y_ori"]))))
-
-    shapes.append(("Biały trójkąt",
-                   Polygon(small_tri_vertices(state["w_cx"],
-                                              state["w_cy"],
-                                              state["w_ori"]))))
-
-    shapes.append(("Niebieski trójkąt",
-                   Polygon(small_tri_vertices(state["b_cx"],
-                                              state["b_cy"],
-                                              state["b_ori"]))))
-
-    shapes.append(("Biały kwadrat",
-                   Polygon(square_diamond_vertices(state["s_cx"],
-                                                   state["s_cy"],
-                                                   state["s_ori"]))))
-
-    shapes.append(("Czerwony równoległobok",
-                   Polygon(red_vertices(state["r_cx"],
-                                        state["r_cy"],
-                                        state["r_ori"],
-                                        state["r_flip"]))))
-
-    shapes.append(("Przezroczysty trójkąt",
-                   Polygon(tri_hyp2_vertices(state["t2_cx"],
-                                             state["t2_cy"],
-                                             state["t2_ori"]))))
-
-    shapes.append(("Jasnoniebieski kwadrat",
-                   Polygon(lightblue_vertices(state["lb_x"],
-                                              state["lb_y"]))))
-
-    fixed = []
-    for name, poly in shapes:
-        if not poly.is_valid:
-            poly = poly.buffer(0)
-        fixed.append((name, poly))
-    return fixed
-
-
-def check_layout(state):
-    shapes = get_all_polygons(state)
-    eps_area = 1e-6
-
-    for i in range(len(shapes)):
-        name_i, poly_i = shapes[i]
-        for j in range(i + 1, len(shapes)):
-            name_j, poly_j = shapes[j]
-
-            inter = poly_i.intersection(poly_j)
-            if inter.is_empty:
-                continue
-
-            geoms = [inter]
-            if inter.geom_type == "GeometryCollection":
-                geoms = list(inter.geoms)
-
-            # 1) Nachodzenie (pole > 0)
-            for g in geoms:
-                if g.geom_type in ("Polygon", "MultiPolygon") and g.area > eps_area:
-                    return False, f"Figury {name_i} i {name_j} nachodzą na siebie."
-
-            # 2) Styk bokami (odcinki)
-            for g in geoms:
-                if g.geom_type in ("LineString", "MultiLineString"):
-                    return False, f"Figury {name_i} i {name_j} stykają się bokami."
-
-            # 3) Więcej niż jeden punkt wspólny
-            point_count = 0
-            for g in geoms:
-                if g.geom_type == "Point":
-                    point_count += 1
-                elif g.geom_type == "MultiPoint":
-                    point_count += len(g.geoms)
-
-            if point_count > 1:
-                return False, f"Figury {name_i} i {name_j} mają więcej niż jeden punkt wspólny."
-
-    return True, "Ułożenie jest poprawne – figury nie nachodzą na siebie i nie stykają się bokami."
-
-
-# ---------------------------------------------------------
-# Rysowanie planszy
-# ---------------------------------------------------------
-def draw_board(state, bg_color):
-    fig, ax = plt.subplots(figsize=(4.5, 4))
-
-    fig.patch.set_facecolor(bg_color)
-    ax.set_facecolor(bg_color)
-
-    ax.set_xlim(-0.5, COLS + 0.5)
-    ax.set_ylim(-0.5, ROWS + 0.5)
-
-    for x in range(COLS + 1):
-        ax.plot([x, x], [0, ROWS], color="white", linewidth=1, zorder=0)
-    for y in range(ROWS + 1):
-        ax.plot([0, COLS], [y, y], color="white", linewidth=1, zorder=0)
-
-    def row_y(r):
-        return ROWS - 0.5 - r
-
-    for x in range(COLS):
-        ax.text(
-            x + 0.5, ROWS + 0.45, str(x + 1),
-            ha="center", va="center", color="white", fontsize=12, zorder=0
-        )
-
-    bottom_labels = list(string.ascii_uppercase[8:8 + COLS])
-    for x, label in enumerate(bottom_labels):
-        ax.text(
-            x + 0.5, -0.45, label,
-            ha="center", va="center", color="white", fontsize=12, zorder=0
-        )
-
-    left_labels = list(string.ascii_uppercase[:ROWS])
-    for r, label in enumerate(left_labels):
-        ax.text(
-            -0.45, row_y(r), label,
-            ha="center", va="center", color="white", fontsize=12, zorder=0
-        )
-
-    for r in range(ROWS):
-        ax.text(
-            COLS + 0.45, row_y(r), str(11 + r),
-            ha="center", va="center", color="white", fontsize=12, zorder=0
-        )
-
-    # Figury
-
-    # Żółty
-    verts_y = yellow_vertices(state["y_cx"], state["y_cy"], state["y_ori"])
-    tri_y = patches.Polygon(
-        verts_y, closed=True,
-        facecolor="yellow", edgecolor="yellow",
-        alpha=1.0, zorder=3
-    )
-    ax.add_patch(tri_y)
-
-    # Biały trójkąt
-    verts_w = small_tri_vertices(state["w_cx"], state["w_cy"], state["w_ori"])
-    tri_w = patches.Polygon(
-        verts_w, closed=True,
-        facecolor="white", edgecolor="white",
-        alpha=1.0, zorder=3
-    )
-    ax.add_patch(tri_w)
-
-    # Niebieski trójkąt
-    verts_b = small_tri_vertices(state["b_cx"], state["b_cy"], state["b_ori"])
-    tri_b = patches.Polygon(
-        verts_b, closed=True,
-        facecolor="blue", edgecolor="blue",
-        alpha=1.0, zorder=3
-    )
-    ax.add_patch(tri_b)
-
-    # Biały romb
-    verts_s = square_diamond_vertices(state["s_cx"], state["s_cy"], state["s_ori"])
-    sq = patches.Polygon(
-        verts_s, closed=True,
-        facecolor="white", edgecolor="white",
-        alpha=1.0, zorder=3
-    )
-    ax.add_patch(sq)
-
-    # Czerwony równoległobok
-    verts_r = red_vertices(
-        state["r_cx"], state["r_cy"],
-        state["r_ori"], state["r_flip"]
-    )
-    par = patches.Polygon(
-        verts_r, closed=True,
-        facecolor="red", edgecolor="red",
-        alpha=1.0, zorder=3
-    )
-    ax.add_patch(par)
-
-    # Przezroczysty trójkąt (hyp=2) – wypełnienie w kolorze tła
-    verts_t2 = tri_hyp2_vertices(state["t2_cx"], state["t2_cy"], state["t2_ori"])
-    tri2 = patches.Polygon(
-        verts_t2, closed=True,
-        facecolor=bg_color, edgecolor="white",
-        linewidth=4.0, alpha=1.0, zorder=3
-    )
-    ax.add_patch(tri2)
-
-    # Jasnoniebieski kwadrat 1x1
-    verts_lb = lightblue_vertices(state["lb_x"], state["lb_y"])
-    sq_lb = patches.Polygon(
-        verts_lb, closed=True,
-        facecolor="#66c2ff", edgecolor="#66c2ff",
-        alpha=1.0, zorder=3
-    )
-    ax.add_patch(sq_lb)
-
-    ax.axis("off")
-    fig.tight_layout()
-    return fig
+# Ruchy z planszy przychodzą paczką (klawiatura/przeciąganie/pasek) – wykonujemy
+# je tu, przed rysowaniem, przez te same przejścia co dawne przyciski.
+batch = board_actions(st.session_state.get("board_view"), st.session_state.get("board_batch"))
+if batch is not None:
+    st.session_state.board_batch, actions = batch
+    if controls_enabled:
+        with metrics.span("actions"):
+            for piece, action in actions:
+                tables.step(state, piece, action)
+        if actions:
+            store.log_event(room_code, "m", nickname, encode_moves(board_key, actions))
+        metrics.inc("orapa_piece_actions_total", len(actions))
 
 
 # ---------------------------------------------------------
@@ -617,12 +295,9 @@ def send_message():
         return
 
     room_code_local = st.session_state.room_code
-    rooms_local = get_rooms()
-    room_data_local = ensure_room(room_code_local)
-    chat_log_local = room_data_local.setdefault("chat", [])
     nickname_local = st.session_state.nickname
 
-    chat_log_local.append({"author": nickname_local, "text": txt})
+    get_store().append_chat(room_code_local, nickname_local, txt)
 
     # wyczyść pole po wysłaniu
     st.session_state.chat_input = ""
@@ -641,65 +316,44 @@ if room_data["game_over"]:
 
 
 # ---------------------------------------------------------
-# Layout: dwie kolumny sterowania + plansza + prawa kolumna (czat)
+# Layout: kolumna sterowania + plansza + prawa kolumna (czat)
 # ---------------------------------------------------------
-controls_col1, controls_col2, board_col, right_col = st.columns([0.7, 0.7, 1.3, 0.7])
-
-import streamlit.components.v1 as components
+controls_col, board_col, right_col = st.columns([0.7, 2.0, 0.7])
 
 with right_col:
     st.markdown("### Czat pokoju")
 
-    chat_log = room_data.setdefault("chat", [])
-
-    # Generujemy HTML wiadomości
-    chat_items_html = ""
-    for msg in chat_log[-200:]:
-        author = msg.get("author", "Anonim")
-        text = msg.get("text", "")
-
-        # kolory: ja = białe, przeciwnik = jasnofioletowe, system = szare
-        if author == nickname:
-            bg = "#ffffff"
-        elif author == "SYSTEM":
-            bg = "#dddddd"
-        else:
-            bg = "#f3e6ff"
-
-        chat_items_html += f"""
-        <div style="
-            background-color:{bg};
-            padding:6px 8px;
-            margin-bottom:4px;
-            border-radius:6px;
-            font-size:0.9rem;">
-            <strong>{author}:</strong> {text}
-        </div>
-        """
-
-    # Cały komponent HTML (duże okno + autoscroll)
-    full_html = f"""
-    <div id="chat-box" style="
-        height:630px;                 /* <<-- stały rozmiar, 2/3 większe */
-        overflow-y:auto;
-        padding:6px;
-        border:1px solid #cccccc;
-        border-radius:6px;
-        background-color:#fdfdfd;
-    ">
-        {chat_items_html}
-    </div>
-
-    <script>
-        const box = document.getElementById("chat-box");
-        if (box) {{
-            box.scrollTop = box.scrollHeight;  /* autoscroll do dołu */
-        }}
-    </script>
-    """
-
-    # Komponent HTML musi być trochę większy niż div — inaczej Streamlit ucina style
-    components.html(full_html, height=680, scrolling=False)
+    # Okno czatu pamięta, co już pokazało – wysyłamy tylko nowsze wiadomości.
+    # Za "wysłane" uznajemy je dopiero na końcu udanego przebiegu skryptu.
+    # Starsze strony (spoza okna w pamięci) idą z bazy, gdy okno o nie poprosi.
+    chat_log = room_data["chat"]
+    chat_state = st.session_state.get("chat_view") or {}
+    chat_view_key = (room_code, nickname, chat_log.epoch, chat_state.get("mount"))
+    chat_sent = st.session_state.get("chat_sent")
+    chat_since = chat_sent[1] if chat_sent and chat_sent[0] == chat_view_key else 0
+
+    chat_history = None
+    if chat_state.get("before"):
+        before = chat_state["before"]
+        if st.session_state.get("chat_history_key") != (chat_view_key, before):
+            st.session_state.chat_history = {"before": before, "items": store.chat_history(room_code, before)}
+            st.session_state.chat_history_key = (chat_view_key, before)
+        chat_history = st.session_state.chat_history
+
+    # Jedna migawka: append_chat z innego wątku może dopisać wiadomość między
+    # odczytami, a wtedy znacznik przeskoczyłby wiadomość, której okno nie dostało.
+    chat_items = chat_log.since(chat_since)
+    with metrics.span("chat"):
+        chat_view(
+            epoch=chat_log.epoch,
+            me=nickname,
+            window=chat_log.maxlen,
+            items=chat_items,
+            history=chat_history,
+            key="chat_view",
+            default=None,
+        )
+    chat_sent_pending = (chat_view_key, chat_items[-1][0] if chat_items else chat_since)
 
     # Input wysyłania — send_message czyści pole
     st.text_input(
@@ -714,198 +368,36 @@ with right_col:
 
 
 # ---------------------------------------------------------
-# KOLUMNA STEROWANIA 1
-# ---------------------------------------------------------
-with controls_col1:
-
-    # ---------------- Żółty trójkąt ----------------
-    figure_header(controls_col1, "Żółty trójkąt", "#ffd000")
-
-    row_y1 = st.columns(3)
-    if controls_enabled and row_y1[0].button(f"{Y_ICON}⟲", key="y_rot_left"):
-        state["y_ori"] = (state["y_ori"] + 1) % 4
-    if controls_enabled and row_y1[1].button(f"{Y_ICON}⬆️", key="y_up"):
-        state["y_cy"] += 1
-    if controls_enabled and row_y1[2].button(f"{Y_ICON}⟳", key="y_rot_right"):
-        state["y_ori"] = (state["y_ori"] - 1) % 4
-
-    row_y2 = st.columns(3)
-    if controls_enabled and row_y2[0].button(f"{Y_ICON}⬅️", key="y_left"):
-        state["y_cx"] -= 1
-    if controls_enabled and row_y2[1].button(f"{Y_ICON}⬇️", key="y_down"):
-        state["y_cy"] -= 1
-    if controls_enabled and row_y2[2].button(f"{Y_ICON}➡️", key="y_right"):
-        state["y_cx"] += 1
-
-    state["y_cx"], state["y_cy"] = clamp_center(
-        state["y_cx"], state["y_cy"],
-        state["y_ori"], yellow_vertices
-    )
-
-    st.markdown("---")
-
-    # ---------------- Biały trójkąt ----------------
-    figure_header(controls_col1, "Biały trójkąt", "#ffffff", black_override=True)
-
-    row_w1 = st.columns(3)
-    if controls_enabled and row_w1[0].button(f"{W_ICON}⟲", key="w_rot_left"):
-        state["w_ori"] = (state["w_ori"] + 1) % 4
-    if controls_enabled and row_w1[1].button(f"{W_ICON}⬆️", key="w_up"):
-        state["w_cy"] += 1
-    if controls_enabled and row_w1[2].button(f"{W_ICON}⟳", key="w_rot_right"):
-        state["w_ori"] = (state["w_ori"] - 1) % 4
-
-    row_w2 = st.columns(3)
-    if controls_enabled and row_w2[0].button(f"{W_ICON}⬅️", key="w_left"):
-        state["w_cx"] -= 1
-    if controls_enabled and row_w2[1].button(f"{W_ICON}⬇️", key="w_down"):
-        state["w_cy"] -= 1
-    if controls_enabled and row_w2[2].button(f"{W_ICON}➡️", key="w_right"):
-        state["w_cx"] += 1
-
-    state["w_cx"], state["w_cy"] = clamp_center(
-        state["w_cx"], state["w_cy"],
-        state["w_ori"], small_tri_vertices
-    )
-
-    st.markdown("---")
-
-    # ---------------- Niebieski trójkąt ----------------
-    figure_header(controls_col1, "Niebieski trójkąt", "#3399ff")
-
-    row_b1 = st.columns(3)
-    if controls_enabled and row_b1[0].button(f"{B_ICON}⟲", key="b_rot_left"):
-        state["b_ori"] = (state["b_ori"] + 1) % 4
-    if controls_enabled and row_b1[1].button(f"{B_ICON}⬆️", key="b_up"):
-        state["b_cy"] += 1
-    if controls_enabled and row_b1[2].button(f"{B_ICON}⟳", key="b_rot_right"):
-        state["b_ori"] = (state["b_ori"] - 1) % 4
-
-    row_b2 = st.columns(3)
-    if controls_enabled and row_b2[0].button(f"{B_ICON}⬅️", key="b_left"):
-        state["b_cx"] -= 1
-    if controls_enabled and row_b2[1].button(f"{B_ICON}⬇️", key="b_down"):
-        state["b_cy"] -= 1
-    if controls_enabled and row_b2[2].button(f"{B_ICON}➡️", key="b_right"):
-        state["b_cx"] += 1
-
-    state["b_cx"], state["b_cy"] = clamp_center(
-        state["b_cx"], state["b_cy"],
-        state["b_ori"], small_tri_vertices
-    )
-
-    st.markdown("---")
-
-    # ---------------- Jasnoniebieski kwadrat ----------------
-    figure_header(controls_col1, "Jasnoniebieski kwadrat", "#66c2ff")
-
-    row_lb1 = st.columns(3)
-    if controls_enabled and row_lb1[1].button(f"{B_ICON}⬆️", key="lb_up"):
-        state["lb_y"] += 1
-
-    row_lb2 = st.columns(3)
-    if controls_enabled and row_lb2[0].button(f"{B_ICON}⬅️", key="lb_left"):
-        state["lb_x"] -= 1
-    if controls_enabled and row_lb2[1].button(f"{B_ICON}⬇️", key="lb_down"):
-        state["lb_y"] -= 1
-    if controls_enabled and row_lb2[2].button(f"{B_ICON}➡️", key="lb_right"):
-        state["lb_x"] += 1
-
-    state["lb_x"], state["lb_y"] = clamp_lightblue(
-        state["lb_x"], state["lb_y"]
-    )
-
-
-# ---------------------------------------------------------
-# KOLUMNA STEROWANIA 2
+# KOLUMNA STEROWANIA – opis sterowania + sprawdzanie ułożenia
 # ---------------------------------------------------------
-with controls_col2:
-
-    # ---------------- Biały kwadrat ----------------
-    figure_header(controls_col2, "Biały kwadrat", "#ffffff", black_override=True)
-
-    row_s1 = st.columns(3)
-    if controls_enabled and row_s1[1].button(f"{W_ICON}⬆️", key="s_up"):
-        state["s_cy"] += 1
-
-    row_s2 = st.columns(3)
-    if controls_enabled and row_s2[0].button(f"{W_ICON}⬅️", key="s_left"):
-        state["s_cx"] -= 1
-    if controls_enabled and row_s2[1].button(f"{W_ICON}⬇️", key="s_down"):
-        state["s_cy"] -= 1
-    if controls_enabled and row_s2[2].button(f"{W_ICON}➡️", key="s_right"):
-        state["s_cx"] += 1
-
-    state["s_cx"], state["s_cy"] = clamp_center(
-        state["s_cx"], state["s_cy"],
-        state["s_ori"], square_diamond_vertices
-    )
-
-    st.markdown("---")
-
-    # ---------------- Czerwony równoległobok ----------------
-    figure_header(controls_col2, "Czerwony równoległobok", "#ff3333")
-
-    row_r1 = st.columns(4)
-    if controls_enabled and row_r1[0].button(f"{R_ICON}⟲", key="r_rot_left"):
-        state["r_ori"] = (state["r_ori"] + 1) % 4
-    if controls_enabled and row_r1[1].button(f"{R_ICON}⬆️", key="r_up"):
-        state["r_cy"] += 1
-    if controls_enabled and row_r1[2].button(f"{R_ICON}⟳", key="r_rot_right"):
-        state["r_ori"] = (state["r_ori"] - 1) % 4
-    if controls_enabled and row_r1[3].button(f"{R_ICON}🔁", key="r_flip_btn"):
-        state["r_flip"] = not state["r_flip"]
-
-    row_r2 = st.columns(3)
-    if controls_enabled and row_r2[0].button(f"{R_ICON}⬅️", key="r_left"):
-        state["r_cx"] -= 1
-    if controls_enabled and row_r2[1].button(f"{R_ICON}⬇️", key="r_down"):
-        state["r_cy"] -= 1
-    if controls_enabled and row_r2[2].button(f"{R_ICON}➡️", key="r_right"):
-        state["r_cx"] += 1
-
-    state["r_cx"], state["r_cy"] = clamp_parallelogram(
-        state["r_cx"], state["r_cy"],
-        state["r_ori"], state["r_flip"]
-    )
+with controls_col:
 
-    st.markdown("---")
-
-    # ---------------- Przezroczysty trójkąt ----------------
-    figure_header(controls_col2, "Przezroczysty trójkąt",
-                  BG_COLOR, black_override=True)
-
-    row_t2_1 = st.columns(3)
-    if controls_enabled and row_t2_1[0].button(f"{W_ICON}⟲", key="t2_rot_left"):
-        state["t2_ori"] = (state["t2_ori"] + 1) % 4
-    if controls_enabled and row_t2_1[1].button(f"{W_ICON}⬆️", key="t2_up"):
-        state["t2_cy"] += 1
-    if controls_enabled and row_t2_1[2].button(f"{W_ICON}⟳", key="t2_rot_right"):
-        state["t2_ori"] = (state["t2_ori"] - 1) % 4
-
-    row_t2_2 = st.columns(3)
-    if controls_enabled and row_t2_2[0].button(f"{W_ICON}⬅️", key="t2_left"):
-        state["t2_cx"] -= 1
-    if controls_enabled and row_t2_2[1].button(f"{W_ICON}⬇️", key="t2_down"):
-        state["t2_cy"] -= 1
-    if controls_enabled and row_t2_2[2].button(f"{W_ICON}➡️", key="t2_right"):
-        state["t2_cx"] += 1
-
-    state["t2_cx"], state["t2_cy"] = clamp_center(
-        state["t2_cx"], state["t2_cy"],
-        state["t2_ori"], tri_hyp2_vertices
+    figure_header(controls_col, "Sterowanie figurami", "#ffffff", black_override=True)
+    st.markdown(
+        "- kliknij figurę na planszy (albo 1–7, Tab), żeby ją wybrać,\n"
+        "- przeciągnij ją albo użyj strzałek, żeby przesunąć,\n"
+        "- Q / E – obrót, F – odbicie (czerwony równoległobok),\n"
+        "- te same ruchy są na pasku pod planszą."
     )
+    if not controls_enabled:
+        st.caption("Ta plansza jest zablokowana.")
+    elif st.button("Losowe ułożenie", key="random_layout", help="Losuje poprawne ułożenie wszystkich figur."):
+        # jednostajnie wśród poprawnych ułożeń (orapa.solver.LayoutSampler)
+        for piece, i in zip(PIECES, random_layouts(1)[0]):
+            tables.write_piece(state, piece, int(i))
+        store.log_event(room_code, "b", nickname, encode_board(board_key, Board.from_state(state)))
 
     st.markdown("---")
 
     # ---------------- PRZYCISK SPRAWDZANIA UKŁADU (dla aktualnej planszy) ----------------
-    figure_header(controls_col2, "Sprawdzenie ułożenia (aktualna plansza)", "#ffffff", black_override=True)
+    figure_header(controls_col, "Sprawdzenie ułożenia (aktualna plansza)", "#ffffff", black_override=True)
 
     row_check = st.columns([1, 0.2])
 
     with row_check[0]:
         if st.button("Sprawdź ułożenie", key="check_layout"):
-            valid, msg = check_layout(state)
+            with metrics.span("check_layout"):
+                valid, msg = check_layout(state)
             state["layout_valid"] = valid
             state["layout_msg"] = msg
 
@@ -943,10 +435,31 @@ with board_col:
                 st.session_state.current_board = "fioletowa"
             else:
                 st.session_state.current_board = "zielona"
-            st.experimental_rerun()
-
-    fig = draw_board(state, BG_COLOR)
-    st.pyplot(fig)
+            rerun()
+
+    # Mapa pól z dedukcji – tylko na fioletowej planszy; wybór jest pod strzałami
+    heat, heat_exact = None, None
+    heat_choice = st.session_state.get("heat_piece", HEAT_OFF)
+    if board_key == "fioletowa" and heat_choice != HEAT_OFF:
+        deduction = session_deduction(player_entry.get("probes", []))
+        if deduction is not None and len(deduction):
+            with metrics.span("heatmap"):
+                occupancy, heat_exact = deduction.heatmap()
+            if heat_choice == HEAT_ALL:
+                heat = heat_overlay(occupancy.sum(axis=0), "#ffffff")
+            else:
+                face, edge, _ = PIECE_STYLES[PIECE_NAMES.index(heat_choice)]
+                heat = heat_overlay(occupancy[PIECE_NAMES.index(heat_choice)], face or edge)
+
+    with metrics.span("board"):
+        board_view(
+            state,
+            BG_COLOR,
+            key="board_view",
+            editable=controls_enabled,
+            ack=st.session_state.get("board_batch"),
+            heat=heat,
+        )
 
     if board_key == "zielona" and player_entry["ready"]:
         st.info("Twoja plansza została zatwierdzona po START i jest zablokowana.")
@@ -970,17 +483,9 @@ with board_col:
             st.session_state.current_board = "zielona"
 
             # Reset stanu gry w pokoju
-            room_data["game_over"] = False
-            room_data["winner"] = None
-            for p in players.values():
-                p["ready"] = False
-                p["green_locked"] = None
-
-            room_data["chat"].append({
-                "author": "SYSTEM",
-                "text": f"{nickname} zresetował grę.",
-            })
-            st.experimental_rerun()
+            store.restart(room_code, by=nickname)
+            store.append_chat(room_code, "SYSTEM", f"{nickname} zresetował grę.")
+            rerun()
 
     # START / ZAKOŃCZ
     with btn_row[1]:
@@ -1000,13 +505,11 @@ with board_col:
                         st.error(msg)
                     else:
                         # Zapisujemy zamrożoną wersję Twojej zielonej planszy
-                        player_entry["ready"] = True
-                        player_entry["green_locked"] = dict(my_green)
-                        room_data["chat"].append({
-                            "author": "SYSTEM",
-                            "text": f"{nickname} zakończył ustawianie swojej planszy.",
-                        })
-                        st.experimental_rerun()
+                        store.lock_board(room_code, nickname, my_green, answer_table(my_green))
+                        store.append_chat(
+                            room_code, "SYSTEM", f"{nickname} zakończył ustawianie swojej planszy."
+                        )
+                        rerun()
             else:
                 # Już kliknąłeś START
                 label = "ZAKOŃCZ"
@@ -1018,20 +521,22 @@ with board_col:
                 if st.button(label, key="finish_btn", disabled=disabled):
                     # Koniec gry – porównujemy Twoją fioletową z zieloną przeciwnika
                     if not other_players:
-                        room_data["chat"].append({
-                            "author": "SYSTEM",
-                            "text": "Nie ma przeciwnika w pokoju – nie można zakończyć gry.",
-                        })
+                        store.append_chat(
+                            room_code, "SYSTEM", "Nie ma przeciwnika w pokoju – nie można zakończyć gry."
+                        )
+                        rerun()
                     else:
                         opp_name = sorted(other_players)[0]
                         opp_entry = players[opp_name]
                         true_board = opp_entry.get("green_locked")
 
                         if true_board is None:
-                            room_data["chat"].append({
-                                "author": "SYSTEM",
-                                "text": f"Przeciwnik {opp_name} nie zatwierdził jeszcze swojej planszy.",
-                            })
+                            store.append_chat(
+                                room_code,
+                                "SYSTEM",
+                                f"Przeciwnik {opp_name} nie zatwierdził jeszcze swojej planszy.",
+                            )
+                            rerun()
                         else:
                             guess_board = boards["fioletowa"]
                             if boards_equal(guess_board, true_board):
@@ -1039,15 +544,95 @@ with board_col:
                             else:
                                 winner = opp_name
 
-                            room_data["game_over"] = True
-                            room_data["winner"] = winner
-                            room_data["chat"].append({
-                                "author": "SYSTEM",
-                                "text": f"Gra zakończona. Wygrał {winner}. (Zakończył {nickname}.)",
-                            })
-                            st.experimental_rerun()
+                            # przy równoczesnym ZAKOŃCZ obu graczy liczy się pierwsze
+                            if store.finish_game(room_code, winner):
+                                store.append_chat(
+                                    room_code, "SYSTEM", f"Gra zakończona. Wygrał {winner}. (Zakończył {nickname}.)"
+                                )
+                            rerun()
 
                 if help_text and not disabled:
                     st.caption(help_text)
                 elif help_text and disabled:
                     st.caption(help_text)
+
+    # -------------------- STRZAŁY --------------------
+    # Odpowiedzi przeciwnika są policzone przy jego START – strzał to odczyt z tablicy
+    opp_answers = None
+    if all_ready and not room_data["game_over"] and other_players:
+        opp_answers = players[sorted(other_players)[0]].get("answers")
+
+    if opp_answers:
+        probe_row = st.columns([0.6, 0.4])
+        with probe_row[0]:
+            entry = st.selectbox("Pole wejścia strzału", ENTRY_LABELS, key="probe_entry")
+        with probe_row[1]:
+            st.markdown("&nbsp;")
+            if st.button("Strzelaj", key="probe_btn"):
+                code = probe(opp_answers, entry)
+                store.add_probe(room_code, nickname, entry, code)
+                store.append_chat(room_code, "SYSTEM", f"{nickname}: {describe_answer(entry, code)}")
+                rerun()
+
+        for p in player_entry.get("probes", []):
+            st.caption(describe_answer(p["entry"], p["answer"]))
+
+        # -------------------- DEDUKCJA --------------------
+        deduction = session_deduction(player_entry.get("probes", []))
+        if deduction is None:
+            st.caption(
+                "Brak zbioru kandydatów – liczenie pasujących ułożeń, podpowiedzi "
+                "i mapa pól są wyłączone. Zbiór buduje: python -m orapa.solver random "
+                f"{CANDIDATES_PATH} 500000, a potem python -m orapa.deduce answers {CANDIDATES_PATH}."
+            )
+        elif not deduction.complete:
+            # podzbiór z solvera: ułożenia przeciwnika może w nim nie być
+            pinned = ", ".join(PIECE_NAMES[PIECES.index(p)] for p in deduction.pinned)
+            st.caption(
+                "Zbiór kandydatów jest niepełny"
+                + (f" (przypięte przy budowaniu: {pinned})" if pinned else "")
+                + " – liczby, podpowiedzi i mapa pól dotyczą tylko tego podzbioru, "
+                "a prawdziwego ułożenia może w nim nie być."
+            )
+        if deduction is not None and player_entry.get("probes"):
+            with metrics.span("deduce"):
+                remaining = len(deduction)
+                forced = deduction.forced() if deduction.complete else {}
+            if not remaining:
+                if deduction.complete:
+                    st.warning("Żadne ułożenie nie pasuje do strzałów.")
+                else:
+                    st.caption("Żadne ułożenie z niepełnego zbioru kandydatów nie pasuje do strzałów.")
+            else:
+                if deduction.complete:
+                    names = ", ".join(PIECE_NAMES[PIECES.index(p)] for p in forced) or "żadna"
+                    st.caption(f"Pasujących ułożeń: {remaining}. Figury na pewnym miejscu: {names}.")
+                else:
+                    st.caption(f"Pasujących ułożeń w zbiorze kandydatów: {remaining}.")
+                if remaining > 1:
+                    with metrics.span("advise"):
+                        best = deduction.advise()[:3]
+                    st.caption(
+                        "Najwięcej powie strzał z: "
+                        + ", ".join(f"{entry} ({bits:.1f} bit)" for entry, bits, _ in best)
+                    )
+                if forced and st.button("Ustaw pewne figury na fioletowej", key="deduce_btn"):
+                    deduction.apply_forced(boards["fioletowa"], tables)
+                    store.log_event(
+                        room_code, "b", nickname, encode_board("fioletowa", Board.from_state(boards["fioletowa"]))
+                    )
+                    rerun()
+        if deduction is not None and len(deduction):
+            st.selectbox(
+                "Mapa pól na fioletowej planszy",
+                [HEAT_OFF, HEAT_ALL] + PIECE_NAMES,
+                key="heat_piece",
+                help="Prawdopodobieństwo, że figura pokrywa pole, wśród pasujących ułożeń ze zbioru kandydatów.",
+            )
+            if heat_exact is False:
+                st.caption("Mapa z losowej próbki ułożeń (jest ich bardzo dużo).")
+
+
+# Przebieg doszedł do końca – okno czatu dostało wiadomości do chat_sent_pending
+st.session_state.chat_sent = chat_sent_pending
+metrics.end_run()
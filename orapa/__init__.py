@@ -0,0 +1 @@
+"""Silnik gry Orapa: geometria figur, sprawdzanie ułożeń i narzędzia offline (stabilne API: orapa.engine)."""
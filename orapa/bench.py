@@ -0,0 +1,335 @@
+"""
+Pomiary wydajności: mikrobenchmarki i test obciążenia całej aplikacji.
+
+micro – czasy pojedynczych operacji, żeby regresje było widać w liczbach:
+    rysowanie planszy (matplotlib draw_board i listy wierzchołków dla SVG),
+    check_layout (z tablic i na Shapely), get_all_polygons, czat
+    (dopisanie z renderowaniem HTML i since()).
+
+load – N pokoi x 2 graczy na prawdziwym app.py przez streamlit AppTest
+    (wszystkie sesje w jednym procesie, jak na jednym serwerze; wspólny
+    RoomStore z @st.cache_resource). Każda para przechodzi lobby, ruchy
+    figur, Sprawdź ułożenie, START, czat, strzał, ZAKOŃCZ, a między krokami
+    robi odświeżenia jak st_autorefresh. Wynik: przebiegi/s, p50/p99 czasu
+    przebiegu (ogółem i per krok) oraz przyrost RSS na sesję.
+
+startup – zimny start: świeży proces Pythona aż do narysowanego lobby (czas
+    od uruchomienia procesu, RSS, które ciężkie moduły są już wczytane),
+    a potem pierwszy przebieg z pokojem i nazwą gracza.
+
+    python -m orapa.bench micro
+    python -m orapa.bench load --rooms 10 --ticks 5 --json bench_output.txt
+    python -m orapa.bench startup --repeat 5
+
+Baza pokoi testu obciążenia to plik tymczasowy (ORAPA_DB), nie orapa.db.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+import numpy as np
+
+from orapa.placements import get_tables
+from orapa.solver import random_layouts
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+
+
+def _rss_bytes():
+    with open("/proc/self/statm") as fh:
+        return int(fh.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def _percentile(values, q):
+    return float(np.percentile(values, q)) if values else 0.0
+
+
+def random_legal_layouts(n, seed=0):
+    """n losowych poprawnych ułożeń (indeksy położeń (n, 7))."""
+    return random_layouts(n, seed)
+
+
+# ---------------------------------------------------------
+# Mikrobenchmarki
+# ---------------------------------------------------------
+def _timeit(fn, repeat, number):
+    """Najlepszy i mediana czasu jednego wywołania (s) z `repeat` serii po `number`."""
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        runs.append((time.perf_counter() - start) / number)
+    return min(runs), statistics.median(runs)
+
+
+def micro(repeat=5, seed=0):
+    from orapa.chat import ChatLog
+    from orapa.components import board_scene
+    from orapa.legality import check_layout, check_layout_shapely, get_all_polygons
+    from orapa.render import draw_board
+
+    tables = get_tables()
+    states = [tables.state_from_indices(row) for row in random_legal_layouts(16, seed)]
+    it = iter(range(10 ** 9))
+
+    def state():
+        return states[next(it) % len(states)]
+
+    def render():
+        import matplotlib.pyplot as plt
+
+        plt.close(draw_board(state(), "#88cc88"))
+
+    chat = ChatLog()
+    for i in range(chat.maxlen):
+        chat.append("ala", f"wiadomość {i} <b>&</b>")
+
+    cases = [
+        ("draw_board (matplotlib)", render, 10),
+        ("board_scene (SVG)", lambda: board_scene(state()), 200),
+        ("check_layout", lambda: check_layout(state()), 200),
+        ("check_layout_shapely", lambda: check_layout_shapely(state()), 20),
+        ("get_all_polygons", lambda: get_all_polygons(state()), 50),
+        ("chat append + HTML", lambda: chat.append("bob", "hej <i>ty</i> & reszta"), 2000),
+        ("chat since(last-5)", lambda: chat.since(chat.last_seq - 5), 2000),
+    ]
+    results = {}
+    for name, fn, number in cases:
+        fn()                                         # rozgrzewka (importy, tablice)
+        best, median = _timeit(fn, repeat, number)
+        results[name] = {"best_us": best * 1e6, "median_us": median * 1e6}
+    return results
+
+
+def print_micro(results):
+    print(f"{'operacja':<28}{'najlepszy µs':>14}{'mediana µs':>14}")
+    for name, r in results.items():
+        print(f"{name:<28}{r['best_us']:>14.1f}{r['median_us']:>14.1f}")
+
+
+# ---------------------------------------------------------
+# Test obciążenia (AppTest)
+# ---------------------------------------------------------
+class _Session:
+    """Jeden gracz: AppTest z app.py i zapis czasów przebiegów."""
+
+    def __init__(self, timings, timeout):
+        from streamlit.testing.v1 import AppTest
+
+        self.at = AppTest.from_file(APP_PATH, default_timeout=timeout)
+        self.timings = timings
+
+    def run(self, step, action=None):
+        start = time.perf_counter()
+        (action or self.at).run()
+        self.timings[step].append(time.perf_counter() - start)
+        if self.at.exception:
+            raise RuntimeError(f"{step}: {self.at.exception[0].message}")
+
+
+def _play_room(code, layouts, timings, ticks, moves, timeout):
+    tables = get_tables()
+    a, b = _Session(timings, timeout), _Session(timings, timeout)
+    players = [(a, "ala"), (b, "bob")]
+
+    for (s, nick), idx in zip(players, layouts):
+        s.run("lobby")
+        s.run("lobby", s.at.text_input[0].input(code))
+        s.run("lobby", s.at.text_input[1].input(nick))
+
+        # ruchy figur: paczki z komponentu planszy, na koniec docelowe ułożenie
+        for seq in range(1, moves + 1):
+            s.at.session_state["board_view"] = {
+                "mount": "bench", "seq": seq,
+                "actions": [["y", "right"], ["y", "left"], ["r", "rot_left"], ["r", "rot_right"]],
+            }
+            s.run("move")
+        boards = s.at.session_state["boards"]
+        boards["zielona"].update(tables.state_from_indices(idx))
+        s.at.session_state["boards"] = boards
+
+        s.run("check_layout", s.at.button(key="check_layout").click())
+
+    for s, _ in players:
+        s.run("start", s.at.button(key="start_btn").click())
+    for s, _ in players:
+        for _ in range(ticks):
+            s.run("tick")
+
+    for s, nick in players:
+        s.run("chat", s.at.text_input(key="chat_input").input(f"cześć, tu {nick}"))
+        s.run("probe", s.at.button(key="probe_btn").click())
+        for _ in range(ticks):
+            s.run("tick")
+
+    # bob zgaduje ułożenie ali
+    boards = b.at.session_state["boards"]
+    boards["fioletowa"].update(tables.state_from_indices(layouts[0]))
+    b.at.session_state["boards"] = boards
+    b.run("switch", b.at.button(key="switch_board").click())
+    b.run("finish", b.at.button(key="finish_btn").click())
+    if not any("Wygrałeś" in m.value for m in b.at.success):
+        raise RuntimeError(f"pokój {code}: ZAKOŃCZ nie dało wygranej")
+    a.run("tick")
+    return players
+
+
+def load(rooms=5, ticks=3, moves=5, timeout=60, seed=0):
+    os.environ.setdefault("ORAPA_DB", os.path.join(tempfile.mkdtemp(prefix="orapa-bench-"), "bench.db"))
+    get_tables()                                      # tablice poza pomiarem
+    layouts = random_legal_layouts(2 * rooms, seed)
+
+    timings = defaultdict(list)
+    sessions = []
+    rss_before = _rss_bytes()
+    start = time.perf_counter()
+    for r in range(rooms):
+        sessions += _play_room(f"BENCH{r}", layouts[2 * r:2 * r + 2], timings, ticks, moves, timeout)
+    wall = time.perf_counter() - start
+    rss_after = _rss_bytes()
+
+    every = [t for values in timings.values() for t in values]
+    return {
+        "rooms": rooms,
+        "sessions": len(sessions),
+        "reruns": len(every),
+        "wall_s": wall,
+        "reruns_per_s": len(every) / wall,
+        "p50_ms": _percentile(every, 50) * 1e3,
+        "p99_ms": _percentile(every, 99) * 1e3,
+        "rss_mb": rss_after / 2 ** 20,
+        "rss_per_session_kb": (rss_after - rss_before) / len(sessions) / 1024,
+        "steps": {
+            step: {
+                "n": len(values),
+                "p50_ms": _percentile(values, 50) * 1e3,
+                "p99_ms": _percentile(values, 99) * 1e3,
+            }
+            for step, values in timings.items()
+        },
+    }
+
+
+def print_load(result):
+    print(
+        f"{result['rooms']} pokoi, {result['sessions']} sesji, {result['reruns']} przebiegów "
+        f"w {result['wall_s']:.1f} s: {result['reruns_per_s']:.1f} przebiegów/s, "
+        f"p50 {result['p50_ms']:.1f} ms, p99 {result['p99_ms']:.1f} ms"
+    )
+    print(f"RSS {result['rss_mb']:.0f} MB, przyrost na sesję {result['rss_per_session_kb']:.0f} kB")
+    print(f"{'krok':<14}{'n':>6}{'p50 ms':>10}{'p99 ms':>10}")
+    for step, r in result["steps"].items():
+        print(f"{step:<14}{r['n']:>6}{r['p50_ms']:>10.1f}{r['p99_ms']:>10.1f}")
+
+
+# ---------------------------------------------------------
+# Zimny start (osobne procesy)
+# ---------------------------------------------------------
+HEAVY_MODULES = ("numpy", "shapely", "matplotlib", "PIL", "orapa.placements", "orapa.store")
+
+# bez importu orapa.* – proces ma wczytać tylko to, czego potrzebuje app.py
+_STARTUP_CHILD = """
+import json, os, sys, time
+def _rss_bytes():
+    with open("/proc/self/statm") as fh:
+        return int(fh.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_file(sys.argv[1], default_timeout=60)
+at.run()
+lobby = time.perf_counter()
+out = {"lobby_rss": _rss_bytes(), "lobby_modules": [m for m in sys.argv[2:] if m in sys.modules]}
+at.text_input[0].input("STARTUP").run()
+at.text_input[1].input("ala").run()
+out["game_s"] = time.perf_counter() - lobby
+out["game_rss"] = _rss_bytes()
+print(json.dumps(out))
+"""
+
+
+def startup(repeat=3):
+    root = os.path.dirname(APP_PATH)
+    env = dict(os.environ, PYTHONPATH=root + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    env.setdefault("ORAPA_DB", os.path.join(tempfile.mkdtemp(prefix="orapa-bench-"), "bench.db"))
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        proc = subprocess.run(
+            [sys.executable, "-c", _STARTUP_CHILD, APP_PATH, *HEAVY_MODULES],
+            env=env, cwd=root, capture_output=True, text=True, check=True,
+        )
+        total = time.perf_counter() - start
+        run = json.loads(proc.stdout.strip().splitlines()[-1])
+        run["lobby_s"] = total - run["game_s"]          # od startu procesu do lobby
+        runs.append(run)
+
+    def med(key):
+        return statistics.median(r[key] for r in runs)
+
+    return {
+        "repeat": repeat,
+        "lobby_ms": med("lobby_s") * 1e3,
+        "lobby_rss_mb": med("lobby_rss") / 2 ** 20,
+        "lobby_modules": runs[-1]["lobby_modules"],
+        "first_game_run_ms": med("game_s") * 1e3,
+        "game_rss_mb": med("game_rss") / 2 ** 20,
+    }
+
+
+def print_startup(result):
+    print(
+        f"do lobby: {result['lobby_ms']:.0f} ms, RSS {result['lobby_rss_mb']:.0f} MB "
+        f"(mediana z {result['repeat']} procesów)"
+    )
+    print(f"ciężkie moduły w lobby: {', '.join(result['lobby_modules']) or 'brak'}")
+    print(f"pierwszy przebieg z pokojem: {result['first_game_run_ms']:.0f} ms, RSS {result['game_rss_mb']:.0f} MB")
+
+
+# ---------------------------------------------------------
+# CLI
+# ---------------------------------------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pomiary wydajności Orapy")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    cmd = sub.add_parser("micro")
+    cmd.add_argument("--repeat", type=int, default=5)
+
+    cmd = sub.add_parser("load")
+    cmd.add_argument("--rooms", type=int, default=5)
+    cmd.add_argument("--ticks", type=int, default=3, help="odświeżeń na gracza między krokami")
+    cmd.add_argument("--moves", type=int, default=5, help="paczek ruchów figur na gracza")
+    cmd.add_argument("--timeout", type=float, default=60)
+
+    cmd = sub.add_parser("startup")
+    cmd.add_argument("--repeat", type=int, default=3)
+
+    for cmd in sub.choices.values():
+        cmd.add_argument("--seed", type=int, default=0)
+        cmd.add_argument("--json", metavar="PLIK", help="zapisz wyniki jako JSON")
+
+    args = parser.parse_args(argv)
+    if args.command == "micro":
+        result = micro(args.repeat, args.seed)
+        print_micro(result)
+    elif args.command == "startup":
+        result = startup(args.repeat)
+        print_startup(result)
+    else:
+        result = load(args.rooms, args.ticks, args.moves, args.timeout, args.seed)
+        print_load(result)
+
+    if args.json:
+        with open(args.json, "w") as fh:
+            json.dump({args.command: result, "python": sys.version.split()[0]}, fh, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,125 @@
+"""
+Zwarty, niezmienny zapis ułożenia figur.
+
+Słownik z make_single_board ma 21 kluczy położenia (plus status
+sprawdzania) i floaty porównywane z tolerancją. Wszystkie współrzędne leżą
+na siatce dziesiątych części pola (patrz orapa.placements.placement_key),
+więc całe ułożenie mieści się w jednej liczbie całkowitej: na każdą figurę
+17 bitów – x (7), y (7), obrót (2), odbicie (1) – razem 119 bitów.
+
+Board to ta liczba w __slots__: porównanie i hash w O(1), nadaje się na
+klucz słownika/cache, a str(board) to 20-znakowy kod (base64url), z którego
+Board.from_code odtwarza ułożenie.
+"""
+import base64
+
+from orapa.geometry import make_single_board
+from orapa.placements import PIECES, SCALE, STATE_KEYS, placement_key
+
+_BITS = (7, 7, 2, 1)                 # x, y (dziesiąte pola), obrót, odbicie
+_PIECE_BITS = sum(_BITS)
+CODE_BYTES = (_PIECE_BITS * len(PIECES) + 7) // 8
+
+
+def _pack_piece(x, y, ori, flip):
+    for value, bits in zip((x, y, ori, flip), _BITS):
+        if not 0 <= value < 1 << bits:
+            raise ValueError(f"położenie figury poza zakresem: {(x, y, ori, flip)}")
+    return x | y << 7 | ori << 14 | flip << 16
+
+
+def _unpack_piece(v):
+    return v & 0x7F, v >> 7 & 0x7F, v >> 14 & 0x3, v >> 16 & 0x1
+
+
+class Board:
+    """Ułożenie 7 figur jako jedna liczba (kolejność figur jak PIECES)."""
+
+    __slots__ = ("packed",)
+
+    def __init__(self, packed):
+        object.__setattr__(self, "packed", int(packed))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Board jest niezmienny")
+
+    # -------------------- konwersje --------------------
+    @classmethod
+    def from_state(cls, state):
+        """Z słownika planszy (jak make_single_board)."""
+        if isinstance(state, Board):
+            return state
+        packed = 0
+        for p, piece in enumerate(PIECES):
+            kx, ky, kori, kflip = STATE_KEYS[piece]
+            x, y, ori, flip = placement_key(
+                state[kx], state[ky], state[kori] if kori else 0, state[kflip] if kflip else False
+            )
+            packed |= _pack_piece(x, y, ori % 4, flip) << (p * _PIECE_BITS)
+        return cls(packed)
+
+    @classmethod
+    def from_indices(cls, idx, tables):
+        """Z 7 indeksów położeń w tablicach orapa.placements (kolejność PIECES)."""
+        packed = 0
+        for p, i in enumerate(idx):
+            x, y, ori, flip = tables.keys[p][int(i)].tolist()
+            packed |= _pack_piece(x, y, ori % 4, flip) << (p * _PIECE_BITS)
+        return cls(packed)
+
+    def to_indices(self, tables):
+        """7 indeksów położeń w tablicach orapa.placements albo None, gdy któregoś tam nie ma."""
+        idx = []
+        for p, key in enumerate(self.keys().values()):
+            i = tables.index[p].get(key)
+            if i is None:
+                return None
+            idx.append(i)
+        return idx
+
+    @classmethod
+    def from_code(cls, code):
+        raw = base64.urlsafe_b64decode(code + "=" * (-len(code) % 4))
+        return cls(int.from_bytes(raw, "little"))
+
+    @property
+    def code(self):
+        raw = self.packed.to_bytes(CODE_BYTES, "little")
+        return base64.urlsafe_b64encode(raw).rstrip(b"=").decode("ascii")
+
+    def keys(self):
+        """{figura: (x, y, obrót, odbicie)} – x, y w dziesiątych częściach pola."""
+        mask = (1 << _PIECE_BITS) - 1
+        return {
+            piece: _unpack_piece(self.packed >> (p * _PIECE_BITS) & mask)
+            for p, piece in enumerate(PIECES)
+        }
+
+    def to_state(self):
+        """Nowy słownik planszy (status sprawdzania wyczyszczony)."""
+        state = make_single_board()
+        for piece, (x, y, ori, flip) in self.keys().items():
+            kx, ky, kori, kflip = STATE_KEYS[piece]
+            state[kx] = x / SCALE
+            state[ky] = y / SCALE
+            if kori:
+                state[kori] = ori
+            if kflip:
+                state[kflip] = bool(flip)
+        return state
+
+    # -------------------- porównania --------------------
+    def __eq__(self, other):
+        return isinstance(other, Board) and self.packed == other.packed
+
+    def __hash__(self):
+        return hash(self.packed)
+
+    def __str__(self):
+        return self.code
+
+    def __repr__(self):
+        return f"Board({self.code!r})"
+
+    def __reduce__(self):
+        return (Board, (self.packed,))
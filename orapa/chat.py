@@ -0,0 +1,86 @@
+"""
+Czat pokoju: bufor cykliczny ostatnich wiadomości z gotowym HTML.
+
+W pamięci trzymamy tylko ostatnie CHAT_WINDOW wiadomości pokoju; całość
+leży w tabeli chat w orapa.db (tylko dopisywanie), a starsze strony po
+CHAT_PAGE wiadomości czyta RoomStore.chat_history.
+
+Każda wiadomość dostaje kolejny numer (seq) w pokoju i jest renderowana do
+HTML (z escapowaniem) raz, przy dopisaniu. Okno czatu w przeglądarce
+(komponent orapa/components/chat) pamięta ostatni numer, który pokazało, a
+serwer wysyła mu tylko since(seq) – koszt odświeżenia zależy od liczby
+nowych wiadomości, nie od długości historii.
+
+epoch zmienia się, gdy bufor jest budowany od nowa (np. pokój wczytany
+ponownie z bazy); klient wtedy czyści okno i bierze całość.
+
+Bufor jest tylko dopisywany: czytający (since, iteracja) nie biorą blokad.
+Dopisuje jeden wątek naraz (pod blokadą pokoju w RoomStore); lista rośnie
+do 2 x maxlen, a potem jest podmieniana na nową z ostatnimi maxlen
+wiadomościami – czytający, który trzyma starą listę, czyta ją dalej bez
+przeszkód (żadna lista nigdy nie jest skracana w miejscu).
+"""
+import html
+import itertools
+import sys
+
+CHAT_WINDOW = 200
+CHAT_PAGE = 50
+
+_epochs = itertools.count(1)
+
+
+def message_html(author, text):
+    cls = "msg system" if author == "SYSTEM" else "msg"
+    author = html.escape(author)
+    return (
+        f'<div class="{cls}" data-author="{author}">'
+        f"<strong>{author}:</strong> {html.escape(text)}</div>"
+    )
+
+
+class ChatLog:
+    def __init__(self, maxlen=CHAT_WINDOW):
+        self.maxlen = maxlen
+        self.epoch = next(_epochs)
+        self.last_seq = 0
+        self._items = []                        # (seq, author, text, html), tylko dopisywane
+
+    def append(self, author, text, seq=None):
+        seq = self.last_seq + 1 if seq is None else seq
+        items = self._items
+        items.append((seq, author, text, message_html(author, text)))
+        if len(items) >= 2 * self.maxlen:
+            self._items = items[-self.maxlen:]
+        self.last_seq = seq
+        return seq
+
+    def _window(self):
+        """Lista i zakres ostatnich maxlen wiadomości w chwili wywołania."""
+        items = self._items
+        end = len(items)
+        return items, max(0, end - self.maxlen), end
+
+    def since(self, seq):
+        """[(seq, html), ...] wiadomości o numerze > seq, które są jeszcze w buforze."""
+        items, start, end = self._window()
+        i = end
+        while i > start and items[i - 1][0] > seq:
+            i -= 1
+        return [(item[0], item[3]) for item in items[i:end]]
+
+    def nbytes(self):
+        """Przybliżony rozmiar tekstów w buforze (autor, treść, HTML)."""
+        items, start, end = self._window()
+        return sum(
+            sys.getsizeof(author) + sys.getsizeof(text) + sys.getsizeof(html)
+            for _, author, text, html in items[start:end]
+        )
+
+    def __len__(self):
+        return min(len(self._items), self.maxlen)
+
+    def __iter__(self):
+        items, start, end = self._window()
+        for seq, author, text, _ in items[start:end]:
+            yield {"seq": seq, "author": author, "text": text}
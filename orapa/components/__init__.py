@@ -0,0 +1,101 @@
+"""
+Komponenty Streamlit aplikacji (statyczne HTML + JS, bez budowania).
+
+- chat_view – okno czatu dokładające tylko nowe wiadomości (orapa.chat),
+- board_view – plansza rysowana w przeglądarce jako SVG z list
+  wierzchołków figur; serwer nie rysuje już PNG. Ta sama plansza jest
+  sterowaniem figur (klik/przeciąganie, klawiatura, pasek przycisków) –
+  akcje przychodzą paczką w jednym przebiegu skryptu, patrz board_actions.
+  Opcjonalnie pod figurami: mapa prawdopodobieństwa pól (heat_overlay).
+"""
+import os
+
+import streamlit.components.v1 as components
+
+from orapa.geometry import PIECE_STYLES, board_piece_vertices
+from orapa.legality import PIECE_NAMES
+from orapa.placements import ACTIONS, PIECE_ACTIONS, PIECES
+
+_DIR = os.path.dirname(os.path.abspath(__file__))
+
+chat_view = components.declare_component("orapa_chat", path=os.path.join(_DIR, "chat"))
+
+_board_view = components.declare_component("orapa_board", path=os.path.join(_DIR, "board"))
+
+# Ikony kolorów (na pasku sterowania)
+PIECE_ICONS = {
+    "y": "🟨",     # żółty trójkąt
+    "w": "⬜",     # białe figury + przezroczysty trójkąt
+    "b": "🟦",     # niebieski trójkąt + jasnoniebieski kwadrat
+    "s": "⬜",
+    "r": "🟥",     # czerwony równoległobok
+    "t2": "⬜",
+    "lb": "🟦",
+}
+
+BOARD_CONTROLS = [
+    {
+        "piece": piece,
+        "name": name,
+        "icon": PIECE_ICONS[piece],
+        "actions": [a for a in ACTIONS if a in PIECE_ACTIONS[piece]],
+    }
+    for piece, name in zip(PIECES, PIECE_NAMES)
+]
+MAX_BATCH = 200                      # więcej akcji w jednej paczce nie ma sensu
+
+
+def board_scene(state):
+    """7 list wierzchołków [x0, y0, x1, y1, ...] w jednostkach pól (jak w PIECE_STYLES)."""
+    return [
+        [round(float(v), 3) for v in verts.ravel()]
+        for verts in board_piece_vertices(state)
+    ]
+
+
+def heat_overlay(values, color):
+    """Mapa pól dla board_view/draw_board: 80 wartości 0–1 (pole y * COLS + x) w kolorze `color`."""
+    return {"color": color, "cells": [round(min(max(float(v), 0.0), 1.0), 3) for v in values]}
+
+
+def board_view(state, bg_color, key=None, editable=False, ack=None, heat=None):
+    """
+    Plansza w przeglądarce; przy zmianie ułożenia idzie tylko kilkaset bajtów wierzchołków.
+
+    editable włącza sterowanie figurami. ack = (mount, seq) ostatniej
+    wykonanej paczki – przeglądarka zdejmuje wtedy swój podgląd przesunięć.
+    heat – mapa pól z heat_overlay albo None.
+    """
+    return _board_view(
+        bg=bg_color,
+        styles=[[face or bg_color, edge, lw or 1.0] for face, edge, lw in PIECE_STYLES],
+        pieces=board_scene(state),
+        controls=BOARD_CONTROLS,
+        editable=editable,
+        ack=list(ack) if ack else None,
+        heat=heat,
+        key=key,
+        default=None,
+    )
+
+
+def board_actions(value, done):
+    """
+    Nowa paczka akcji z wartości board_view.
+
+    value = {mount, seq, actions: [[figura, akcja], ...]}, done = (mount, seq)
+    ostatniej wykonanej paczki. Zwraca ((mount, seq), [(figura, akcja), ...])
+    albo None, gdy nie ma nic nowego. Nieznane figury/akcje są pomijane.
+    """
+    if not value or not isinstance(value.get("actions"), list):
+        return None
+    batch = (value.get("mount"), value.get("seq"))
+    if batch == done:
+        return None
+    actions = [
+        (a[0], a[1])
+        for a in value["actions"][:MAX_BATCH]
+        if isinstance(a, list) and len(a) == 2
+        and a[0] in PIECE_ACTIONS and a[1] in PIECE_ACTIONS[a[0]]
+    ]
+    return batch, actions
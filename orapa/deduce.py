@@ -0,0 +1,485 @@
+"""
+Dedukcja: które ułożenia przeciwnika są jeszcze zgodne z odpowiedziami na strzały.
+
+Zbiór kandydatów to plik ułożeń z orapa.solver (rekordy 7 x uint16), a obok
+niego plik odpowiedzi <plik>.answers.npy: dla każdego ułożenia wszystkie 36
+odpowiedzi (orapa.rays.trace_layouts), zapisane kolumnami – (36, N) uint16,
+więc odpowiedzi na jedno pole wejścia leżą w pamięci obok siebie. Oba pliki
+są mapowane z dysku (memmap), nic nie jest wczytywane w całości.
+
+Deduction trzyma indeksy żywych kandydatów. Każdy strzał to jedno
+wektorowe porównanie kolumny odpowiedzi (przy pierwszym – całej kolumny,
+potem tylko żywych), a wymuszone położenie figury to kolumna ułożeń
+żywych kandydatów o jednej wartości. Pełna przestrzeń ułożeń jest ogromna
+(~1e16 kombinacji położeń), więc zbiór kandydatów buduje się z przypiętymi
+figurami albo limitem, jak w orapa.solver:
+
+    python -m orapa.solver enumerate cand.bin --fix s=6,6,0 --limit 2000000
+    python -m orapa.deduce answers cand.bin
+    python -m orapa.deduce filter cand.bin --probe C=13:0 --probe 4=R:5
+    python -m orapa.deduce advise cand.bin --probe C=13:0
+    python -m orapa.deduce demo cand.bin
+
+advise() ocenia wszystkie 36 pól wejścia: strzał dzieli kandydatów na
+grupy o tej samej odpowiedzi, a oczekiwany zysk informacji to entropia tego
+podziału (w bitach). Liczności odpowiedzi to bincount kolumn odpowiedzi
+żywych kandydatów; duże zbiory dzielimy na kawałki liczone równolegle – w
+CLI w puli procesów, w aplikacji we wspólnej puli wątków (bincount i
+indeksowanie numpy zwalniają GIL, a fork procesu serwera z wątkami
+Streamlit i SQLite nie jest bezpieczny). Wynik jest zapamiętany dla zbioru
+odkrytych strzałów (wspólnie dla wszystkich kopii z fork()).
+
+heatmap() daje dla każdej figury i każdego z 80 pól prawdopodobieństwo, że
+figura pokrywa pole. Liczy się z histogramu położeń figur wśród kandydatów
+(razy maski pól z orapa.placements): dokładnie, gdy kandydatów jest do
+HEATMAP_EXACT_MAX, a powyżej – z losowej próbki kandydatów (Monte Carlo,
+kawałki równolegle jak wyżej). Po strzale histogram nie jest liczony od
+nowa: odejmujemy odrzuconych kandydatów (albo liczymy zostających, jeśli
+jest ich mniej), a próbka jest zawężana tym samym strzałem.
+
+Nagłówek pliku ułożeń mówi, czy zbiór jest pełny (FLAG_EXHAUSTIVE) i które
+figury przypięto przy budowaniu. Przypięta figura ma jedno położenie z
+założenia, nie z dedukcji, więc forced() ją pomija. Prawdziwe ułożenie
+przeciwnika na pewno jest w zbiorze tylko wtedy, gdy jest on pełny i nic
+nie przypięto (complete); inaczej liczby, podpowiedzi i mapa pól dotyczą
+tylko tego podzbioru, a pusty wynik nie oznacza sprzeczności w strzałach.
+
+Aplikacja bierze zbiór z ORAPA_CANDIDATES (domyślnie orapa/data/candidates.bin),
+jeśli istnieje razem z odpowiedziami; bez niego pokazuje tylko komunikat.
+Domyślny zbiór (jednostajna próbka, robi to też .devcontainer):
+
+    python -m orapa.solver random orapa/data/candidates.bin 500000
+    python -m orapa.deduce answers orapa/data/candidates.bin
+"""
+import argparse
+import multiprocessing
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from orapa.geometry import COLS, ROWS
+from orapa.placements import DATA_PATH, PIECES, get_tables
+from orapa.rays import COLOR_BITS, ENTRY_LABELS, trace_layouts
+from orapa.solver import _workers, read_header, read_layouts
+
+CANDIDATES_PATH = os.environ.get("ORAPA_CANDIDATES", str(DATA_PATH.with_name("candidates.bin")))
+ANSWERS_CHUNK = 20000
+ANSWER_CODES = 1 << (6 + COLOR_BITS)   # odpowiedź: wyjście (6 bitów) | kolory << 6
+COUNTS_CHUNK = 100000                  # kandydatów na jeden kawałek liczności
+PARALLEL_MIN = 400000                  # od tylu kandydatów liczymy kawałki równolegle
+ADVICE_CACHE = 256                     # zapamiętane rankingi (zbiory strzałów)
+HEATMAP_EXACT_MAX = 2000000            # do tylu kandydatów mapa pól jest dokładna
+HEATMAP_SAMPLES = 200000               # wielkość próbki powyżej HEATMAP_EXACT_MAX
+
+
+def answers_path(layouts_path):
+    return str(layouts_path) + ".answers.npy"
+
+
+# ---------------------------------------------------------
+# Odpowiedzi dla zbioru kandydatów
+# ---------------------------------------------------------
+def _answers_task(args):
+    path, start, stop = args
+    return start, trace_layouts(read_layouts(path)[start:stop]).T
+
+
+def build_answers(layouts_path, out_path=None, workers=None, chunk=ANSWERS_CHUNK):
+    """Liczy (36, N) odpowiedzi dla pliku ułożeń; kawałki idą do puli procesów."""
+    layouts = read_layouts(layouts_path)
+    out_path = out_path or answers_path(layouts_path)
+    tmp = out_path + ".tmp.npy"
+    out = np.lib.format.open_memmap(tmp, mode="w+", dtype=np.uint16, shape=(len(ENTRY_LABELS), len(layouts)))
+    tasks = [(str(layouts_path), s, min(s + chunk, len(layouts))) for s in range(0, len(layouts), chunk)]
+    workers = _workers(workers)
+    if workers == 1 or len(tasks) <= 1:
+        results = map(_answers_task, tasks)
+        for start, block in results:
+            out[:, start:start + block.shape[1]] = block
+    else:
+        with multiprocessing.Pool(workers) as pool:
+            for start, block in pool.imap_unordered(_answers_task, tasks):
+                out[:, start:start + block.shape[1]] = block
+    out.flush()
+    del out
+    os.replace(tmp, out_path)
+    return out_path
+
+
+def load_answers(layouts_path, n):
+    """Odpowiedzi z pliku obok ułożeń (memmap) albo None, gdy brak/nie pasują."""
+    path = answers_path(layouts_path)
+    try:
+        if os.path.getmtime(path) < os.path.getmtime(layouts_path):
+            return None
+        answers = np.load(path, mmap_mode="r")
+    except (OSError, ValueError):
+        return None
+    if answers.shape != (len(ENTRY_LABELS), n):
+        return None
+    return answers
+
+
+# ---------------------------------------------------------
+# Liczności odpowiedzi i zysk informacji
+# ---------------------------------------------------------
+def answer_counts(answers, rows):
+    """(36, ANSWER_CODES): ilu kandydatów z `rows` (indeksy albo slice) daje daną odpowiedź."""
+    cols = np.asarray(answers[:, rows])
+    return np.stack([np.bincount(col, minlength=ANSWER_CODES) for col in cols])
+
+
+def _counts_task(args):
+    path, rows = args
+    return answer_counts(np.load(answers_path(path), mmap_mode="r"), rows)
+
+
+def information_gain(counts):
+    """Entropia podziału (bity) dla każdego wiersza liczności."""
+    counts = np.asarray(counts, dtype=np.float64)
+    total = counts.sum(axis=1, keepdims=True)
+    p = np.divide(counts, total, out=np.zeros_like(counts), where=total > 0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(p > 0, -p * np.log2(p), 0.0).sum(axis=1)
+
+
+# ---------------------------------------------------------
+# Histogram położeń i pokrycie pól
+# ---------------------------------------------------------
+def placement_hist(rows, sizes):
+    """Ile razy każde położenie występuje w ułożeniach (K, 7); figury po kolei, razem sum(sizes)."""
+    offsets = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+    flat = (np.asarray(rows, dtype=np.int64) + offsets).ravel()
+    return np.bincount(flat, minlength=int(np.sum(sizes)))
+
+
+def _hist_task(args):
+    path, rows = args
+    return placement_hist(read_layouts(path)[rows], get_tables().sizes())
+
+
+_cover = None
+
+
+def cell_cover():
+    """(sum rozmiarów, 80) float: 1, gdy położenie pokrywa pole (bit = y * COLS + x)."""
+    global _cover
+    if _cover is None:
+        masks = np.concatenate(get_tables().masks)
+        bits = np.arange(ROWS * COLS)
+        _cover = ((masks[:, bits // 64] >> (bits % 64).astype(np.uint64)) & np.uint64(1)).astype(np.float64)
+    return _cover
+
+
+_threads = None
+_threads_lock = threading.Lock()
+
+
+def _thread_pool():
+    """Pula wątków wspólna dla wszystkich Deduction w procesie (tworzona raz)."""
+    global _threads
+    with _threads_lock:
+        if _threads is None:
+            _threads = ThreadPoolExecutor(_workers(None), thread_name_prefix="orapa-deduce")
+        return _threads
+
+
+# ---------------------------------------------------------
+# Zbiór kandydatów
+# ---------------------------------------------------------
+class Deduction:
+    """Kandydaci zgodni ze strzałami; fork() daje niezależną kopię do dalszych strzałów."""
+
+    def __init__(self, layouts, answers, alive=None, probes=(), path=None, advice=None,
+                 exhaustive=False, pinned=(), processes=False):
+        self.layouts = layouts              # (N, 7) uint16
+        self.answers = answers              # (36, N) uint16
+        self.alive = alive                  # indeksy żywych kandydatów; None = wszyscy
+        self.probes = tuple(probes)         # ((pole wejścia, odpowiedź), ...)
+        self.path = path                    # plik ułożeń (dla puli procesów)
+        self.exhaustive = exhaustive        # plik ma wszystkie ułożenia (przy przypiętych figurach)
+        self.pinned = tuple(pinned)         # figury przypięte przy budowaniu zbioru
+        self.processes = processes          # kawałki w puli procesów (CLI) zamiast wątków
+        self._options = None
+        self._heat = None                   # (histogram położeń, próbka albo None) dla heatmap()
+        # rankingi advise() wspólne dla kopii: frozenset(strzały) -> lista
+        self._advice = advice if advice is not None else (OrderedDict(), threading.Lock())
+
+    @classmethod
+    def open(cls, layouts_path, build=True, workers=None, processes=False):
+        layouts = read_layouts(layouts_path)
+        answers = load_answers(layouts_path, len(layouts))
+        if answers is None:
+            if not build:
+                raise FileNotFoundError(answers_path(layouts_path))
+            build_answers(layouts_path, workers=workers)
+            answers = load_answers(layouts_path, len(layouts))
+        header = read_header(layouts_path)
+        return cls(layouts, answers, path=str(layouts_path),
+                   exhaustive=header["exhaustive"], pinned=header["pinned"], processes=processes)
+
+    @property
+    def complete(self):
+        """Czy ułożenie przeciwnika na pewno jest wśród kandydatów (pełny zbiór, nic nie przypięte)."""
+        return self.exhaustive and not self.pinned
+
+    def __len__(self):
+        return len(self.layouts) if self.alive is None else len(self.alive)
+
+    def fork(self):
+        ded = Deduction(self.layouts, self.answers, self.alive, self.probes, self.path, self._advice,
+                        self.exhaustive, self.pinned, self.processes)
+        ded._heat = self._heat
+        return ded
+
+    def observe(self, entry_label, answer):
+        """Zostawia kandydatów, którzy na strzał z entry_label dają `answer`."""
+        column = self.answers[ENTRY_LABELS.index(entry_label)]
+        if self.alive is None:
+            keep = np.asarray(column) == answer
+            removed = np.flatnonzero(~keep)
+            self.alive = np.flatnonzero(keep)
+        else:
+            keep = column[self.alive] == answer
+            removed = self.alive[~keep]
+            self.alive = self.alive[keep]
+        self.probes += ((entry_label, int(answer)),)
+        self._options = None
+        if self._heat is not None:
+            self._narrow_heat(column, answer, removed)
+        return len(self)
+
+    def _narrow_heat(self, column, answer, removed):
+        """Histogram dla heatmap() po strzale – bez liczenia wszystkich od nowa."""
+        hist, sample = self._heat
+        sizes = get_tables().sizes()
+        if sample is None:
+            if len(removed) < len(self.alive):
+                hist = hist - placement_hist(self.layouts[removed], sizes)
+            else:
+                hist = placement_hist(self.layouts[self.alive], sizes)
+        else:
+            hit = column[sample] == answer
+            hist = hist - placement_hist(self.layouts[sample[~hit]], sizes)
+            sample = sample[hit]
+        self._heat = (hist, sample)
+
+    def extend(self, probes):
+        """Dokłada strzały [(pole, odpowiedź), ...], których jeszcze nie ma (te same na początku)."""
+        probes = tuple((e, int(a)) for e, a in probes)
+        if probes[:len(self.probes)] != self.probes:
+            raise ValueError("strzały nie są kontynuacją dotychczasowych")
+        for entry_label, answer in probes[len(self.probes):]:
+            self.observe(entry_label, answer)
+        return self
+
+    def candidates(self):
+        """(K, 7) indeksy położeń żywych kandydatów."""
+        if self.alive is None:
+            return np.asarray(self.layouts)
+        return np.asarray(self.layouts[self.alive])
+
+    def options(self):
+        """Dla każdej figury: posortowane indeksy położeń, które jeszcze są możliwe."""
+        if self._options is None:
+            rows = self.candidates()
+            self._options = [np.unique(rows[:, p]) for p in range(len(PIECES))]
+        return self._options
+
+    def forced(self):
+        """
+        {figura: indeks położenia} dla figur, które mają już tylko jedno
+        położenie – bez figur przypiętych przy budowaniu zbioru.
+        """
+        if not len(self):
+            return {}
+        return {
+            PIECES[p]: int(o[0]) for p, o in enumerate(self.options())
+            if len(o) == 1 and PIECES[p] not in self.pinned
+        }
+
+    def _sum_chunks(self, local, task, rows, zero, workers=None):
+        """
+        Suma local(kawałek) po kawałkach `rows` (indeksy; None = wszyscy). Od
+        PARALLEL_MIN wierszy kawałki idą równolegle: z processes=True do
+        jednorazowej puli procesów jako task((plik, kawałek)), inaczej do
+        wspólnej puli wątków (_thread_pool).
+        """
+        n = len(self.layouts) if rows is None else len(rows)
+        chunks = [
+            slice(s, min(s + COUNTS_CHUNK, n)) if rows is None else rows[s:s + COUNTS_CHUNK]
+            for s in range(0, n, COUNTS_CHUNK)
+        ]
+        workers = _workers(workers)
+        if n < PARALLEL_MIN or workers == 1:
+            return sum((local(chunk) for chunk in chunks), zero)
+        if not self.processes or self.path is None:
+            return sum(_thread_pool().map(local, chunks), zero)
+        with multiprocessing.Pool(min(workers, len(chunks))) as pool:
+            return sum(pool.imap_unordered(task, [(self.path, chunk) for chunk in chunks]), zero)
+
+    def counts(self, workers=None):
+        """Liczności odpowiedzi (36, ANSWER_CODES) wśród żywych kandydatów."""
+        return self._sum_chunks(
+            lambda rows: answer_counts(self.answers, rows), _counts_task, self.alive,
+            np.zeros((len(ENTRY_LABELS), ANSWER_CODES), dtype=np.int64), workers,
+        )
+
+    def advise(self, workers=None):
+        """
+        Ranking pól wejścia: [(pole, zysk w bitach, oczekiwana liczba kandydatów
+        po strzale), ...] od najlepszego. Pola już ostrzelane mają zysk 0.
+        """
+        key = frozenset(self.probes)
+        cache, lock = self._advice
+        with lock:
+            if key in cache:
+                cache.move_to_end(key)
+                return cache[key]
+
+        counts = self.counts(workers)
+        gain = information_gain(counts)
+        n = max(len(self), 1)
+        expected = (counts.astype(np.float64) ** 2).sum(axis=1) / n
+        order = sorted(range(len(ENTRY_LABELS)), key=lambda e: (-gain[e], e))
+        ranking = [(ENTRY_LABELS[e], float(gain[e]), float(expected[e])) for e in order]
+
+        with lock:
+            cache[key] = ranking
+            if len(cache) > ADVICE_CACHE:
+                cache.popitem(last=False)
+        return ranking
+
+    def heatmap(self, workers=None, seed=0):
+        """
+        (7, 80) prawdopodobieństwo, że figura pokrywa pole (bit = y * COLS + x),
+        oraz czy policzone dokładnie (False – z próbki HEATMAP_SAMPLES kandydatów).
+        """
+        n = len(self)
+        sizes = get_tables().sizes()
+        heat = self._heat
+        stale = heat is not None and heat[1] is not None and (
+            n <= HEATMAP_EXACT_MAX or len(heat[1]) < HEATMAP_SAMPLES // 2
+        )
+        if heat is None or stale:
+            zero = np.zeros(int(np.sum(sizes)), dtype=np.int64)
+            sample = None
+            if n > HEATMAP_EXACT_MAX:
+                pick = np.sort(np.random.default_rng(seed).integers(n, size=HEATMAP_SAMPLES))
+                sample = pick if self.alive is None else self.alive[pick]
+            rows = self.alive if sample is None else sample
+            hist = self._sum_chunks(
+                lambda chunk: placement_hist(self.layouts[chunk], sizes), _hist_task, rows, zero, workers,
+            )
+            self._heat = heat = (hist, sample)
+
+        hist, sample = heat
+        total = n if sample is None else len(sample)
+        cover = cell_cover()
+        occupancy = np.zeros((len(PIECES), ROWS * COLS))
+        start = 0
+        for p, size in enumerate(sizes):
+            occupancy[p] = hist[start:start + size] @ cover[start:start + size]
+            start += size
+        return occupancy / max(total, 1), sample is None
+
+    def apply_forced(self, state, tables=None):
+        """Wpisuje wymuszone położenia do stanu planszy; zwraca listę ustawionych figur."""
+        tables = tables or get_tables()
+        forced = self.forced()
+        for piece, i in forced.items():
+            tables.write_piece(state, piece, i)
+        return list(forced)
+
+
+# ---------------------------------------------------------
+# CLI
+# ---------------------------------------------------------
+def _parse_probe(text):
+    """'C=13:0' – strzał z C, wyjście 13, maska kolorów 0 (albo 'C=<kod odpowiedzi>')."""
+    entry, _, answer = text.partition("=")
+    if entry not in ENTRY_LABELS:
+        raise ValueError(f"nieznane pole wejścia: {entry!r}")
+    if ":" in answer:
+        exit_label, mask = answer.split(":")
+        return entry, ENTRY_LABELS.index(exit_label) | int(mask) << 6
+    return entry, int(answer)
+
+
+def _report(ded, elapsed):
+    forced = ded.forced()
+    names = ", ".join(f"{p}={i}" for p, i in forced.items()) or "brak"
+    print(f"kandydatów: {len(ded)} ({elapsed * 1e3:.1f} ms), wymuszone figury: {names}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Dedukcja ułożenia przeciwnika ze strzałów")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    cmd = sub.add_parser("answers", help="policz plik odpowiedzi dla zbioru kandydatów")
+    cmd.add_argument("layouts")
+    cmd.add_argument("--workers", type=int, default=None)
+
+    cmd = sub.add_parser("filter", help="zawęź kandydatów podanymi strzałami")
+    cmd.add_argument("layouts")
+    cmd.add_argument("--probe", action="append", default=[], metavar="POLE=WYJŚCIE:KOLORY")
+
+    cmd = sub.add_parser("advise", help="ranking pól wejścia po podanych strzałach")
+    cmd.add_argument("layouts")
+    cmd.add_argument("--probe", action="append", default=[], metavar="POLE=WYJŚCIE:KOLORY")
+    cmd.add_argument("--workers", type=int, default=None)
+    cmd.add_argument("--top", type=int, default=10)
+
+    cmd = sub.add_parser("demo", help="losowy kandydat jako prawda, strzały po kolei")
+    cmd.add_argument("layouts")
+    cmd.add_argument("--seed", type=int, default=0)
+
+    args = parser.parse_args(argv)
+    if args.command == "answers":
+        start = time.perf_counter()
+        n = len(read_layouts(args.layouts))
+        path = build_answers(args.layouts, workers=args.workers)
+        print(f"odpowiedzi dla {n} ułożeń -> {path} ({time.perf_counter() - start:.1f} s)")
+        return 0
+
+    ded = Deduction.open(args.layouts, processes=True)
+    print(f"zbiór kandydatów: {len(ded)} ułożeń ({'pełny' if ded.exhaustive else 'niepełny'}, "
+          f"przypięte figury: {', '.join(ded.pinned) or 'brak'})")
+    if args.command == "filter":
+        for text in args.probe:
+            entry, answer = _parse_probe(text)
+            start = time.perf_counter()
+            ded.observe(entry, answer)
+            print(f"{text}: ", end="")
+            _report(ded, time.perf_counter() - start)
+        return 0
+
+    if args.command == "advise":
+        ded.extend(_parse_probe(text) for text in args.probe)
+        start = time.perf_counter()
+        ranking = ded.advise(args.workers)
+        print(f"kandydatów: {len(ded)}, ranking w {(time.perf_counter() - start) * 1e3:.1f} ms")
+        for entry, bits, expected in ranking[:args.top]:
+            print(f"  {entry:>2}: {bits:.3f} bit, zostanie średnio {expected:.1f}")
+        return 0
+
+    rng = np.random.default_rng(args.seed)
+    truth = int(rng.integers(len(ded)))
+    truth_answers = np.asarray(ded.answers[:, truth])
+    for e in rng.permutation(len(ENTRY_LABELS)):
+        start = time.perf_counter()
+        ded.observe(ENTRY_LABELS[e], truth_answers[e])
+        print(f"strzał {ENTRY_LABELS[e]:>2}: ", end="")
+        _report(ded, time.perf_counter() - start)
+        if len(ded) == 1:
+            break
+    print(f"prawda wśród kandydatów: {truth in set(ded.alive.tolist())}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,355 @@
+"""
+Silnik Orapy bez Streamlit: stabilne API dla botów, procesów roboczych,
+benchmarków i zadań offline.
+
+Import orapa.engine nie wciąga Streamlit ani matplotlib; wszystko, co jest
+tu wystawione, działa w procesach puli (multiprocessing). Ułożenie można
+podać jako słownik planszy (make_single_board), Board albo 7 indeksów
+położeń (kolejność PIECES); w tekście – kod Board (20 znaków base64url),
+"i0,i1,...,i6" albo JSON słownika planszy.
+
+    from orapa import engine
+    state = engine.random_state(seed=1)
+    engine.validate_layout(state)               # (True, "Ułożenie jest poprawne …")
+    engine.boards_equal(state, engine.Board.from_state(state))
+
+Zbiorczo (wiele procesów, wejście strumieniowo z plików albo stdin):
+
+    python -m orapa.engine validate layouts.txt --workers 8 --summary
+    python -m orapa.engine compare pairs.txt             # "A B" w linii
+    python -m orapa.engine compare - --against WpSMnnk8g_IAUDxRnEIG
+    python -m orapa.engine dedup layouts.txt > unique.txt    # orapa.symmetry
+"""
+import argparse
+import fileinput
+import json
+import math
+import multiprocessing
+import re
+import sys
+import time
+from itertools import islice
+
+import numpy as np
+
+from orapa.board import CODE_BYTES, Board
+from orapa.geometry import BOARD_KEYS, COLS, ROWS, make_single_board
+from orapa.legality import (
+    CONTACT_NONE,
+    check_layouts,
+    layout_message,
+    outside_board,
+    outside_message,
+    state_params,
+)
+from orapa.placements import ACTIONS, PIECE_ACTIONS, PIECES, get_tables, on_grid
+from orapa.rays import ENTRY_LABELS, answer_table, describe_answer, probe
+from orapa.solver import random_layouts
+from orapa.symmetry import DedupIndex, canonical_board, get_symmetry_tables, layout_key
+
+__all__ = [
+    "ACTIONS", "BOARD_KEYS", "COLS", "ENTRY_LABELS", "PIECES", "PIECE_ACTIONS", "ROWS",
+    "Board", "DedupIndex", "answer_table", "apply_action", "as_board", "boards_equal",
+    "canonical_board", "check_many", "describe_answer", "layout_key",
+    "make_single_board", "parse_layout", "probe", "random_state", "validate_layout",
+]
+
+CHUNK = 10000                       # linii na zadanie puli
+_CODE_RE = re.compile(r"[A-Za-z0-9_-]{%d}" % -(-CODE_BYTES * 4 // 3))
+_STATUS_KEYS = ("layout_valid", "layout_msg")     # status sprawdzania – pomijany
+_COORD_MAX = 1000                   # |współrzędna| z JSON (dalej i tak poza planszą)
+
+
+# ---------------------------------------------------------
+# API
+# ---------------------------------------------------------
+def as_board(layout, tables=None):
+    """Board z dowolnej postaci ułożenia (słownik planszy, Board, 7 indeksów)."""
+    if isinstance(layout, (Board, dict)):
+        return Board.from_state(layout)
+    return Board.from_indices(layout, tables or get_tables())
+
+
+def boards_equal(a, b):
+    """
+    Czy dwa ułożenia są identyczne (warunek wygranej) – po kształtach figur:
+    aliasy położeń równoległoboku (inne r_ori/r_flip, ten sam kształt) są równe.
+    """
+    return canonical_board(as_board(a), symmetries=False) == canonical_board(as_board(b), symmetries=False)
+
+
+def apply_action(state, piece, action):
+    """Ruch figury na planszy (zmienia `state`) – te same ograniczenia co w aplikacji."""
+    if action not in PIECE_ACTIONS[piece]:
+        raise ValueError(f"figura {piece} nie ma akcji {action!r}")
+    get_tables().step(state, piece, action)
+    return state
+
+
+def random_state(seed=None):
+    """Losowe poprawne ułożenie jako słownik planszy (orapa.solver.random_layouts)."""
+    return get_tables().state_from_indices(random_layouts(1, seed)[0])
+
+
+def _parse_state(text):
+    """Słownik planszy z JSON – tylko klucze BOARD_KEYS (i statusu) o właściwych typach."""
+    data = json.loads(text)
+    if not isinstance(data, dict):
+        raise ValueError(f"to nie jest słownik planszy: {text!r}")
+    unknown = sorted(set(data) - set(BOARD_KEYS) - set(_STATUS_KEYS))
+    if unknown:
+        raise ValueError(f"nieznane klucze planszy: {', '.join(unknown)}")
+    state = make_single_board()
+    for key in BOARD_KEYS:
+        if key not in data:
+            continue
+        value = data[key]
+        if key == "r_flip":
+            ok = isinstance(value, bool) or value in (0, 1) and isinstance(value, int)
+        elif key.endswith("_ori"):
+            ok = isinstance(value, int) and not isinstance(value, bool)
+        else:
+            ok = (isinstance(value, (int, float)) and not isinstance(value, bool)
+                  and math.isfinite(value) and abs(value) <= _COORD_MAX)
+        if not ok:
+            raise ValueError(f"niepoprawna wartość {key}: {value!r}")
+        state[key] = bool(value) if key == "r_flip" else value
+    return state
+
+
+def parse_layout(text):
+    """Ułożenie z tekstu: kod Board, 'i0,...,i6' albo JSON słownika planszy."""
+    text = text.strip()
+    if text.startswith("{"):
+        return _parse_state(text)
+    if "," in text:
+        idx = [int(v) for v in text.split(",")]
+        sizes = get_tables().sizes()
+        if len(idx) != len(PIECES) or not all(0 <= i < n for i, n in zip(idx, sizes)):
+            raise ValueError(f"niepoprawne indeksy położeń: {text!r}")
+        return idx
+    if not _CODE_RE.fullmatch(text):
+        raise ValueError(f"to nie jest kod ułożenia: {text!r}")
+    return Board.from_code(text)
+
+
+def validate_layout(layout):
+    """
+    (poprawne, komunikat) dla jednego ułożenia – jak check_many. W odróżnieniu
+    od orapa.legality.check_layout (stany z aplikacji) odrzuca też figury
+    wystające poza planszę.
+    """
+    return check_many([layout])[0]
+
+
+def check_many(layouts):
+    """
+    [(poprawne, komunikat), ...] dla wielu ułożeń naraz: ułożenia z tablic
+    położeń idą przez tablice par, pozostałe przez geometrię – oba wektorowo.
+    Słownik trafia do tablic tylko wtedy, gdy leży dokładnie na siatce
+    (placements.on_grid) – locate zaokrągla x, y do 0.1 i ucina obrót.
+    Ułożenia spoza tablic mogą wystawać poza planszę (aplikacja przycina
+    figury, dane z zewnątrz nie) – to też jest niepoprawne ułożenie.
+    """
+    tables = get_tables()
+    indexed, params = [], []
+    where = []
+    for layout in layouts:
+        if isinstance(layout, dict):
+            idx = tables.locate(layout) if on_grid(layout) else None
+            row = state_params(layout)
+        else:
+            board = as_board(layout, tables)
+            idx = board.to_indices(tables)
+            row = None if idx is not None else state_params(board.to_state())
+        if idx is not None:
+            where.append((0, len(indexed)))
+            indexed.append(idx)
+        else:
+            where.append((1, len(params)))
+            params.append(row)
+
+    results = [
+        tables.check_indexed(np.array(indexed)) if indexed else ((), ()),
+        check_layouts(params) if params else ((), ()),
+    ]
+    outside = outside_board(params) if params else ()
+    out = []
+    for kind, k in where:
+        if kind == 1 and outside[k] >= 0:
+            out.append((False, outside_message(int(outside[k]))))
+            continue
+        verdict, pair = int(results[kind][0][k]), int(results[kind][1][k])
+        out.append((verdict == CONTACT_NONE, layout_message(verdict, pair)))
+    return out
+
+
+# ---------------------------------------------------------
+# Zadania zbiorcze
+# ---------------------------------------------------------
+def _validate_chunk(lines):
+    parsed, errors = [], {}
+    for n, line in enumerate(lines):
+        try:
+            parsed.append(parse_layout(line))
+        except ValueError as exc:
+            errors[n] = str(exc)
+    checked = iter(check_many(parsed))
+    out, ok = [], 0
+    for n, line in enumerate(lines):
+        if n in errors:
+            out.append(f"{line.strip()}\terror\t{errors[n]}")
+            continue
+        valid, msg = next(checked)
+        ok += valid
+        out.append(f"{line.strip()}\t{'ok' if valid else 'bad'}\t{msg}")
+    return out, ok, len(errors)
+
+
+def _compare_chunk(args):
+    lines, reference = args             # reference: Board albo None
+    out, ok, errors = [], 0, 0
+    for line in lines:
+        try:
+            if reference is not None:
+                a, b = as_board(parse_layout(line)), reference
+            else:
+                left, right = line.split()
+                a, b = as_board(parse_layout(left)), as_board(parse_layout(right))
+        except ValueError as exc:
+            out.append(f"{line.strip()}\terror\t{exc}")
+            errors += 1
+            continue
+        same = boards_equal(a, b)
+        ok += same
+        out.append(f"{line.strip()}\t{'equal' if same else 'different'}")
+    return out, ok, errors
+
+
+def _keys_chunk(args):
+    lines, symmetries = args
+    tables = get_tables()
+    keys, errors, indexed, where = [], [], [], []
+    for n, line in enumerate(lines):
+        try:
+            board = as_board(parse_layout(line), tables)
+        except ValueError as exc:
+            keys.append(None)
+            errors.append(f"{line.strip()}\terror\t{exc}")
+            continue
+        idx = board.to_indices(tables)
+        if idx is None:
+            keys.append(layout_key(board, symmetries))
+        else:
+            keys.append(None)
+            indexed.append(idx)
+            where.append(n)
+    if indexed:
+        for n, key in zip(where, get_symmetry_tables().keys(indexed, symmetries).tolist()):
+            keys[n] = key
+    return lines, keys, errors
+
+
+def _chunks(lines, size):
+    lines = (line for line in lines if line.strip())
+    while True:
+        chunk = list(islice(lines, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _imap(task, tasks, workers):
+    """Wyniki zadań w kolejności wejścia: po kolei albo z puli procesów."""
+    if workers == 1:
+        yield from map(task, tasks)
+        return
+    with multiprocessing.Pool(workers) as pool:
+        yield from pool.imap(task, tasks)
+
+
+def run_dedup(tasks, workers=1, out=None, symmetries=True):
+    """Wypisuje pierwsze wystąpienia ułożeń (klucze kanoniczne liczy pula)."""
+    index = DedupIndex(symmetries)
+    total = unique = errors = 0
+    for lines, keys, bad in _imap(_keys_chunk, ((chunk, symmetries) for chunk in tasks), workers):
+        good = [k for k in keys if k is not None]
+        new = iter(index.add_keys(good))
+        for line, key in zip(lines, keys):
+            if key is not None and next(new) and out is not None:
+                out.write(line.strip() + "\n")
+        for msg in bad:
+            print(msg, file=sys.stderr)
+        total += len(lines)
+        errors += len(bad)
+    unique = len(index)
+    return total, unique, errors
+
+
+def run_bulk(task, tasks, workers=1, out=None):
+    """Wykonuje zadania (po kolei albo w puli), wypisuje wyniki w kolejności wejścia."""
+    total = ok = errors = 0
+    for lines, n_ok, n_err in _imap(task, tasks, workers):
+        if out is not None:
+            out.write("\n".join(lines) + "\n")
+        total += len(lines)
+        ok += n_ok
+        errors += n_err
+    return total, ok, errors
+
+
+# ---------------------------------------------------------
+# CLI
+# ---------------------------------------------------------
+def main(argv=None):
+    from orapa.solver import _workers
+
+    parser = argparse.ArgumentParser(description="Zbiorcze sprawdzanie i porównywanie ułożeń Orapy")
+    sub = parser.add_subparsers(dest="command", required=True)
+    for name, help_text in (
+        ("validate", "czy ułożenia są poprawne (jak validate_layout)"),
+        ("compare", "czy ułożenia są identyczne (pary 'A B' w linii albo --against)"),
+        ("dedup", "każde ułożenie raz (postać kanoniczna, orapa.symmetry)"),
+    ):
+        cmd = sub.add_parser(name, help=help_text)
+        cmd.add_argument("files", nargs="*", default=["-"], help="pliki z ułożeniami ('-' = stdin)")
+        cmd.add_argument("--workers", type=int, default=None,
+                         help="liczba procesów (domyślnie wszystkie rdzenie)")
+        cmd.add_argument("--chunk", type=int, default=CHUNK)
+        cmd.add_argument("--summary", action="store_true", help="tylko podsumowanie")
+        if name == "compare":
+            cmd.add_argument("--against", default=None, metavar="UŁOŻENIE",
+                             help="porównuj każdą linię z tym ułożeniem")
+        if name == "dedup":
+            cmd.add_argument("--no-symmetry", action="store_true",
+                             help="tylko aliasy położeń, bez odbić planszy")
+
+    args = parser.parse_args(argv)
+    reference = None
+    if getattr(args, "against", None):
+        try:
+            reference = as_board(parse_layout(args.against))
+        except ValueError as exc:
+            parser.error(f"--against: {exc}")
+    start = time.perf_counter()
+    chunks = _chunks(fileinput.input(args.files, encoding="utf-8"), args.chunk)
+    out = None if args.summary else sys.stdout
+    if args.command == "dedup":
+        total, ok, errors = run_dedup(chunks, _workers(args.workers), out, not args.no_symmetry)
+    elif args.command == "validate":
+        total, ok, errors = run_bulk(_validate_chunk, chunks, _workers(args.workers), out)
+    else:
+        tasks = ((chunk, reference) for chunk in chunks)
+        total, ok, errors = run_bulk(_compare_chunk, tasks, _workers(args.workers), out)
+    elapsed = time.perf_counter() - start
+    label = {"validate": "poprawnych", "compare": "identycznych", "dedup": "różnych"}[args.command]
+    print(
+        f"{total} ułożeń: {label} {ok}, innych {total - ok - errors}, błędów {errors} "
+        f"({elapsed:.1f} s, {total / max(elapsed, 1e-9):.0f}/s)",
+        file=sys.stderr,
+    )
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
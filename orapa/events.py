@@ -0,0 +1,224 @@
+"""
+Dziennik zdarzeń gry (tabela events w orapa.db) i odtwarzanie stanu z niego.
+
+Każda zmiana stanu to jedno zdarzenie (czas, rodzaj, gracz, dane):
+
+    j  gracz dołączył do pokoju
+    i  gracz dostał nowe, puste plansze (nowa sesja)
+    m  ruchy figur: plansza (g = zielona, f = fioletowa) + po znaku na ruch
+    b  cała plansza naraz (losowe ułożenie, pewne figury z dedukcji):
+       plansza + kod ułożenia (orapa.board)
+    s  START: kod zatwierdzonej planszy (orapa.board)
+    p  strzał: pole wejścia:odpowiedź
+    c  wiadomość czatu (treść jako JSON)
+    f  ZAKOŃCZ: zwycięzca w polu gracza
+    r  RESTART (gracz dostaje nowe plansze, reszta pokoju jak w restart())
+
+Zapis jest przyrostowy: RoomStore zbiera zdarzenia pokoju i przy zapisie
+do bazy wstawia jeden kawałek jako nowy wiersz tabeli events (starsze bazy
+mają początek dziennika w games.moves – store.read_game_log skleja oba).
+Kawałek zaczyna się wierszem "@<czas>" (dziesiąte części sekundy od
+epoki), a każde zdarzenie to wiersz "<dt>,<rodzaj>,<gracz>,<dane>" z dt
+względem poprzedniego zdarzenia – kawałki z różnych procesów można po
+prostu sklejać. Ruch figury to jeden znak base64url (figura * 7 + akcja,
+kolejność PIECES i ACTIONS), więc paczka 10 ruchów z planszy zajmuje
+kilkanaście bajtów zamiast pełnego stanu planszy.
+
+replay() przechodzi dziennik raz (O(liczba zdarzeń)) i odtwarza pokój –
+graczy, ich plansze, czat, wynik – po dowolnej liczbie zdarzeń. Ruchy
+figur idą po tablicach przejść (orapa.placements), bez geometrii.
+
+    python -m orapa.events KOD_POKOJU [--at N] [--db orapa.db]
+"""
+import argparse
+import json
+import sqlite3
+import time
+from urllib.parse import quote, unquote
+
+from orapa.board import Board
+from orapa.placements import ACTIONS, PIECES
+
+_MOVE_CHARS = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-_"
+_BOARD_CHARS = {"zielona": "g", "fioletowa": "f"}
+_BOARD_NAMES = {v: k for k, v in _BOARD_CHARS.items()}
+TICK = 0.1                            # rozdzielczość czasu zdarzeń (s)
+
+
+def _ticks(t):
+    return int(round(t / TICK))
+
+
+# ---------------------------------------------------------
+# Kodowanie
+# ---------------------------------------------------------
+def encode_moves(board_key, actions):
+    """Dane zdarzenia m: [(figura, akcja), ...] na planszy board_key."""
+    return _BOARD_CHARS[board_key] + "".join(
+        _MOVE_CHARS[PIECES.index(piece) * len(ACTIONS) + ACTIONS.index(action)]
+        for piece, action in actions
+    )
+
+
+def decode_moves(payload):
+    """(plansza, [(figura, akcja), ...]) z danych zdarzenia m."""
+    moves = []
+    for ch in payload[1:]:
+        p, a = divmod(_MOVE_CHARS.index(ch), len(ACTIONS))
+        moves.append((PIECES[p], ACTIONS[a]))
+    return _BOARD_NAMES[payload[0]], moves
+
+
+def encode_board(board_key, board):
+    """Dane zdarzenia b: plansza board_key ustawiona na `board` (Board)."""
+    return _BOARD_CHARS[board_key] + board.code
+
+
+def decode_board(payload):
+    """(plansza, Board) z danych zdarzenia b."""
+    return _BOARD_NAMES[payload[0]], Board.from_code(payload[1:])
+
+
+def encode_chunk(events):
+    """Kawałek dziennika z [(czas, rodzaj, gracz, dane), ...] (czas w s)."""
+    if not events:
+        return ""
+    clock = _ticks(events[0][0])
+    lines = [f"@{clock}"]
+    for t, kind, player, payload in events:
+        now = _ticks(t)
+        lines.append(f"{now - clock},{kind},{quote(player or '', safe='')},{payload}")
+        clock = now
+    return "\n".join(lines) + "\n"
+
+
+def parse(log):
+    """Zdarzenia dziennika: (czas w s, rodzaj, gracz, dane) po kolei."""
+    clock = 0
+    for line in (log or "").splitlines():
+        if not line:
+            continue
+        if line[0] == "@":
+            clock = int(line[1:])
+            continue
+        dt, kind, player, payload = line.split(",", 3)
+        clock += int(dt)
+        yield clock * TICK, kind, unquote(player), payload
+
+
+# ---------------------------------------------------------
+# Odtwarzanie
+# ---------------------------------------------------------
+def _fresh_boards(start):
+    return {"zielona": list(start), "fioletowa": list(start)}
+
+
+def _player(room, nick, start):
+    players = room["players"]
+    if nick not in players:
+        players[nick] = {
+            "ready": False,
+            "green_locked": None,
+            "probes": [],
+            "boards": _fresh_boards(start),
+            "moves": 0,
+        }
+    return players[nick]
+
+
+def replay(log, upto=None, tables=None):
+    """
+    Stan pokoju po pierwszych `upto` zdarzeniach (domyślnie po wszystkich):
+    {"players": {nick: {"ready", "green_locked", "probes", "boards", "moves"}},
+     "chat": [(czas, autor, treść), ...], "game_over", "winner", "events", "time"}.
+    Plansze graczy są zwracane jako Board.
+    """
+    from orapa.geometry import make_single_board
+    from orapa.placements import get_tables
+
+    tables = tables or get_tables()
+    start = tables.locate(make_single_board())
+    room = {"players": {}, "chat": [], "game_over": False, "winner": None, "events": 0, "time": None}
+
+    for n, (t, kind, nick, payload) in enumerate(parse(log)):
+        if upto is not None and n >= upto:
+            break
+        room["events"], room["time"] = n + 1, t
+        if kind == "c":
+            room["chat"].append((t, nick, json.loads(payload)))
+            continue
+        if kind == "f":
+            room["game_over"], room["winner"] = True, nick
+            continue
+        if kind == "r":
+            room["game_over"], room["winner"] = False, None
+            for p in room["players"].values():
+                p.update(ready=False, green_locked=None, probes=[])
+            if nick:
+                _player(room, nick, start)["boards"] = _fresh_boards(start)
+            continue
+        player = _player(room, nick, start)
+        if kind == "i":
+            player["boards"] = _fresh_boards(start)
+        elif kind == "m":
+            board_key, actions = decode_moves(payload)
+            idx = player["boards"][board_key]
+            for piece, action in actions:
+                p = PIECES.index(piece)
+                idx[p] = int(tables.moves[p][idx[p], ACTIONS.index(action)])
+            player["moves"] += len(actions)
+        elif kind == "b":
+            board_key, board = decode_board(payload)
+            player["boards"][board_key] = tables.locate(board.to_state())
+        elif kind == "s":
+            player["ready"] = True
+            player["green_locked"] = Board.from_code(payload)
+        elif kind == "p":
+            entry, answer = payload.split(":")
+            player["probes"].append({"entry": entry, "answer": int(answer)})
+
+    for player in room["players"].values():
+        player["boards"] = {
+            key: Board.from_indices(idx, tables) for key, idx in player["boards"].items()
+        }
+    return room
+
+
+# ---------------------------------------------------------
+# CLI
+# ---------------------------------------------------------
+def main(argv=None):
+    from orapa.store import DB_PATH, SCHEMA, read_game_log
+
+    parser = argparse.ArgumentParser(description="Odtwarzanie gry z dziennika zdarzeń pokoju")
+    parser.add_argument("room")
+    parser.add_argument("--at", type=int, default=None, metavar="N", help="stan po N zdarzeniach")
+    parser.add_argument("--db", default=DB_PATH)
+    args = parser.parse_args(argv)
+
+    conn = sqlite3.connect(args.db)
+    conn.executescript(SCHEMA)              # starsza baza może nie mieć tabeli events
+    log = read_game_log(conn, args.room)
+    if not log:
+        print(f"brak dziennika dla pokoju {args.room!r}")
+        return 1
+
+    start = time.perf_counter()
+    room = replay(log, args.at)
+    elapsed = time.perf_counter() - start
+    print(f"{room['events']} zdarzeń ({len(log)} B) odtworzone w {elapsed * 1e3:.1f} ms")
+    if room["game_over"]:
+        print(f"gra zakończona, wygrał {room['winner']}")
+    for nick, p in room["players"].items():
+        locked = p["green_locked"].code if p["green_locked"] else "-"
+        print(
+            f"{nick}: gotowy={p['ready']} zatwierdzona={locked} ruchów={p['moves']} "
+            f"strzałów={len(p['probes'])} zielona={p['boards']['zielona']} "
+            f"fioletowa={p['boards']['fioletowa']}"
+        )
+    print(f"czat: {len(room['chat'])} wiadomości")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
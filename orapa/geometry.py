@@ -0,0 +1,234 @@
+"""Geometria planszy i figur Orapy (bez zależności od Streamlit)."""
+import numpy as np
+
+ROWS = 8
+COLS = 10
+
+# Klucze opisujące położenie figur (bez statusu sprawdzania)
+BOARD_KEYS = [
+    "y_cx", "y_cy", "y_ori",
+    "w_cx", "w_cy", "w_ori",
+    "b_cx", "b_cy", "b_ori",
+    "s_cx", "s_cy", "s_ori",
+    "r_cx", "r_cy", "r_ori", "r_flip",
+    "t2_cx", "t2_cy", "t2_ori",
+    "lb_x", "lb_y",
+]
+
+
+# ---------------------------------------------------------
+# Stan JEDNEJ planszy
+# ---------------------------------------------------------
+def make_single_board():
+    return {
+        # Żółty trójkąt
+        "y_cx": 3.0,
+        "y_cy": 3.0,
+        "y_ori": 0,
+        # Biały trójkąt
+        "w_cx": 3.0,
+        "w_cy": 5.0,
+        "w_ori": 0,
+        # Niebieski trójkąt
+        "b_cx": 7.0,
+        "b_cy": 3.0,
+        "b_ori": 0,
+        # Biały kwadrat (romb)
+        "s_cx": 6.0,
+        "s_cy": 6.0,
+        "s_ori": 0,
+        # Czerwony równoległobok
+        "r_cx": 4.0,
+        "r_cy": 2.0,
+        "r_ori": 0,
+        "r_flip": False,
+        # Przezroczysty trójkąt (hyp = 2)
+        "t2_cx": 2.0,
+        "t2_cy": 2.0,
+        "t2_ori": 0,
+        # Jasnoniebieski kwadrat 1x1
+        "lb_x": 1.0,
+        "lb_y": 1.0,
+        # Status sprawdzania
+        "layout_valid": None,
+        "layout_msg": "",
+    }
+
+
+# ---------------------------------------------------------
+# Geometria figur (bazowa w (0,0))
+# ---------------------------------------------------------
+BASE_YELLOW = np.array([
+    [-1.0, -1.0],
+    [ 1.0, -1.0],
+    [-1.0,  1.0],
+])
+
+BASE_SMALL_TRI = np.array([
+    [-2.0,  0.0],
+    [ 2.0,  0.0],
+    [ 0.0,  2.0],
+])
+
+BASE_SQUARE_DIAMOND = np.array([
+    [-1.0,  0.0],
+    [ 0.0, -1.0],
+    [ 1.0,  0.0],
+    [ 0.0,  1.0],
+])
+
+SCALE_TRI2 = 0.9
+BASE_TRI_HYP2 = SCALE_TRI2 * np.array([
+    [-1.0, 0.0],
+    [ 1.0, 0.0],
+    [ 0.0, 1.0],
+])
+
+BASE_PAR_INT = np.array([
+    [0.0, 0.0],
+    [2.0, 0.0],
+    [3.0, 1.0],
+    [1.0, 1.0],
+])
+
+ROT_MATS = [
+    np.array([[1.0, 0.0],
+              [0.0, 1.0]]),
+    np.array([[0.0, -1.0],
+              [1.0,  0.0]]),
+    np.array([[-1.0,  0.0],
+              [ 0.0, -1.0]]),
+    np.array([[ 0.0, 1.0],
+              [-1.0, 0.0]]),
+]
+
+
+def yellow_vertices(cx, cy, ori):
+    M = ROT_MATS[ori % 4]
+    offs = BASE_YELLOW @ M.T
+    return offs + np.array([cx, cy])
+
+
+def small_tri_vertices(cx, cy, ori):
+    M = ROT_MATS[ori % 4]
+    offs = BASE_SMALL_TRI @ M.T
+    return offs + np.array([cx, cy])
+
+
+def square_diamond_vertices(cx, cy, ori):
+    M = ROT_MATS[ori % 4]
+    offs = BASE_SQUARE_DIAMOND @ M.T
+    return offs + np.array([cx, cy])
+
+
+def tri_hyp2_vertices(cx, cy, ori):
+    M = ROT_MATS[ori % 4]
+    offs = BASE_TRI_HYP2 @ M.T
+    return offs + np.array([cx, cy])
+
+
+def red_vertices(rx, ry, ori, flip):
+    base = BASE_PAR_INT.copy()
+    if flip:
+        base[:, 0] *= -1.0
+    M = ROT_MATS[ori % 4]
+    offs = base @ M.T
+    return offs + np.array([rx, ry])
+
+
+def lightblue_vertices(lx, ly):
+    base = np.array([
+        [0.0, 0.0],
+        [1.0, 0.0],
+        [1.0, 1.0],
+        [0.0, 1.0],
+    ])
+    return base + np.array([lx, ly])
+
+
+def clamp_center(cx, cy, ori, vertex_func):
+    verts = vertex_func(cx, cy, ori)
+    minx, maxx = verts[:, 0].min(), verts[:, 0].max()
+    miny, maxy = verts[:, 1].min(), verts[:, 1].max()
+
+    if minx < 0:
+        cx += -minx
+    if maxx > COLS:
+        cx -= (maxx - COLS)
+
+    verts = vertex_func(cx, cy, ori)
+    miny, maxy = verts[:, 1].min(), verts[:, 1].max()
+
+    if miny < 0:
+        cy += -miny
+    if maxy > ROWS:
+        cy -= (maxy - ROWS)
+
+    return float(cx), float(cy)
+
+
+def clamp_parallelogram(rx, ry, ori, flip):
+    verts = red_vertices(rx, ry, ori, flip)
+    minx, maxx = verts[:, 0].min(), verts[:, 0].max()
+    miny, maxy = verts[:, 1].min(), verts[:, 1].max()
+
+    if minx < 0:
+        rx += -minx
+    if maxx > COLS:
+        rx -= (maxx - COLS)
+
+    verts = red_vertices(rx, ry, ori, flip)
+    miny, maxy = verts[:, 1].min(), verts[:, 1].max()
+
+    if miny < 0:
+        ry += -miny
+    if maxy > ROWS:
+        ry -= (maxy - ROWS)
+
+    return float(round(rx)), float(round(ry))
+
+
+def clamp_lightblue(lx, ly):
+    verts = lightblue_vertices(lx, ly)
+    minx, maxx = verts[:, 0].min(), verts[:, 0].max()
+    miny, maxy = verts[:, 1].min(), verts[:, 1].max()
+
+    if minx < 0:
+        lx += -minx
+    if maxx > COLS:
+        lx -= (maxx - COLS)
+    if miny < 0:
+        ly += -miny
+    if maxy > ROWS:
+        ly -= (maxy - ROWS)
+
+    return float(lx), float(ly)
+
+
+# ---------------------------------------------------------
+# Cała plansza
+# ---------------------------------------------------------
+def board_piece_vertices(state):
+    """Wierzchołki wszystkich figur w stałej kolejności (jak w PIECE_STYLES)."""
+    return [
+        yellow_vertices(state["y_cx"], state["y_cy"], state["y_ori"]),
+        small_tri_vertices(state["w_cx"], state["w_cy"], state["w_ori"]),
+        small_tri_vertices(state["b_cx"], state["b_cy"], state["b_ori"]),
+        square_diamond_vertices(state["s_cx"], state["s_cy"], state["s_ori"]),
+        red_vertices(state["r_cx"], state["r_cy"],
+                     state["r_ori"], state["r_flip"]),
+        tri_hyp2_vertices(state["t2_cx"], state["t2_cy"], state["t2_ori"]),
+        lightblue_vertices(state["lb_x"], state["lb_y"]),
+    ]
+
+
+# (wypełnienie, obrys, grubość obrysu); None = kolor tła planszy
+PIECE_STYLES = [
+    ("yellow", "yellow", None),      # Żółty trójkąt
+    ("white", "white", None),        # Biały trójkąt
+    ("blue", "blue", None),          # Niebieski trójkąt
+    ("white", "white", None),        # Biały romb
+    ("red", "red", None),            # Czerwony równoległobok
+    (None, "white", 4.0),            # Przezroczysty trójkąt (hyp=2)
+    ("#66c2ff", "#66c2ff", None),    # Jasnoniebieski kwadrat 1x1
+]
@@ -0,0 +1,174 @@
+"""
+Powiadamianie sesji Streamlit o zmianach w pokoju (pub/sub po kodzie pokoju).
+
+Każdy pełny przebieg skryptu zapisuje sesję jako subskrybenta swojego pokoju
+razem z wersją pokoju, którą narysował. Zmiana w RoomStore (czat, START,
+RESTART, ZAKOŃCZ, strzał) publikuje kod pokoju, a wątek rozsyłający budzi
+tylko sesje z tego pokoju, które mają starszą wersję – przez
+AppSession.request_rerun na pętli zdarzeń Streamlit, tak jakby klient sam
+poprosił o odświeżenie. Sesji, której skrypt właśnie działa, nie budzimy
+(request_rerun przerwałby przebieg) – zmianę wyłapie sprawdzanie wersji
+pokoju w app.py. Hub korzysta z prywatnych API Streamlit (_session_mgr,
+_get_async_objs, AppSession._state), stąd przypięta wersja w
+requirements.txt.
+
+Zmiany z innych procesów wykrywamy przez PRAGMA data_version połączenia
+zapisującego magazynu (RoomStore.data_version – zmienia się tylko po
+commitach innych procesów, więc własne zapisy nie budzą nikogo drugi raz);
+dopiero wtedy czytamy wersje subskrybowanych pokoi. Odstęp sprawdzania
+rośnie od POLL_MIN do POLL_MAX, gdy nic się nie dzieje.
+
+Bez działającego serwera Streamlit (AppTest, skrypty) hub jest wyłączony
+(enabled == False) i aplikacja zostaje przy okresowym odświeżaniu. Błąd
+w jednym obiegu wątku rozsyłającego jest logowany i wątek działa dalej;
+gdyby wątek jednak się skończył, enabled wraca na False. Wątek kończy się
+razem z magazynem (RoomStore.close).
+"""
+import logging
+import threading
+import time
+from collections import defaultdict
+
+log = logging.getLogger(__name__)
+
+POLL_MIN = 0.02
+POLL_MAX = 0.1
+COALESCE = 0.005
+
+
+def _runtime():
+    try:
+        from streamlit.runtime import Runtime
+    except ImportError:
+        return None
+    return Runtime.instance() if Runtime.exists() else None
+
+
+def current_session_id():
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+    except ImportError:
+        return None
+    ctx = get_script_run_ctx(suppress_warning=True)
+    return ctx.session_id if ctx is not None else None
+
+
+class RoomHub:
+    def __init__(self, store, poll_min=POLL_MIN, poll_max=POLL_MAX):
+        self.store = store
+        self.poll_min = poll_min
+        self.poll_max = poll_max
+
+        self._lock = threading.Lock()
+        self._subs = defaultdict(dict)       # kod pokoju -> {session_id: narysowana wersja}
+        self._room_of = {}                   # session_id -> kod pokoju
+        self._changed = {}                   # kod pokoju -> zbiór sesji, które zmieniły pokój
+        self._event = threading.Event()
+        self.wakeups = 0
+        self.skipped = 0                     # sesje w trakcie przebiegu, których nie budziliśmy
+
+        self.enabled = _runtime() is not None
+        if self.enabled:
+            store.add_listener(self.publish)
+            threading.Thread(target=self._run, name="orapa-hub", daemon=True).start()
+
+    # -------------------- subskrypcje --------------------
+    def subscribe(self, code, session_id, version):
+        if session_id is None:
+            return
+        with self._lock:
+            old = self._room_of.get(session_id)
+            if old is not None and old != code:
+                self._subs[old].pop(session_id, None)
+            self._room_of[session_id] = code
+            self._subs[code][session_id] = version
+
+    def unsubscribe(self, session_id):
+        with self._lock:
+            code = self._room_of.pop(session_id, None)
+            if code is not None:
+                self._subs[code].pop(session_id, None)
+                if not self._subs[code]:
+                    del self._subs[code]
+
+    def publish(self, code):
+        """Wołane przez magazyn po każdej zmianie pokoju (w wątku, który ją zrobił)."""
+        source = current_session_id()
+        with self._lock:
+            if code not in self._subs:
+                return
+            self._changed.setdefault(code, set()).add(source)
+        self._event.set()
+
+    # -------------------- rozsyłanie --------------------
+    def _wake(self, runtime, session_id):
+        info = runtime._session_mgr.get_active_session_info(session_id)
+        if info is None:
+            self.unsubscribe(session_id)
+            return
+        runtime._get_async_objs().eventloop.call_soon_threadsafe(self._rerun_idle, info.session)
+
+    def _rerun_idle(self, session):
+        """
+        Na pętli zdarzeń Streamlit. request_rerun w trakcie przebiegu przerywa
+        go i zaczyna od nowa – taki przebieg zostawiamy, nową wersję pokoju
+        i tak złapie sprawdzanie wersji w app.py (watch_room).
+        """
+        from streamlit.runtime.app_session import AppSessionState
+
+        if session._state != AppSessionState.APP_NOT_RUNNING:
+            self.skipped += 1
+            return
+        session.request_rerun(None)
+        self.wakeups += 1
+
+    def _dispatch(self, changed):
+        runtime = _runtime()
+        if runtime is None:
+            return
+        for code, sources in changed.items():
+            version = self.store.room(code)["version"]
+            with self._lock:
+                subs = self._subs.get(code, {})
+                stale = [sid for sid, seen in subs.items() if seen < version and sid not in sources]
+                # nie budzimy drugi raz tą samą zmianą; autor zmiany i tak rysuje ją sam
+                for sid in subs:
+                    subs[sid] = max(subs[sid], version)
+            for sid in stale:
+                self._wake(runtime, sid)
+
+    def _run(self):
+        try:
+            data_version = self.store.data_version()
+            interval = self.poll_min
+            while not self.store.closed:
+                try:
+                    data_version, interval = self._step(data_version, interval)
+                except Exception:
+                    if self.store.closed:
+                        break
+                    log.exception("orapa-hub: błąd rozsyłania zmian pokoi")
+                    interval = self.poll_max
+        finally:
+            self.enabled = False          # aplikacja wraca do częstego odpytywania
+            if not self.store.closed:
+                log.error("orapa-hub: wątek rozsyłający zakończył się")
+
+    def _step(self, data_version, interval):
+        """Jeden obieg: zmiany z tego procesu albo sprawdzenie cudzych commitów."""
+        if self._event.wait(interval):
+            time.sleep(COALESCE)                 # START = plansza + czat: jedno budzenie
+            self._event.clear()
+            with self._lock:
+                changed, self._changed = self._changed, {}
+            self._dispatch(changed)
+            return data_version, self.poll_min
+
+        # zmiany z innych procesów
+        current = self.store.data_version()
+        if current == data_version:
+            return data_version, min(interval * 2, self.poll_max)
+        with self._lock:
+            codes = list(self._subs)
+        self._dispatch({code: set() for code in codes})
+        return current, self.poll_min
@@ -0,0 +1,431 @@
+"""
+Sprawdzanie ułożenia figur.
+
+Wszystkie wierzchołki figur leżą na siatce 0.1 (przezroczysty trójkąt jest
+przeskalowany o 0.9, reszta ma wierzchołki całkowite), więc liczymy
+dokładnie na liczbach całkowitych w dziesiątych częściach pola. Każda para
+figur to para wielokątów wypukłych, a ich część wspólna jest wypukła:
+pusta, punkt, odcinek albo kawałek o dodatnim polu. Wystarczy więc test osi
+rozdzielających (SAT) na normalnych krawędzi obu figur, liczony wektorowo
+dla wszystkich 21 par i dowolnej liczby ułożeń naraz.
+
+Wersja na Shapely (check_layout_shapely) zostaje jako wzorzec do testu
+różnicowego: python -m orapa.legality --diff 5000 (próbkę z ustalonymi
+ziarnami sprawdza też tests/test_legality.py).
+"""
+import argparse
+import time
+
+import numpy as np
+
+from orapa.geometry import (
+    BASE_YELLOW,
+    BASE_SMALL_TRI,
+    BASE_SQUARE_DIAMOND,
+    BASE_TRI_HYP2,
+    BASE_PAR_INT,
+    BOARD_KEYS,
+    COLS,
+    ROWS,
+    ROT_MATS,
+    clamp_center,
+    clamp_lightblue,
+    clamp_parallelogram,
+    lightblue_vertices,
+    red_vertices,
+    small_tri_vertices,
+    square_diamond_vertices,
+    tri_hyp2_vertices,
+    yellow_vertices,
+)
+
+PIECE_NAMES = [
+    "Żółty trójkąt",
+    "Biały trójkąt",
+    "Niebieski trójkąt",
+    "Biały kwadrat",
+    "Czerwony równoległobok",
+    "Przezroczysty trójkąt",
+    "Jasnoniebieski kwadrat",
+]
+
+PAIRS = [(i, j) for i in range(len(PIECE_NAMES))
+         for j in range(i + 1, len(PIECE_NAMES))]
+
+# Werdykty dla pary figur (i dla całego ułożenia – werdykt pierwszej złej pary)
+CONTACT_NONE = 0      # rozłączne albo jeden punkt wspólny
+CONTACT_OVERLAP = 1   # część wspólna o dodatnim polu
+CONTACT_EDGE = 2      # wspólny odcinek boku
+
+MSG_OK = "Ułożenie jest poprawne – figury nie nachodzą na siebie i nie stykają się bokami."
+
+SCALE = 10            # jednostka obliczeń: 0.1 pola
+
+_PI = np.array([i for i, _ in PAIRS])
+_PJ = np.array([j for _, j in PAIRS])
+
+
+def _pad4(base):
+    """Trójkąty dopełniamy powtórzonym wierzchołkiem (krawędź zerowej długości)."""
+    base = np.asarray(base, dtype=float)
+    if len(base) == 3:
+        base = np.vstack([base, base[-1:]])
+    return np.rint(base * SCALE).astype(np.int32)
+
+
+# Bazowe kształty w dziesiątych częściach pola, w kolejności PIECE_NAMES
+_BASES = [
+    _pad4(BASE_YELLOW),
+    _pad4(BASE_SMALL_TRI),
+    _pad4(BASE_SMALL_TRI),
+    _pad4(BASE_SQUARE_DIAMOND),
+    _pad4(BASE_PAR_INT),
+    _pad4(BASE_TRI_HYP2),
+    _pad4([[0.0, 0.0], [1.0, 0.0], [1.0, 1.0], [0.0, 1.0]]),
+]
+_ROTS = np.rint(np.array(ROT_MATS)).astype(np.int32)
+_RED = PIECE_NAMES.index("Czerwony równoległobok")
+
+# Kształt każdej figury dla każdego obrotu i odbicia: (7, 4, 2, 4, 2);
+# odbicie ma znaczenie tylko dla równoległoboku
+PIECE_SHAPES = np.empty((len(_BASES), 4, 2, 4, 2), dtype=np.int32)
+for _p, _base in enumerate(_BASES):
+    for _flip in (0, 1):
+        _b = _base.copy()
+        if _flip and _p == _RED:
+            _b[:, 0] *= -1
+        for _ori in range(4):
+            PIECE_SHAPES[_p, _ori, _flip] = _b @ _ROTS[_ori].T
+
+# Kolumny BOARD_KEYS z (x, y, obrót) każdej figury; jasnoniebieski się nie obraca
+_COLUMNS = [
+    ("y_cx", "y_cy", "y_ori"),
+    ("w_cx", "w_cy", "w_ori"),
+    ("b_cx", "b_cy", "b_ori"),
+    ("s_cx", "s_cy", "s_ori"),
+    ("r_cx", "r_cy", "r_ori"),
+    ("t2_cx", "t2_cy", "t2_ori"),
+    ("lb_x", "lb_y", None),
+]
+_CENTRE_COLS = np.array([[BOARD_KEYS.index(kx), BOARD_KEYS.index(ky)]
+                         for kx, ky, _ in _COLUMNS])
+_ORI_COLS = np.array([BOARD_KEYS.index(kori) for _, _, kori in _COLUMNS[:-1]])
+_FLIP_COL = BOARD_KEYS.index("r_flip")
+_PIECE_IDX = np.arange(len(_BASES))
+
+
+def state_params(state):
+    """Stan planszy (dict) jako wiersz liczb w kolejności BOARD_KEYS."""
+    return [float(state[k]) for k in BOARD_KEYS]
+
+
+def layout_polygons(params):
+    """
+    Wierzchołki wszystkich figur dla N ułożeń naraz.
+
+    params: tablica (N, len(BOARD_KEYS)) jak z state_params.
+    Zwraca int32 (N, 7, 4, 2) w dziesiątych częściach pola.
+    """
+    params = np.atleast_2d(np.asarray(params, dtype=float))
+    n = len(params)
+
+    ori = np.zeros((n, len(_BASES)), dtype=np.int32)
+    ori[:, :-1] = params[:, _ORI_COLS].astype(np.int32) % 4
+    flip = np.zeros((n, len(_BASES)), dtype=np.int32)
+    flip[:, _RED] = params[:, _FLIP_COL] != 0
+
+    centre = np.rint(params[:, _CENTRE_COLS] * SCALE).astype(np.int32)
+    return PIECE_SHAPES[_PIECE_IDX, ori, flip] + centre[:, :, None, :]
+
+
+def _face_span(along, face):
+    """Zakres (min, max) rzutu `along` wierzchołków należących do ściany."""
+    big = np.iinfo(np.int32).max // 4
+    lo = np.where(face, along, big).min(axis=-1)
+    hi = np.where(face, along, -big).max(axis=-1)
+    return lo, hi
+
+
+def _project(poly, axes):
+    """Iloczyny skalarne: (M, V, 2) x (M, K, 2) -> (M, K, V)."""
+    return (poly[:, None, :, 0] * axes[:, :, None, 0]
+            + poly[:, None, :, 1] * axes[:, :, None, 1])
+
+
+def pair_contacts(a, b):
+    """
+    Werdykt CONTACT_* dla M par wielokątów wypukłych.
+
+    a, b: int32 (M, 4, 2); trójkąty z powtórzonym wierzchołkiem są dozwolone.
+    """
+    nxt = [1, 2, 3, 0]
+    dirs = np.concatenate([a[:, nxt] - a, b[:, nxt] - b], axis=1)   # (M, 8, 2)
+    axes = np.stack([dirs[..., 1], -dirs[..., 0]], axis=-1)
+    real = (axes != 0).any(axis=-1)                             # pomijamy krawędzie zerowe
+
+    pa = _project(a, axes)
+    pb = _project(b, axes)
+    min_a, max_a = pa.min(axis=-1), pa.max(axis=-1)
+    min_b, max_b = pb.min(axis=-1), pb.max(axis=-1)
+
+    gap = real & ((max_a < min_b) | (max_b < min_a))
+    touch_ab = real & (max_a == min_b)
+    touch_ba = real & (max_b == min_a)
+
+    disjoint = gap.any(axis=1)
+    overlap = ~(gap | touch_ab | touch_ba).any(axis=1)
+
+    # Styk bokiem: na osi styku ściany obu figur mają wspólny odcinek
+    ta = _project(a, dirs)
+    tb = _project(b, dirs)
+    edge = np.zeros(len(a), dtype=bool)
+    for touch, face_a, face_b in (
+        (touch_ab, pa == max_a[..., None], pb == min_b[..., None]),
+        (touch_ba, pa == min_a[..., None], pb == max_b[..., None]),
+    ):
+        lo_a, hi_a = _face_span(ta, face_a)
+        lo_b, hi_b = _face_span(tb, face_b)
+        shared = np.minimum(hi_a, hi_b) - np.maximum(lo_a, lo_b)
+        edge |= (touch & (shared > 0)).any(axis=1)
+
+    verdict = np.full(len(a), CONTACT_NONE, dtype=np.int8)
+    verdict[~disjoint & edge] = CONTACT_EDGE
+    verdict[overlap] = CONTACT_OVERLAP
+    return verdict
+
+
+def check_layouts(params):
+    """
+    Sprawdza N ułożeń jednym przebiegiem.
+
+    Zwraca (verdict, pair): werdykt CONTACT_* pierwszej złej pary
+    (w kolejności PAIRS, jak w pętli na Shapely) i jej indeks w PAIRS
+    albo -1, gdy ułożenie jest poprawne.
+    """
+    polys = layout_polygons(params)
+    n = len(polys)
+    per_pair = pair_contacts(
+        polys[:, _PI].reshape(-1, 4, 2),
+        polys[:, _PJ].reshape(-1, 4, 2),
+    ).reshape(n, len(PAIRS))
+
+    bad = per_pair != CONTACT_NONE
+    first = bad.argmax(axis=1)
+    has_bad = bad.any(axis=1)
+    verdict = np.where(has_bad, per_pair[np.arange(n), first], CONTACT_NONE)
+    pair = np.where(has_bad, first, -1)
+    return verdict.astype(np.int8), pair
+
+
+def outside_board(params):
+    """
+    (N,) indeks pierwszej figury wystającej poza planszę albo -1. Aplikacja
+    przycina figury do planszy (clamp_*), ale ułożenia z zewnątrz nie muszą.
+    """
+    polys = layout_polygons(params)
+    limit = np.array([COLS * SCALE, ROWS * SCALE])
+    out = ((polys < 0) | (polys > limit)).any(axis=(2, 3))
+    return np.where(out.any(axis=1), out.argmax(axis=1), -1)
+
+
+def outside_message(piece):
+    return f"Figura {PIECE_NAMES[piece]} wychodzi poza planszę."
+
+
+def layout_message(verdict, pair):
+    if verdict == CONTACT_NONE:
+        return MSG_OK
+    name_i, name_j = (PIECE_NAMES[k] for k in PAIRS[pair])
+    if verdict == CONTACT_OVERLAP:
+        return f"Figury {name_i} i {name_j} nachodzą na siebie."
+    return f"Figury {name_i} i {name_j} stykają się bokami."
+
+
+def check_layout(state):
+    from orapa.placements import get_tables, on_grid
+
+    tables = get_tables()
+    idx = tables.locate(state) if on_grid(state) else None
+    if idx is not None:
+        verdict, pair = tables.check_indexed([idx])
+    else:
+        verdict, pair = check_layouts([state_params(state)])
+    verdict, pair = int(verdict[0]), int(pair[0])
+    return verdict == CONTACT_NONE, layout_message(verdict, pair)
+
+
+# ---------------------------------------------------------
+# Wzorzec na Shapely (do testu różnicowego)
+# ---------------------------------------------------------
+def get_all_polygons(state, scale=None):
+    """
+    Figury jako poligony Shapely. Z `scale` współrzędne są mnożone i
+    zaokrąglane do liczb całkowitych (Shapely liczy wtedy bez szumu float).
+    """
+    from shapely.geometry import Polygon
+
+    if scale is not None:
+        def Polygon(verts, _Polygon=Polygon):  # noqa: N802
+            return _Polygon(np.rint(np.asarray(verts) * scale))
+
+    shapes = []
+
+    shapes.append(("Żółty trójkąt",
+                   Polygon(yellow_vertices(state["y_cx"],
+                                           state["y_cy"],
+                                           state["y_ori"]))))
+
+    shapes.append(("Biały trójkąt",
+                   Polygon(small_tri_vertices(state["w_cx"],
+                                              state["w_cy"],
+                                              state["w_ori"]))))
+
+    shapes.append(("Niebieski trójkąt",
+                   Polygon(small_tri_vertices(state["b_cx"],
+                                              state["b_cy"],
+                                              state["b_ori"]))))
+
+    shapes.append(("Biały kwadrat",
+                   Polygon(square_diamond_vertices(state["s_cx"],
+                                                   state["s_cy"],
+                                                   state["s_ori"]))))
+
+    shapes.append(("Czerwony równoległobok",
+                   Polygon(red_vertices(state["r_cx"],
+                                        state["r_cy"],
+                                        state["r_ori"],
+                                        state["r_flip"]))))
+
+    shapes.append(("Przezroczysty trójkąt",
+                   Polygon(tri_hyp2_vertices(state["t2_cx"],
+                                             state["t2_cy"],
+                                             state["t2_ori"]))))
+
+    shapes.append(("Jasnoniebieski kwadrat",
+                   Polygon(lightblue_vertices(state["lb_x"],
+                                              state["lb_y"]))))
+
+    fixed = []
+    for name, poly in shapes:
+        if not poly.is_valid:
+            poly = poly.buffer(0)
+        fixed.append((name, poly))
+    return fixed
+
+
+def check_layout_shapely(state, scale=None):
+    shapes = get_all_polygons(state, scale)
+    eps_area = 1e-6 * (scale or 1) ** 2
+
+    for i in range(len(shapes)):
+        name_i, poly_i = shapes[i]
+        for j in range(i + 1, len(shapes)):
+            name_j, poly_j = shapes[j]
+
+            inter = poly_i.intersection(poly_j)
+            if inter.is_empty:
+                continue
+
+            geoms = [inter]
+            if inter.geom_type == "GeometryCollection":
+                geoms = list(inter.geoms)
+
+            # 1) Nachodzenie (pole > 0)
+            for g in geoms:
+                if g.geom_type in ("Polygon", "MultiPolygon") and g.area > eps_area:
+                    return False, f"Figury {name_i} i {name_j} nachodzą na siebie."
+
+            # 2) Styk bokami (odcinki)
+            for g in geoms:
+                if g.geom_type in ("LineString", "MultiLineString"):
+                    return False, f"Figury {name_i} i {name_j} stykają się bokami."
+
+            # 3) Więcej niż jeden punkt wspólny
+            point_count = 0
+            for g in geoms:
+                if g.geom_type == "Point":
+                    point_count += 1
+                elif g.geom_type == "MultiPoint":
+                    point_count += len(g.geoms)
+
+            if point_count > 1:
+                return False, f"Figury {name_i} i {name_j} mają więcej niż jeden punkt wspólny."
+
+    return True, MSG_OK
+
+
+# ---------------------------------------------------------
+# Test różnicowy: szybki silnik kontra Shapely
+# ---------------------------------------------------------
+def random_states(n, seed=0):
+    """Losowe stany przycięte do planszy (figury często się stykają)."""
+    rng = np.random.default_rng(seed)
+    states = []
+    for _ in range(n):
+        state = {}
+        for prefix, func in (("y", yellow_vertices), ("w", small_tri_vertices),
+                             ("b", small_tri_vertices), ("s", square_diamond_vertices),
+                             ("t2", tri_hyp2_vertices)):
+            ori = int(rng.integers(4)) if prefix != "s" else 0
+            cx = float(rng.integers(0, COLS + 1))
+            cy = float(rng.integers(0, ROWS + 1))
+            if prefix == "t2":
+                # po przycięciu przy brzegu środek ma część ułamkową .1 albo .9
+                cx += float(rng.choice([0.0, 0.1, 0.9]))
+                cy += float(rng.choice([0.0, 0.1, 0.9]))
+            state[f"{prefix}_cx"], state[f"{prefix}_cy"] = clamp_center(cx, cy, ori, func)
+            state[f"{prefix}_ori"] = ori
+        ori, flip = int(rng.integers(4)), bool(rng.integers(2))
+        state["r_cx"], state["r_cy"] = clamp_parallelogram(
+            float(rng.integers(0, COLS + 1)),
+            float(rng.integers(0, ROWS + 1)), ori, flip)
+        state["r_ori"], state["r_flip"] = ori, flip
+        state["lb_x"], state["lb_y"] = clamp_lightblue(
+            float(rng.integers(0, COLS + 1)),
+            float(rng.integers(0, ROWS + 1)))
+        states.append(state)
+    return states
+
+
+def differential_check(n, seed=0):
+    """
+    Porównuje werdykty obu silników; zwraca listę (stan, szybki, shapely).
+
+    Shapely dostaje współrzędne w dziesiątych częściach pola: na floatach
+    środki typu 4.9 przezroczystego trójkąta dają szum rzędu 1e-16 i styk
+    bokiem bywa widziany jako szczelina.
+    """
+    states = random_states(n, seed)
+    verdicts, pairs = check_layouts([state_params(s) for s in states])
+    mismatches = []
+    for state, verdict, pair in zip(states, verdicts, pairs):
+        fast = (bool(verdict == CONTACT_NONE), layout_message(int(verdict), int(pair)))
+        slow = check_layout_shapely(state, scale=SCALE)
+        if fast != slow:
+            mismatches.append((state, fast, slow))
+    return mismatches
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--diff", type=int, default=2000,
+                        help="liczba losowych ułożeń do porównania z Shapely")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    params = [state_params(s) for s in random_states(args.diff, args.seed)]
+    start = time.perf_counter()
+    verdicts, _ = check_layouts(params)
+    elapsed = time.perf_counter() - start
+    print(f"{len(params)} ułożeń w {elapsed * 1000:.1f} ms "
+          f"({len(params) / elapsed:.0f}/s), poprawnych: {(verdicts == 0).sum()}")
+
+    mismatches = differential_check(args.diff, args.seed)
+    for state, fast, slow in mismatches[:10]:
+        print("ROZBIEŻNOŚĆ:", state, fast, slow)
+    print(f"rozbieżności: {len(mismatches)}")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
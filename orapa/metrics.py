@@ -0,0 +1,214 @@
+"""
+Pomiary na gorącej ścieżce: odcinki czasu, liczniki i wskaźniki.
+
+- span("sekcja") – czas sekcji app.py jako histogram (suma, liczba,
+  kubełki w ms). Mierzymy tylko przebiegi wylosowane w begin_run z
+  prawdopodobieństwem SAMPLE_RATE; w pozostałych span zwraca wspólny pusty
+  kontekst, więc przy wyłączonym próbkowaniu (domyślnie) koszt to jedno
+  sprawdzenie flagi wątku.
+- inc(nazwa, **etykiety) – liczniki (przebiegi na pokój i na sesję).
+  Serie z etykietą o nieograniczonej liczbie wartości (BOUNDED_LABELS:
+  session, room) są ograniczone do MAX_LABELLED_SERIES na etykietę
+  (najdawniej zmieniane wypadają).
+- add_gauge(fn) – wskaźniki liczone dopiero przy odczycie: fn() zwraca
+  [(nazwa, etykiety, wartość), ...] (np. RoomStore.room_stats,
+  process_stats).
+
+render() daje tekst w formacie ekspozycji Prometheusa, a serve(port)
+wystawia go pod http://…:port/metrics w wątku w tle (ORAPA_METRICS_PORT).
+Serie zawierają kody pokoi i nicki, więc domyślnie serwer słucha tylko na
+127.0.0.1 (ORAPA_METRICS_HOST, np. 0.0.0.0 za zaporą).
+"""
+import os
+import random
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from contextlib import nullcontext
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+SAMPLE_RATE = float(os.environ.get("ORAPA_METRICS_SAMPLE", "0"))
+METRICS_PORT = int(os.environ.get("ORAPA_METRICS_PORT", "0"))
+METRICS_HOST = os.environ.get("ORAPA_METRICS_HOST", "127.0.0.1")
+BOUNDED_LABELS = ("session", "room")
+MAX_LABELLED_SERIES = 1000
+BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+
+_NOOP = nullcontext()
+
+
+def _labels(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_value(value):
+    value = float(value)
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels) + "}"
+
+
+class _Span:
+    __slots__ = ("registry", "name", "start")
+
+    def __init__(self, registry, name):
+        self.registry = registry
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.registry.observe(self.name, (time.perf_counter() - self.start) * 1e3)
+        return False
+
+
+class Registry:
+    def __init__(self, sample_rate=SAMPLE_RATE):
+        self.sample_rate = sample_rate
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._counters = defaultdict(float)          # (nazwa, etykiety) -> wartość
+        self._bounded = {label: OrderedDict() for label in BOUNDED_LABELS}   # etykieta -> serie (LRU)
+        self._hist = {}                              # nazwa -> [kubełki..., +Inf, suma, liczba]
+        self._gauges = []
+
+    # -------------------- odcinki czasu --------------------
+    def begin_run(self):
+        """Na początku przebiegu skryptu: czy ten przebieg mierzymy."""
+        self._local.sampled = self.sample_rate > 0 and random.random() < self.sample_rate
+        self._local.start = time.perf_counter()
+        return self._local.sampled
+
+    def end_run(self, name="script"):
+        """Na końcu pełnego przebiegu: czas od begin_run (tylko w mierzonych przebiegach)."""
+        if getattr(self._local, "sampled", False):
+            self.observe(name, (time.perf_counter() - self._local.start) * 1e3)
+
+    def span(self, name):
+        if not getattr(self._local, "sampled", False):
+            return _NOOP
+        return _Span(self, name)
+
+    def observe(self, name, ms):
+        with self._lock:
+            h = self._hist.get(name)
+            if h is None:
+                h = self._hist[name] = [0] * (len(BUCKETS_MS) + 3)
+            for i, bound in enumerate(BUCKETS_MS):
+                if ms <= bound:
+                    h[i] += 1
+                    break
+            else:
+                h[len(BUCKETS_MS)] += 1                   # +Inf
+            h[-2] += ms
+            h[-1] += 1
+
+    # -------------------- liczniki i wskaźniki --------------------
+    def inc(self, name, value=1, **labels):
+        key = (name, _labels(labels))
+        bounded = next((label for label in BOUNDED_LABELS if label in labels), None)
+        with self._lock:
+            if bounded is not None:
+                series = self._bounded[bounded]
+                series[key] = series.pop(key, 0) + value
+                if len(series) > MAX_LABELLED_SERIES:
+                    series.popitem(last=False)
+            else:
+                self._counters[key] += value
+
+    def add_gauge(self, fn):
+        self._gauges.append(fn)
+
+    # -------------------- eksport --------------------
+    def render(self):
+        with self._lock:
+            counters = list(self._counters.items())
+            for series in self._bounded.values():
+                counters += series.items()
+            hist = {name: list(h) for name, h in self._hist.items()}
+
+        lines = []
+        typed = set()
+        for (name, labels), value in sorted(counters):
+            if name not in typed:
+                lines.append(f"# TYPE {name} counter")
+                typed.add(name)
+            lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+
+        for name, h in sorted(hist.items()):
+            metric = "orapa_span_ms"
+            if metric not in typed:
+                lines.append(f"# TYPE {metric} histogram")
+                typed.add(metric)
+            cumulative = 0
+            for bound, count in zip(BUCKETS_MS + ("+Inf",), h):
+                cumulative += count
+                lines.append(f'{metric}_bucket{{section="{name}",le="{bound}"}} {cumulative}')
+            lines.append(f'{metric}_sum{{section="{name}"}} {h[-2]:.3f}')
+            lines.append(f'{metric}_count{{section="{name}"}} {h[-1]}')
+
+        for fn in self._gauges:
+            for name, labels, value in fn():
+                if name not in typed:
+                    lines.append(f"# TYPE {name} gauge")
+                    typed.add(name)
+                lines.append(f"{name}{_format_labels(_labels(labels))} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port, host=METRICS_HOST):
+        """Serwer HTTP z /metrics w wątku w tle; zwraca serwer (server.server_port)."""
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = registry.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name="orapa-metrics", daemon=True).start()
+        return server
+
+
+def process_stats():
+    """Wskaźniki procesu: RSS i liczba wątków."""
+    try:
+        with open("/proc/self/statm") as fh:
+            rss = int(fh.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        import resource
+
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    return [
+        ("orapa_process_rss_bytes", {}, rss),
+        ("orapa_process_threads", {}, threading.active_count()),
+    ]
+
+
+REGISTRY = Registry()
+begin_run = REGISTRY.begin_run
+end_run = REGISTRY.end_run
+span = REGISTRY.span
+inc = REGISTRY.inc
+add_gauge = REGISTRY.add_gauge
+render = REGISTRY.render
@@ -0,0 +1,392 @@
+"""
+Indeks wszystkich położeń figur osiągalnych przyciskami (ruch, obrót,
+odbicie + przycięcie do planszy).
+
+Dla każdej figury trzymamy tablice numpy: klucz położenia, wierzchołki
+(w dziesiątych częściach pola), maskę zajętych pól i tablicę przejść dla
+każdej akcji. Do tego dla każdej pary figur macierz werdyktów
+orapa.legality.CONTACT_* – sprawdzenie ułożenia to 21 odczytów z tablic.
+
+Tablice buduje się raz i zapisuje obok modułu:
+    python -m orapa.placements build
+Bez zbudowanego pliku get_tables() zbuduje je przy pierwszym użyciu.
+"""
+import argparse
+import hashlib
+import threading
+import time
+from collections import deque
+from pathlib import Path
+
+import numpy as np
+
+from orapa.geometry import (
+    COLS,
+    ROWS,
+    clamp_center,
+    clamp_lightblue,
+    clamp_parallelogram,
+    make_single_board,
+    small_tri_vertices,
+    square_diamond_vertices,
+    tri_hyp2_vertices,
+    yellow_vertices,
+)
+from orapa.legality import (
+    CONTACT_NONE,
+    CONTACT_OVERLAP,
+    PAIRS,
+    PIECE_SHAPES,
+    SCALE,
+    pair_contacts,
+)
+
+TABLE_VERSION = 1
+GRID_EPS = 1e-9                     # tolerancja "leży na siatce" (w polach planszy)
+DATA_PATH = Path(__file__).with_name("data") / "placements.npz"
+
+# Kolejność figur jak orapa.legality.PIECE_NAMES
+PIECES = ["y", "w", "b", "s", "r", "t2", "lb"]
+ACTIONS = ["up", "down", "left", "right", "rot_left", "rot_right", "flip"]
+
+# Klucze stanu planszy: (x, y, obrót, odbicie); None = figura tego nie ma
+STATE_KEYS = {
+    "y": ("y_cx", "y_cy", "y_ori", None),
+    "w": ("w_cx", "w_cy", "w_ori", None),
+    "b": ("b_cx", "b_cy", "b_ori", None),
+    "s": ("s_cx", "s_cy", "s_ori", None),
+    "r": ("r_cx", "r_cy", "r_ori", "r_flip"),
+    "t2": ("t2_cx", "t2_cy", "t2_ori", None),
+    "lb": ("lb_x", "lb_y", None, None),
+}
+
+# Akcje dostępne w interfejsie dla danej figury
+_MOVES = {"up", "down", "left", "right"}
+_ROTATIONS = {"rot_left", "rot_right"}
+PIECE_ACTIONS = {
+    "y": _MOVES | _ROTATIONS,
+    "w": _MOVES | _ROTATIONS,
+    "b": _MOVES | _ROTATIONS,
+    "s": _MOVES,
+    "r": _MOVES | _ROTATIONS | {"flip"},
+    "t2": _MOVES | _ROTATIONS,
+    "lb": _MOVES,
+}
+
+
+def _clamp(piece, x, y, ori, flip):
+    if piece == "y":
+        return clamp_center(x, y, ori, yellow_vertices)
+    if piece in ("w", "b"):
+        return clamp_center(x, y, ori, small_tri_vertices)
+    if piece == "s":
+        return clamp_center(x, y, ori, square_diamond_vertices)
+    if piece == "r":
+        return clamp_parallelogram(x, y, ori, flip)
+    if piece == "t2":
+        return clamp_center(x, y, ori, tri_hyp2_vertices)
+    return clamp_lightblue(x, y)
+
+
+def apply_action_slow(piece, x, y, ori, flip, action):
+    """Ruch tak, jak robiły to przyciski: zmiana stanu i przycięcie do planszy."""
+    if action == "up":
+        y += 1
+    elif action == "down":
+        y -= 1
+    elif action == "left":
+        x -= 1
+    elif action == "right":
+        x += 1
+    elif action == "rot_left":
+        ori = (ori + 1) % 4
+    elif action == "rot_right":
+        ori = (ori - 1) % 4
+    elif action == "flip":
+        flip = not flip
+    x, y = _clamp(piece, x, y, ori, flip)
+    return x, y, ori, flip
+
+
+def placement_key(x, y, ori, flip):
+    """Klucz położenia: środek w dziesiątych częściach pola, obrót, odbicie."""
+    return (int(round(x * SCALE)), int(round(y * SCALE)), int(ori), int(bool(flip)))
+
+
+def on_grid(state):
+    """
+    Czy wszystkie figury leżą dokładnie na siatce kluczy (co 1/SCALE pola,
+    obrót całkowity). Tylko wtedy locate nie zaokrągla ułożenia do sąsiedniego.
+    """
+    for kx, ky, kori, _ in STATE_KEYS.values():
+        for v in (state[kx], state[ky]):
+            if abs(v * SCALE - round(v * SCALE)) > GRID_EPS * SCALE:
+                return False
+        if kori and state[kori] != int(state[kori]):
+            return False
+    return True
+
+
+def _piece_values(piece, state):
+    kx, ky, kori, kflip = STATE_KEYS[piece]
+    ori = state[kori] if kori else 0
+    flip = state[kflip] if kflip else False
+    return state[kx], state[ky], ori, flip
+
+
+# ---------------------------------------------------------
+# Budowanie tablic
+# ---------------------------------------------------------
+def _enumerate(piece, start):
+    """BFS po akcjach z położenia startowego; zwraca klucze i przejścia."""
+    first = _piece_values(piece, start)
+    index = {placement_key(*first): 0}
+    values = [first]
+    moves = []
+    queue = deque([0])
+    while queue:
+        i = queue.popleft()
+        row = []
+        for action in ACTIONS:
+            if action not in PIECE_ACTIONS[piece]:
+                row.append(i)
+                continue
+            nxt = apply_action_slow(piece, *values[i], action)
+            key = placement_key(*nxt)
+            if key not in index:
+                index[key] = len(values)
+                values.append(nxt)
+                queue.append(index[key])
+            row.append(index[key])
+        moves.append(row)
+
+    # BFS nadaje indeksy rosnąco, więc wiersze `moves` są już w kolejności
+    keys = np.array(list(index), dtype=np.int16)
+    return keys, np.array(moves, dtype=np.int32)
+
+
+def _cell_squares():
+    """Wszystkie pola planszy jako kwadraty (80, 4, 2) w dziesiątych; bit = y * COLS + x."""
+    cells = np.array([(x, y) for y in range(ROWS) for x in range(COLS)])
+    unit = np.array([[0, 0], [1, 0], [1, 1], [0, 1]])
+    return ((cells[:, None, :] + unit[None]) * SCALE).astype(np.int32)
+
+
+def _occupancy(verts):
+    """Maski 80 pól pokrytych z dodatnim polem: (P, 2) uint64 (bity 0–63, 64–79)."""
+    cells = _cell_squares()
+    n = len(verts)
+    covered = pair_contacts(
+        np.repeat(verts, len(cells), axis=0),
+        np.tile(cells, (n, 1, 1)),
+    ).reshape(n, len(cells)) == CONTACT_OVERLAP
+
+    weights = np.uint64(1) << np.arange(64, dtype=np.uint64)
+    masks = np.zeros((n, 2), dtype=np.uint64)
+    masks[:, 0] = (covered[:, :64] * weights).sum(axis=1, dtype=np.uint64)
+    masks[:, 1] = (covered[:, 64:] * weights[:len(cells) - 64]).sum(axis=1, dtype=np.uint64)
+    return masks
+
+
+def _pair_table(va, vb):
+    """Macierz werdyktów (Pa, Pb); geometrię liczymy tylko dla stykających się ramek."""
+    lo_a, hi_a = va.min(axis=1), va.max(axis=1)
+    lo_b, hi_b = vb.min(axis=1), vb.max(axis=1)
+    near = ((lo_a[:, None] <= hi_b[None]) & (lo_b[None] <= hi_a[:, None])).all(axis=-1)
+    ia, ib = np.nonzero(near)
+
+    table = np.full((len(va), len(vb)), CONTACT_NONE, dtype=np.int8)
+    table[ia, ib] = pair_contacts(va[ia], vb[ib])
+    return table
+
+
+def _fingerprint(start):
+    digest = hashlib.sha1(PIECE_SHAPES.tobytes())
+    digest.update(repr(sorted(start.items())).encode())
+    digest.update(repr((ROWS, COLS, TABLE_VERSION)).encode())
+    return digest.hexdigest()
+
+
+def build_arrays():
+    start = make_single_board()
+    arrays = {"fingerprint": np.array(_fingerprint(start))}
+    verts = []
+    for p, piece in enumerate(PIECES):
+        keys, moves = _enumerate(piece, start)
+        centre = keys[:, :2].astype(np.int32)
+        v = PIECE_SHAPES[p, keys[:, 2] % 4, keys[:, 3]] + centre[:, None, :]
+        arrays[f"{piece}_keys"] = keys
+        arrays[f"{piece}_moves"] = moves
+        arrays[f"{piece}_verts"] = v.astype(np.int16)
+        arrays[f"{piece}_masks"] = _occupancy(v)
+        verts.append(v)
+    for i, j in PAIRS:
+        arrays[f"pair_{i}_{j}"] = _pair_table(verts[i], verts[j])
+    return arrays
+
+
+# ---------------------------------------------------------
+# Tablice w pamięci
+# ---------------------------------------------------------
+class PlacementTables:
+    def __init__(self, arrays):
+        self.keys = [arrays[f"{p}_keys"] for p in PIECES]
+        self.moves = [arrays[f"{p}_moves"] for p in PIECES]
+        self.verts = [arrays[f"{p}_verts"] for p in PIECES]
+        self.masks = [arrays[f"{p}_masks"] for p in PIECES]
+        self.pairs = [arrays[f"pair_{i}_{j}"] for i, j in PAIRS]
+        self.fingerprint = str(arrays["fingerprint"])
+        self.index = [
+            {tuple(k): i for i, k in enumerate(keys.tolist())}
+            for keys in self.keys
+        ]
+        self._compat = {}
+
+    def sizes(self):
+        return [len(k) for k in self.keys]
+
+    def locate_piece(self, piece, state):
+        p = PIECES.index(piece)
+        return self.index[p].get(placement_key(*_piece_values(piece, state)))
+
+    def locate(self, state):
+        """Indeksy położeń wszystkich 7 figur albo None, gdy któregoś nie ma w tablicy."""
+        idx = []
+        for p, piece in enumerate(PIECES):
+            i = self.index[p].get(placement_key(*_piece_values(piece, state)))
+            if i is None:
+                return None
+            idx.append(i)
+        return idx
+
+    def write_piece(self, state, piece, i):
+        """Wpisuje do stanu planszy położenie nr `i` figury."""
+        kx, ky, kori, kflip = STATE_KEYS[piece]
+        x, y, ori, flip = self.keys[PIECES.index(piece)][i].tolist()
+        state[kx] = x / SCALE
+        state[ky] = y / SCALE
+        if kori:
+            state[kori] = ori
+        if kflip:
+            state[kflip] = bool(flip)
+
+    def state_from_indices(self, idx):
+        """Stan planszy (dict jak make_single_board) z 7 indeksów położeń."""
+        state = make_single_board()
+        for piece, i in zip(PIECES, idx):
+            self.write_piece(state, piece, int(i))
+        return state
+
+    def compatible(self, i, j):
+        """Macierz bool (Pi, Pj): czy figury i, j mogą leżeć w tych położeniach razem."""
+        matrix = self._compat.get((i, j))
+        if matrix is None:
+            if i < j:
+                matrix = self.pairs[PAIRS.index((i, j))] == CONTACT_NONE
+            else:
+                matrix = self.compatible(j, i).T.copy()
+            self._compat[(i, j)] = matrix
+        return matrix
+
+    def step(self, state, piece, action):
+        """Akcja przycisku jako odczyt z tablicy przejść (zmienia `state`)."""
+        p = PIECES.index(piece)
+        i = self.locate_piece(piece, state)
+        if i is None:
+            # położenie spoza indeksu (np. stary stan sesji) – liczymy wprost
+            kx, ky, kori, kflip = STATE_KEYS[piece]
+            x, y, ori, flip = apply_action_slow(
+                piece, *_piece_values(piece, state), action)
+            state[kx], state[ky] = x, y
+            if kori:
+                state[kori] = ori
+            if kflip:
+                state[kflip] = flip
+            return
+        self.write_piece(state, piece, self.moves[p][i, ACTIONS.index(action)])
+
+    def pair_verdicts(self, idx):
+        """Werdykty wszystkich 21 par dla N ułożeń podanych indeksami (N, 7)."""
+        idx = np.atleast_2d(np.asarray(idx))
+        return np.stack(
+            [table[idx[:, i], idx[:, j]] for table, (i, j) in zip(self.pairs, PAIRS)],
+            axis=1,
+        )
+
+    def check_indexed(self, idx):
+        """Jak orapa.legality.check_layouts, ale z tablic: (verdict, pair)."""
+        per_pair = self.pair_verdicts(idx)
+        bad = per_pair != CONTACT_NONE
+        first = bad.argmax(axis=1)
+        has_bad = bad.any(axis=1)
+        verdict = np.where(has_bad, per_pair[np.arange(len(per_pair)), first], CONTACT_NONE)
+        return verdict.astype(np.int8), np.where(has_bad, first, -1)
+
+
+def save_arrays(arrays, path=DATA_PATH):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp.npz")
+    np.savez_compressed(tmp, **arrays)
+    tmp.replace(path)
+
+
+def load_arrays(path=DATA_PATH):
+    """Tablice z pliku albo None, gdy pliku nie ma lub jest nieaktualny."""
+    try:
+        with np.load(path) as data:
+            arrays = {k: data[k] for k in data.files}
+    except (OSError, ValueError):
+        return None
+    if str(arrays.get("fingerprint")) != _fingerprint(make_single_board()):
+        return None
+    return arrays
+
+
+_tables = None
+_tables_lock = threading.Lock()
+
+
+def get_tables():
+    """Wspólne dla procesu tablice położeń (wczytane z dysku albo zbudowane)."""
+    global _tables
+    if _tables is None:
+        with _tables_lock:
+            if _tables is None:
+                arrays = load_arrays()
+                if arrays is None:
+                    arrays = build_arrays()
+                    try:
+                        save_arrays(arrays)
+                    except OSError:
+                        pass
+                _tables = PlacementTables(arrays)
+    return _tables
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Indeks położeń figur Orapy")
+    parser.add_argument("command", choices=["build", "info"])
+    parser.add_argument("--out", default=str(DATA_PATH))
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        start = time.perf_counter()
+        arrays = build_arrays()
+        save_arrays(arrays, args.out)
+        print(f"zbudowano w {time.perf_counter() - start:.1f} s -> {args.out} "
+              f"({Path(args.out).stat().st_size / 1024:.0f} KiB)")
+    else:
+        arrays = load_arrays(args.out)
+        if arrays is None:
+            print("brak aktualnego pliku tablic, uruchom: python -m orapa.placements build")
+            return 1
+
+    tables = PlacementTables(arrays)
+    for piece, n in zip(PIECES, tables.sizes()):
+        print(f"{piece:>3}: {n} położeń")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
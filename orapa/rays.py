@@ -0,0 +1,302 @@
+"""
+Strzały (promienie) przez planszę Orapy.
+
+Promień wchodzi z jednego z 36 pól brzegowych (1–10 u góry, 11–18 z
+prawej, A–H z lewej, I–R u dołu – jak opisy w draw_board) i biegnie
+środkiem wiersza/kolumny. Wszystkie boki figur leżą na liniach siatki albo
+na przekątnych pól, więc pole planszy dzielimy przekątnymi na 4 ćwiartki
+(E, N, W, S) i zapisujemy, która figura wypełnia którą ćwiartkę:
+
+- wypełniona ćwiartka od strony wejścia – bok prostopadły, promień wraca,
+- wypełniona ćwiartka naprzeciw wejścia – przekątna, skręt o 90° w stronę
+  pustej połowy pola,
+- inaczej promień przechodzi dalej.
+
+Każde odbicie dodaje kolor figury (przezroczysty trójkąt odbija bez
+koloru, jasnoniebieski kwadrat to niebieski + biały). Przezroczysty
+trójkąt jest rysowany w skali 0.9; optycznie liczymy go w pełnym rozmiarze
+(przeciwprostokątna 2) ze środkiem zaokrąglonym do siatki.
+
+Ćwiartki zajęte przez każde położenie figury liczymy raz i zapisujemy obok
+tablic położeń (orapa/data/quarters.npz, z odciskiem tych tablic).
+
+Odpowiedź to uint16: indeks pola wyjścia (0–35) | maska kolorów << 6.
+trace_layouts() liczy wszystkie 36 strzałów dla N ułożeń naraz, więc dla
+ułożenia zatwierdzonego po START trzymamy tablicę 36 odpowiedzi, a strzał
+to odczyt z niej.
+"""
+import string
+import threading
+
+import numpy as np
+
+from orapa.geometry import COLS, ROWS, SCALE_TRI2
+from orapa.legality import PIECE_SHAPES, SCALE
+from orapa.placements import DATA_PATH, PIECES, get_tables, save_arrays
+
+# Kolory składowe (maska bitowa)
+YELLOW = 1
+WHITE = 2
+BLUE = 4
+RED = 8
+COLOR_BITS = 4
+
+PIECE_COLORS = {
+    "y": YELLOW,
+    "w": WHITE,
+    "b": BLUE,
+    "s": WHITE,
+    "r": RED,
+    "t2": 0,
+    "lb": BLUE | WHITE,
+}
+
+COLOR_NAMES = {
+    0: "bez koloru",
+    YELLOW: "żółty",
+    WHITE: "biały",
+    BLUE: "niebieski",
+    RED: "czerwony",
+    YELLOW | RED: "pomarańczowy",
+    RED | BLUE: "fioletowy",
+    YELLOW | BLUE: "zielony",
+    YELLOW | RED | BLUE: "czarny",
+    YELLOW | WHITE: "jasnożółty",
+    RED | WHITE: "różowy",
+    BLUE | WHITE: "błękitny",
+    YELLOW | RED | WHITE: "jasnopomarańczowy",
+    RED | BLUE | WHITE: "jasnofioletowy",
+    YELLOW | BLUE | WHITE: "jasnozielony",
+    YELLOW | RED | BLUE | WHITE: "szary",
+}
+
+# Kierunki (i strony pola / ćwiartki): E, N, W, S
+DIRS = np.array([[1, 0], [0, 1], [-1, 0], [0, -1]])
+E, N, W, S = range(4)
+
+TOP_LABELS = [str(x + 1) for x in range(COLS)]
+RIGHT_LABELS = [str(11 + r) for r in range(ROWS)]
+LEFT_LABELS = list(string.ascii_uppercase[:ROWS])
+BOTTOM_LABELS = list(string.ascii_uppercase[8:8 + COLS])
+ENTRY_LABELS = TOP_LABELS + RIGHT_LABELS + LEFT_LABELS + BOTTOM_LABELS
+
+
+def _entries():
+    """(x, y, kierunek) pierwszego pola dla każdego wejścia; wiersze r liczone od góry."""
+    rows = []
+    rows += [(x, ROWS - 1, S) for x in range(COLS)]
+    rows += [(COLS - 1, ROWS - 1 - r, W) for r in range(ROWS)]
+    rows += [(0, ROWS - 1 - r, E) for r in range(ROWS)]
+    rows += [(x, 0, N) for x in range(COLS)]
+    return np.array(rows)
+
+
+ENTRIES = _entries()
+
+
+def _exit_index(x, y):
+    """Indeks w ENTRY_LABELS dla pola tuż za planszą, w którym skończył promień."""
+    out = np.full(x.shape, -1, dtype=np.int64)
+    top, bottom = y >= ROWS, y < 0
+    left, right = x < 0, x >= COLS
+    out[top] = x[top]
+    out[right] = len(TOP_LABELS) + (ROWS - 1 - y[right])
+    out[left] = len(TOP_LABELS) + len(RIGHT_LABELS) + (ROWS - 1 - y[left])
+    out[bottom] = len(TOP_LABELS) + 2 * len(RIGHT_LABELS) + x[bottom]
+    return out
+
+
+def _turn_table():
+    """
+    Dla 16 układów wypełnionych ćwiartek i 4 kierunków ruchu: nowy kierunek
+    i ćwiartka, od której promień się odbił (-1 = brak odbicia).
+    """
+    new_dir = np.zeros((16, 4), dtype=np.int8)
+    hit = np.full((16, 4), -1, dtype=np.int8)
+    for cfg in range(16):
+        filled = [bool(cfg >> q & 1) for q in range(4)]
+        for d in range(4):
+            side = (d + 2) % 4              # strona, przez którą promień wchodzi
+            left, right = (d + 1) % 4, (d + 3) % 4
+            if filled[side]:
+                new_dir[cfg, d], hit[cfg, d] = side, side
+            elif filled[d]:
+                new_dir[cfg, d] = right if filled[left] else left
+                hit[cfg, d] = d
+            else:
+                new_dir[cfg, d] = d
+    return new_dir, hit
+
+
+_NEW_DIR, _HIT = _turn_table()
+
+
+# ---------------------------------------------------------
+# Ćwiartki pól zajęte przez każde położenie figury
+# ---------------------------------------------------------
+def _nominal_vertices(p, keys):
+    """Wierzchołki w pełnych polach; przezroczysty trójkąt bez skali 0.9."""
+    shape = PIECE_SHAPES[p, keys[:, 2] % 4, keys[:, 3]].astype(float) / SCALE
+    centre = keys[:, :2].astype(float) / SCALE
+    if PIECES[p] == "t2":
+        shape = shape / SCALE_TRI2
+        centre = np.rint(centre)
+    return np.rint(shape + centre[:, None, :]).astype(np.int64)
+
+
+def _quarter_masks(verts):
+    """(P, 80) uint8: bit q = ćwiartka q pola (x, y) leży wewnątrz figury."""
+    cells = np.array([(x, y) for y in range(ROWS) for x in range(COLS)])
+    # środki ciężkości ćwiartek E, N, W, S w szóstych częściach pola
+    offs = np.array([[5, 3], [3, 5], [1, 3], [3, 1]])
+    pts = (cells[:, None, :] * 6 + offs[None]).reshape(-1, 2)        # (320, 2)
+
+    v = verts * 6                                                    # (P, 4, 2)
+    edges = np.roll(v, -1, axis=1) - v
+    rel = pts[None, None, :, :] - v[:, :, None, :]                   # (P, 4, 320, 2)
+    cross = edges[:, :, None, 0] * rel[..., 1] - edges[:, :, None, 1] * rel[..., 0]
+    real = (edges != 0).any(axis=-1)[:, :, None]
+    inside = ((cross > 0) | ~real).all(axis=1) | ((cross < 0) | ~real).all(axis=1)
+
+    bits = inside.reshape(len(verts), len(cells), 4)
+    return (bits * (1 << np.arange(4))).sum(axis=-1).astype(np.uint8)
+
+
+QUARTERS_PATH = DATA_PATH.with_name("quarters.npz")
+QUARTERS_VERSION = 1
+
+_quarters = None
+_quarters_lock = threading.Lock()
+
+
+def _quarters_fingerprint(tables):
+    return f"{tables.fingerprint}:{QUARTERS_VERSION}"
+
+
+def _load_quarters(tables, path=QUARTERS_PATH):
+    """Tablice ćwiartek z pliku albo None, gdy pliku nie ma lub jest nieaktualny."""
+    try:
+        with np.load(path) as data:
+            if str(data["fingerprint"]) != _quarters_fingerprint(tables):
+                return None
+            return [data[piece] for piece in PIECES]
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def get_quarter_tables():
+    global _quarters
+    if _quarters is None:
+        with _quarters_lock:
+            if _quarters is None:
+                tables = get_tables()
+                quarters = _load_quarters(tables)
+                if quarters is None:
+                    quarters = [
+                        _quarter_masks(_nominal_vertices(p, keys))
+                        for p, keys in enumerate(tables.keys)
+                    ]
+                    arrays = dict(zip(PIECES, quarters))
+                    arrays["fingerprint"] = np.array(_quarters_fingerprint(tables))
+                    try:
+                        save_arrays(arrays, QUARTERS_PATH)
+                    except OSError:
+                        pass
+                _quarters = quarters
+    return _quarters
+
+
+# ---------------------------------------------------------
+# Śledzenie promieni
+# ---------------------------------------------------------
+def _cell_grids(idx):
+    """Dla N ułożeń: układ ćwiartek (N, 80) i numer figury w każdej ćwiartce (N, 80, 4)."""
+    quarters = get_quarter_tables()
+    n = len(idx)
+    owner = np.full((n, ROWS * COLS, 4), -1, dtype=np.int8)
+    for p, table in enumerate(quarters):
+        q = table[idx[:, p]]                                          # (N, 80)
+        bits = (q[..., None] >> np.arange(4, dtype=np.uint8)) & 1
+        owner[bits.astype(bool)] = p
+    cfg = ((owner >= 0) * (1 << np.arange(4))).sum(axis=-1)
+    return cfg, owner
+
+
+def trace_layouts(idx, chunk=20000):
+    """
+    Odpowiedzi na wszystkie 36 strzałów dla N ułożeń (indeksy położeń (N, 7)).
+
+    Zwraca uint16 (N, 36). Zakłada poprawne ułożenia (figury się nie nakładają).
+    """
+    idx = np.atleast_2d(np.asarray(idx, dtype=np.int64))
+    out = np.empty((len(idx), len(ENTRY_LABELS)), dtype=np.uint16)
+    for start in range(0, len(idx), chunk):
+        out[start:start + chunk] = _trace_chunk(idx[start:start + chunk])
+    return out
+
+
+def _trace_chunk(idx):
+    n = len(idx)
+    cfg, owner = _cell_grids(idx)
+    piece_color = np.array([PIECE_COLORS[p] for p in PIECES] + [0], dtype=np.uint16)
+
+    beams = n * len(ENTRY_LABELS)
+    layout = np.repeat(np.arange(n), len(ENTRY_LABELS))
+    x = np.tile(ENTRIES[:, 0], n)
+    y = np.tile(ENTRIES[:, 1], n)
+    d = np.tile(ENTRIES[:, 2], n)
+    colors = np.zeros(beams, dtype=np.uint16)
+    answer = np.zeros(beams, dtype=np.uint16)
+
+    active = np.arange(beams)
+    # promień jest odwracalny, więc nie może krążyć; 4 * 80 kroków to górna granica
+    for _ in range(4 * ROWS * COLS + 2):
+        if not len(active):
+            break
+        lay, cx, cy, cd = layout[active], x[active], y[active], d[active]
+        cell = cy * COLS + cx
+        c = cfg[lay, cell]
+        nd = _NEW_DIR[c, cd]
+        hq = _HIT[c, cd]
+        hit_owner = owner[lay, cell, np.maximum(hq, 0)]
+        colors[active] |= np.where(hq >= 0, piece_color[hit_owner], 0)
+
+        nx, ny = cx + DIRS[nd, 0], cy + DIRS[nd, 1]
+        x[active], y[active], d[active] = nx, ny, nd
+
+        gone = (nx < 0) | (nx >= COLS) | (ny < 0) | (ny >= ROWS)
+        done = active[gone]
+        answer[done] = _exit_index(nx[gone], ny[gone]) | (colors[done] << 6)
+        active = active[~gone]
+
+    return answer.reshape(n, len(ENTRY_LABELS))
+
+
+# ---------------------------------------------------------
+# Odpowiedzi dla jednej planszy
+# ---------------------------------------------------------
+def answer_table(state):
+    """36 odpowiedzi (lista int) dla stanu planszy – do zapamiętania po START."""
+    idx = get_tables().locate(state)
+    if idx is None:
+        raise ValueError("położenie figur spoza tablicy położeń")
+    return trace_layouts([idx])[0].tolist()
+
+
+def decode_answer(code):
+    """(etykieta pola wyjścia, maska kolorów)."""
+    return ENTRY_LABELS[code & 0x3F], code >> 6
+
+
+def color_name(mask):
+    return COLOR_NAMES.get(mask, "?")
+
+
+def probe(answers, entry_label):
+    """Odpowiedź na strzał z pola `entry_label` z gotowej tablicy 36 odpowiedzi."""
+    return answers[ENTRY_LABELS.index(entry_label)]
+
+
+def describe_answer(entry_label, code):
+    exit_label, mask = decode_answer(code)
+    return f"strzał z {entry_label} → wyjście {exit_label}, kolor: {color_name(mask)}"
@@ -0,0 +1,103 @@
+"""
+Rysowanie planszy w matplotlib (PNG po stronie serwera).
+
+Aplikacja rysuje planszę w przeglądarce (orapa.components.board_view); ten
+moduł zostaje do obrazków offline, porównań i benchmarków. draw_board daje
+figurę pyplot jak dawniej st.pyplot.
+
+Dawny cache gotowych PNG (klucz: położenia figur i tło, wspólna warstwa
+siatki, limit pamięci) usunęliśmy razem z rysowaniem na serwerze: przebieg
+skryptu nie tworzy już figury matplotlib ani PNG, tylko wysyła kilkaset
+bajtów wierzchołków (board_scene), więc nie ma czego cache'ować.
+"""
+import string
+
+import matplotlib
+
+matplotlib.use("Agg")
+
+import matplotlib.patches as patches
+import matplotlib.pyplot as plt
+
+from orapa.geometry import COLS, PIECE_STYLES, ROWS, board_piece_vertices
+
+
+# ---------------------------------------------------------
+# Rysowanie planszy
+# ---------------------------------------------------------
+def draw_board_background(ax):
+    """Statyczna warstwa planszy: siatka i opisy pól brzegowych."""
+    ax.set_xlim(-0.5, COLS + 0.5)
+    ax.set_ylim(-0.5, ROWS + 0.5)
+
+    for x in range(COLS + 1):
+        ax.plot([x, x], [0, ROWS], color="white", linewidth=1, zorder=0)
+    for y in range(ROWS + 1):
+        ax.plot([0, COLS], [y, y], color="white", linewidth=1, zorder=0)
+
+    def row_y(r):
+        return ROWS - 0.5 - r
+
+    for x in range(COLS):
+        ax.text(
+            x + 0.5, ROWS + 0.45, str(x + 1),
+            ha="center", va="center", color="white", fontsize=12, zorder=0
+        )
+
+    bottom_labels = list(string.ascii_uppercase[8:8 + COLS])
+    for x, label in enumerate(bottom_labels):
+        ax.text(
+            x + 0.5, -0.45, label,
+            ha="center", va="center", color="white", fontsize=12, zorder=0
+        )
+
+    left_labels = list(string.ascii_uppercase[:ROWS])
+    for r, label in enumerate(left_labels):
+        ax.text(
+            -0.45, row_y(r), label,
+            ha="center", va="center", color="white", fontsize=12, zorder=0
+        )
+
+    for r in range(ROWS):
+        ax.text(
+            COLS + 0.45, row_y(r), str(11 + r),
+            ha="center", va="center", color="white", fontsize=12, zorder=0
+        )
+
+
+def board_piece_patches(state, bg_color):
+    result = []
+    for verts, (face, edge, lw) in zip(board_piece_vertices(state), PIECE_STYLES):
+        result.append(patches.Polygon(
+            verts, closed=True,
+            facecolor=face or bg_color, edgecolor=edge,
+            linewidth=lw, alpha=1.0, zorder=3
+        ))
+    return result
+
+
+def draw_heat(ax, heat):
+    """Mapa pól pod figurami: heat = {"color", "cells": 80 wartości 0–1} (orapa.components.heat_overlay)."""
+    for i, v in enumerate(heat["cells"]):
+        if v > 0:
+            ax.add_patch(patches.Rectangle(
+                (i % COLS, i // COLS), 1, 1,
+                facecolor=heat["color"], edgecolor="none", alpha=0.85 * v, zorder=-1
+            ))
+
+
+def draw_board(state, bg_color, heat=None):
+    fig, ax = plt.subplots(figsize=(4.5, 4))
+
+    fig.patch.set_facecolor(bg_color)
+    ax.set_facecolor(bg_color)
+
+    draw_board_background(ax)
+    if heat:
+        draw_heat(ax, heat)
+    for patch in board_piece_patches(state, bg_color):
+        ax.add_patch(patch)
+
+    ax.axis("off")
+    fig.tight_layout()
+    return fig
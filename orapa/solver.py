@@ -0,0 +1,541 @@
+"""
+Wyliczanie i zliczanie poprawnych ułożeń wszystkich 7 figur.
+
+Ułożenie to 7 indeksów położeń z orapa.placements. Dla każdej pary figur
+mamy macierz zgodności położeń (z tablic werdyktów, czyli dokładnie to, co
+akceptuje check_layout), spakowaną w bitsety uint64. Przeszukiwanie z
+nawrotami trzyma dla każdej nieustawionej figury bitset dozwolonych
+położeń (AND wierszy zgodności ustawionych figur), odcina gałąź, gdy
+któryś zbiór jest pusty, a dwie ostatnie figury liczy naraz wektorowo.
+Gałęzie pierwszego poziomu idą do puli procesów.
+
+Pełna przestrzeń jest ogromna (iloczyn rozmiarów ~1e16), więc w praktyce
+przypina się część figur (--fix) albo ogranicza liczbę wyników (--limit):
+    python -m orapa.solver count --fix s=6,6,0 --fix lb=1,1 --fix y=3,3,0
+    python -m orapa.solver enumerate out.bin --limit 1000000 --verify 10000
+
+Losowe ułożenia (LayoutSampler, random_layouts, sample_layouts) są
+jednostajne na zbiorze poprawnych ułożeń: losujemy położenia figur
+niezależnie i odrzucamy niezgodne pary – paczką, wektorowo, figura po
+figurze (najpierw pary, które najczęściej się wykluczają), więc większość
+odrzuceń zapada po 2–3 kolumnach. Losowanie bez odrzuceń wymagałoby liczby
+dokończeń każdego częściowego ułożenia, a tych jest ~1e15 (count się nie
+kończy w sensownym czasie); przy ~4% trafień pojedyncze ułożenie to jedna
+paczka (~1 ms). Tryb masowy dzieli pracę na kawałki z własnymi ziarnami
+(SeedSequence.spawn), więc wynik zależy tylko od ziarna, nie od liczby
+procesów:
+    python -m orapa.solver random out.bin 1000000 --seed 7 --verify 1000
+
+enumerate --unique zapisuje każde ułożenie raz (orapa.symmetry): "shape"
+pomija aliasy położeń równoległoboku (~2x mniej, odpowiedzi na strzały bez
+zmian – można z tego budować zbiór kandydatów orapa.deduce), "symmetry"
+dodatkowo odbicia planszy (~8x mniej):
+    python -m orapa.solver enumerate out.bin --fix s=6,6,0 --unique symmetry
+
+Plik wyników: 64 bajty nagłówka (MAGIC, wersja, liczba figur, odcisk
+tablic położeń, flagi, maska przypiętych figur) i rekordy po 7 x uint16
+(little endian) – 14 bajtów na ułożenie. Flaga FLAG_EXHAUSTIVE mówi, że
+plik zawiera wszystkie poprawne ułożenia z przypiętymi figurami (bez
+--limit, który się wyczerpał, i bez --unique symmetry); losowe próbki jej
+nie mają. orapa.deduce nie traktuje przypiętych figur jak wydedukowanych.
+Pliki wersji 1 (48 bajtów, bez flag) czytamy jako niepełne.
+"""
+import argparse
+import multiprocessing
+import os
+import shutil
+import struct
+import tempfile
+import time
+
+import numpy as np
+
+from orapa.placements import PIECES, get_tables, placement_key
+from orapa.symmetry import get_symmetry_tables
+
+MAGIC = b"ORPL"
+FILE_VERSION = 2
+_HEADER = struct.Struct("<4sHH40sHH12x")
+_HEADER_V1 = struct.Struct("<4sHH40s")
+FLAG_EXHAUSTIVE = 1
+RECORD_DTYPE = np.dtype("<u2")
+
+
+# ---------------------------------------------------------
+# Bitsety na uint64
+# ---------------------------------------------------------
+def pack_bits(bools):
+    """bool (..., P) -> uint64 (..., ceil(P / 64)); bit k słowa w = indeks 64 * w + k."""
+    bools = np.asarray(bools, dtype=bool)
+    pad = (-bools.shape[-1]) % 64
+    if pad:
+        bools = np.pad(bools, [(0, 0)] * (bools.ndim - 1) + [(0, pad)])
+    return np.ascontiguousarray(
+        np.packbits(bools, axis=-1, bitorder="little")
+    ).view(np.uint64)
+
+
+def bit_indices(words):
+    return np.flatnonzero(np.unpackbits(words.view(np.uint8), bitorder="little"))
+
+
+if hasattr(np, "bitwise_count"):
+    def popcount(words):
+        return int(np.bitwise_count(words).sum(dtype=np.int64))
+else:  # numpy < 2.0
+    def popcount(words):
+        return int(np.unpackbits(np.ascontiguousarray(words).view(np.uint8)).sum(dtype=np.int64))
+
+
+# ---------------------------------------------------------
+# Przeszukiwanie
+# ---------------------------------------------------------
+class LayoutSolver:
+    def __init__(self, tables=None, order=None):
+        self.tables = tables or get_tables()
+        self.sizes = self.tables.sizes()
+        n = len(self.sizes)
+        # najmniejsze dziedziny najpierw; dwie największe liczone razem na końcu
+        self.order = list(order or sorted(range(n), key=lambda p: self.sizes[p]))
+        self.compat = {
+            (i, j): pack_bits(self.tables.compatible(i, j))
+            for i in range(n) for j in range(n) if i != j
+        }
+
+    def initial_domains(self, fixed=None, allowed=None):
+        """
+        Bitsety dozwolonych położeń każdej figury.
+
+        fixed: {nr figury: indeks położenia}, allowed: {nr figury: indeksy}.
+        Zwraca None, gdy ograniczenia są sprzeczne.
+        """
+        domains = []
+        for p, size in enumerate(self.sizes):
+            mask = np.ones(size, dtype=bool)
+            if allowed and p in allowed:
+                mask = np.zeros(size, dtype=bool)
+                mask[np.asarray(allowed[p], dtype=np.int64)] = True
+            if fixed and p in fixed:
+                keep = mask[fixed[p]]
+                mask = np.zeros(size, dtype=bool)
+                mask[fixed[p]] = keep
+            domains.append(pack_bits(mask))
+
+        for p, i in (fixed or {}).items():
+            for q in range(len(domains)):
+                if q != p:
+                    domains[q] = domains[q] & self.compat[p, q][i]
+        if any(not d.any() for d in domains):
+            return None
+        return domains
+
+    def _narrow(self, domains, p, a, rest):
+        new = list(domains)
+        for q in rest:
+            d = domains[q] & self.compat[p, q][a]
+            if not d.any():
+                return None
+            new[q] = d
+        return new
+
+    def count(self, domains, depth=0):
+        """Liczba poprawnych ułożeń zgodnych z dziedzinami (od poziomu `depth`)."""
+        if domains is None:
+            return 0
+        p = self.order[depth]
+        rest = self.order[depth + 1:]
+        if len(rest) == 1:
+            q = rest[0]
+            rows = self.compat[p, q][bit_indices(domains[p])]
+            return popcount(rows & domains[q])
+
+        total = 0
+        for a in bit_indices(domains[p]):
+            new = self._narrow(domains, p, a, rest)
+            if new is not None:
+                total += self.count(new, depth + 1)
+        return total
+
+    def iter_layouts(self, domains, depth=0, prefix=None):
+        """Generator bloków (k, 7) uint16 z poprawnymi ułożeniami."""
+        if domains is None:
+            return
+        prefix = prefix if prefix is not None else np.zeros(len(self.sizes), dtype=np.uint16)
+        p = self.order[depth]
+        rest = self.order[depth + 1:]
+        if len(rest) == 1:
+            q = rest[0]
+            a_idx = bit_indices(domains[p])
+            rows = self.compat[p, q][a_idx] & domains[q]
+            bits = np.unpackbits(rows.view(np.uint8), axis=1, bitorder="little")
+            ia, ib = np.nonzero(bits[:, :self.sizes[q]])
+            if len(ia):
+                block = np.repeat(prefix[None], len(ia), axis=0)
+                block[:, p] = a_idx[ia]
+                block[:, q] = ib
+                yield block
+            return
+
+        for a in bit_indices(domains[p]):
+            new = self._narrow(domains, p, a, rest)
+            if new is not None:
+                prefix[p] = a
+                yield from self.iter_layouts(new, depth + 1, prefix)
+
+    def branches(self, domains):
+        """Podział na zadania: jedna gałąź na położenie pierwszej figury."""
+        if domains is None:
+            return []
+        p = self.order[0]
+        tasks = []
+        for a in bit_indices(domains[p]):
+            new = self._narrow(domains, p, a, self.order[1:])
+            if new is not None:
+                single = np.zeros(self.sizes[p], dtype=bool)
+                single[a] = True
+                new[p] = pack_bits(single)
+                tasks.append(new)
+        return tasks
+
+
+UNIQUE_MODES = {"shape": False, "symmetry": True}     # tryb -> czy z odbiciami planszy
+
+
+def unique_blocks(blocks, unique):
+    """Zostawia w blokach tylko ułożenia, które są swoją postacią kanoniczną."""
+    if not unique:
+        yield from blocks
+        return
+    symmetries = UNIQUE_MODES[unique]
+    sym = get_symmetry_tables()
+    for block in blocks:
+        block = block[sym.is_canonical(block, symmetries)]
+        if len(block):
+            yield block
+
+
+# ---------------------------------------------------------
+# Pula procesów
+# ---------------------------------------------------------
+_worker_solver = None
+
+
+def _init_worker(order):
+    global _worker_solver
+    _worker_solver = LayoutSolver(order=order)
+
+
+def _count_task(domains):
+    return _worker_solver.count(domains)
+
+
+def _enumerate_task(args):
+    domains, part_path, limit, unique = args
+    written = 0
+    with open(part_path, "wb") as fh:
+        for block in unique_blocks(_worker_solver.iter_layouts(domains), unique):
+            if limit is not None:
+                block = block[:limit - written]
+            block.astype(RECORD_DTYPE, copy=False).tofile(fh)
+            written += len(block)
+            if limit is not None and written >= limit:
+                break
+    return part_path, written
+
+
+def _workers(workers):
+    return max(1, workers or os.cpu_count() or 1)
+
+
+def count_layouts(fixed=None, allowed=None, workers=None, solver=None):
+    solver = solver or LayoutSolver()
+    domains = solver.initial_domains(fixed, allowed)
+    workers = _workers(workers)
+    if workers == 1 or domains is None:
+        return solver.count(domains)
+
+    with multiprocessing.Pool(workers, _init_worker, (solver.order,)) as pool:
+        return sum(pool.imap_unordered(_count_task, solver.branches(domains)))
+
+
+# ---------------------------------------------------------
+# Losowe ułożenia
+# ---------------------------------------------------------
+SAMPLE_BATCH = 4096                  # najmniejsza paczka losowania
+SAMPLE_CHUNK = 1 << 17               # ułożeń na kawałek trybu masowego
+
+
+class LayoutSampler:
+    """Jednostajne losowanie poprawnych ułożeń (odrzucanie paczkami, figura po figurze)."""
+
+    def __init__(self, tables=None):
+        self.tables = tables or get_tables()
+        self.sizes = self.tables.sizes()
+        n = len(self.sizes)
+        self.compat = {
+            (i, j): self.tables.compatible(i, j)
+            for i in range(n) for j in range(n) if i != j
+        }
+        density = {key: float(m.mean()) for key, m in self.compat.items()}
+        # kolejność: najpierw para, która najczęściej się wyklucza, potem figura,
+        # która z już ustawionymi przechodzi najrzadziej
+        first = min(density, key=density.get)
+        self.order = list(first)
+        while len(self.order) < n:
+            rest = [q for q in range(n) if q not in self.order]
+            self.order.append(min(rest, key=lambda q: np.prod([density[p, q] for p in self.order])))
+        self.acceptance = max(float(np.prod(list(density.values()))) ** 0.5, 1e-3)   # przybliżenie trafień
+
+    def _batch(self, size, rng):
+        rows = np.empty((size, 0), dtype=np.int64)
+        for k, q in enumerate(self.order):
+            col = rng.integers(0, self.sizes[q], len(rows))
+            ok = np.ones(len(rows), dtype=bool)
+            for j, p in enumerate(self.order[:k]):
+                ok &= self.compat[p, q][rows[:, j], col]
+            rows = np.column_stack([rows[ok], col[ok]])
+        out = np.empty((len(rows), len(self.sizes)), dtype=RECORD_DTYPE)
+        out[:, self.order] = rows
+        return out
+
+    def sample(self, n, rng=None):
+        """(n, 7) uint16 – n niezależnych, jednostajnych poprawnych ułożeń."""
+        rng = rng if rng is not None else np.random.default_rng()
+        # wielkość paczek zależy tylko od tego wywołania – ten sam rng, ten sam wynik
+        found, total, tried, rate = [], 0, 0, self.acceptance
+        while total < n:
+            size = min(max(SAMPLE_BATCH, int((n - total) / rate * 1.1)), 1 << 22)
+            block = self._batch(size, rng)
+            tried += size
+            found.append(block)
+            total += len(block)
+            rate = max(total / tried, 1e-3)
+        return np.concatenate(found)[:n]
+
+
+_sampler = None
+
+
+def random_layouts(n=1, seed=None):
+    """n losowych poprawnych ułożeń (n, 7); seed jak w np.random.default_rng."""
+    global _sampler
+    if _sampler is None:
+        _sampler = LayoutSampler()
+    return _sampler.sample(n, np.random.default_rng(seed))
+
+
+def _sample_task(args):
+    n, seed = args
+    return random_layouts(n, seed)
+
+
+def sample_layouts(out_path, n, seed=0, workers=None):
+    """Zapisuje n losowych poprawnych ułożeń do pliku; wynik zależy tylko od `seed`."""
+    counts = [min(SAMPLE_CHUNK, n - s) for s in range(0, n, SAMPLE_CHUNK)]
+    tasks = list(zip(counts, np.random.SeedSequence(seed).spawn(len(counts))))
+    workers = _workers(workers)
+    with open(out_path, "wb") as out:
+        write_header(out, get_tables())
+        if workers == 1 or len(tasks) <= 1:
+            for task in tasks:
+                _sample_task(task).tofile(out)
+        else:
+            with multiprocessing.Pool(min(workers, len(tasks))) as pool:
+                for block in pool.imap(_sample_task, tasks):
+                    block.tofile(out)
+    return n
+
+
+# ---------------------------------------------------------
+# Plik wyników
+# ---------------------------------------------------------
+def write_header(fh, tables, n_pieces=len(PIECES), exhaustive=False, pinned=()):
+    """Nagłówek pliku; pinned – numery przypiętych figur (kolejność PIECES)."""
+    flags = FLAG_EXHAUSTIVE if exhaustive else 0
+    mask = sum(1 << p for p in pinned)
+    fh.write(_HEADER.pack(MAGIC, FILE_VERSION, n_pieces, tables.fingerprint[:40].encode(), flags, mask))
+
+
+def read_header(path, tables=None):
+    """
+    {"n_pieces", "exhaustive", "pinned" (nazwy figur), "offset"} z nagłówka
+    pliku ułożeń; ValueError, gdy to nie jest plik ułożeń dla tych tablic.
+    """
+    tables = tables or get_tables()
+    with open(path, "rb") as fh:
+        raw = fh.read(_HEADER.size)
+    if len(raw) < _HEADER_V1.size:
+        raise ValueError(f"{path}: to nie jest plik ułożeń Orapy")
+    magic, version, n_pieces, fingerprint = _HEADER_V1.unpack_from(raw)
+    if magic != MAGIC or version not in (1, FILE_VERSION):
+        raise ValueError(f"{path}: to nie jest plik ułożeń Orapy")
+    if fingerprint.decode() != tables.fingerprint[:40]:
+        raise ValueError(f"{path}: plik zbudowany dla innych tablic położeń")
+    if version == 1:
+        return {"n_pieces": n_pieces, "exhaustive": False, "pinned": (), "offset": _HEADER_V1.size}
+    flags, mask = _HEADER.unpack(raw)[4:]
+    return {
+        "n_pieces": n_pieces,
+        "exhaustive": bool(flags & FLAG_EXHAUSTIVE),
+        "pinned": tuple(piece for p, piece in enumerate(PIECES) if mask >> p & 1),
+        "offset": _HEADER.size,
+    }
+
+
+def read_layouts(path, tables=None):
+    """Ułożenia z pliku jako memmap (N, 7) uint16 (bez wczytywania do pamięci)."""
+    header = read_header(path, tables)
+    n_pieces, offset = header["n_pieces"], header["offset"]
+    if os.path.getsize(path) == offset:
+        return np.zeros((0, n_pieces), dtype=RECORD_DTYPE)
+    return np.memmap(path, dtype=RECORD_DTYPE, mode="r", offset=offset).reshape(-1, n_pieces)
+
+
+def enumerate_layouts(out_path, fixed=None, allowed=None, limit=None,
+                      workers=None, solver=None, unique=None):
+    """
+    Zapisuje poprawne ułożenia do pliku; zwraca ich liczbę. unique: None,
+    "shape", "symmetry". Nagłówek dostaje przypięte figury i flagę
+    FLAG_EXHAUSTIVE, gdy plik ma wszystkie ułożenia (limit się nie wyczerpał,
+    bez `allowed` i bez odbić planszy).
+    """
+    solver = solver or LayoutSolver()
+    domains = solver.initial_domains(fixed, allowed)
+    workers = _workers(workers)
+    total = 0
+
+    with open(out_path, "wb") as out:
+        write_header(out, solver.tables)
+
+        if workers == 1 or domains is None:
+            for block in unique_blocks(solver.iter_layouts(domains), unique):
+                if limit is not None:
+                    block = block[:limit - total]
+                block.astype(RECORD_DTYPE, copy=False).tofile(out)
+                total += len(block)
+                if limit is not None and total >= limit:
+                    break
+        else:
+            total = _enumerate_parallel(out, out_path, solver, domains, limit, unique, workers)
+
+        exhaustive = allowed is None and unique != "symmetry" and (limit is None or total < limit)
+        out.seek(0)
+        write_header(out, solver.tables, exhaustive=exhaustive, pinned=sorted(fixed or ()))
+    return total
+
+
+def _enumerate_parallel(out, out_path, solver, domains, limit, unique, workers):
+    """Każda gałąź pisze do własnego pliku części, które doklejamy po kolei."""
+    total = 0
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(out_path))) as tmp:
+        tasks = [(d, os.path.join(tmp, f"part{k}.bin"), limit, unique)
+                 for k, d in enumerate(solver.branches(domains))]
+        with multiprocessing.Pool(workers, _init_worker, (solver.order,)) as pool:
+            for part_path, written in pool.imap_unordered(_enumerate_task, tasks):
+                take = written if limit is None else min(written, limit - total)
+                with open(part_path, "rb") as part:
+                    if take == written:
+                        shutil.copyfileobj(part, out)
+                    else:
+                        out.write(part.read(take * len(PIECES) * RECORD_DTYPE.itemsize))
+                os.remove(part_path)
+                total += take
+                if limit is not None and total >= limit:
+                    pool.terminate()
+                    break
+    return total
+
+
+def verify_layouts(layouts, sample=None, seed=0):
+    """Sprawdza (próbkę) ułożeń silnikiem geometrycznym; zwraca liczbę odrzuconych."""
+    from orapa.legality import check_layouts, state_params
+
+    tables = get_tables()
+    layouts = np.asarray(layouts)
+    if sample is not None and sample < len(layouts):
+        rng = np.random.default_rng(seed)
+        layouts = layouts[np.sort(rng.choice(len(layouts), sample, replace=False))]
+    params = [state_params(tables.state_from_indices(row)) for row in layouts]
+    verdicts, _ = check_layouts(params)
+    return int((verdicts != 0).sum())
+
+
+# ---------------------------------------------------------
+# CLI
+# ---------------------------------------------------------
+def parse_fix(items, tables=None):
+    """'y=12' (indeks) albo 'y=3,3,0' / 'r=4,2,0,1' (x, y, obrót[, odbicie])."""
+    tables = tables or get_tables()
+    fixed = {}
+    for item in items or []:
+        piece, _, value = item.partition("=")
+        if piece not in PIECES:
+            raise ValueError(f"nieznana figura: {piece!r} (dostępne: {', '.join(PIECES)})")
+        p = PIECES.index(piece)
+        if "," in value:
+            parts = [float(v) for v in value.split(",")]
+            parts += [0.0] * (4 - len(parts))
+            idx = tables.index[p].get(placement_key(*parts))
+            if idx is None:
+                raise ValueError(f"położenie {value!r} figury {piece} jest nieosiągalne")
+        else:
+            idx = int(value)
+        fixed[p] = idx
+    return fixed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Zliczanie i wyliczanie ułożeń Orapy")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    cmd = sub.add_parser("random", help="losowe poprawne ułożenia (jednostajnie) do pliku")
+    cmd.add_argument("out")
+    cmd.add_argument("n", type=int)
+    cmd.add_argument("--seed", type=int, default=0)
+    cmd.add_argument("--workers", type=int, default=None)
+    cmd.add_argument("--verify", type=int, default=0, metavar="N",
+                     help="sprawdź N losowych wyników silnikiem geometrycznym")
+
+    for name in ("count", "enumerate"):
+        cmd = sub.add_parser(name)
+        cmd.add_argument("--fix", action="append", metavar="FIGURA=POŁOŻENIE",
+                         help="przypięcie figury, np. y=3,3,0 albo r=4,2,0,1")
+        cmd.add_argument("--workers", type=int, default=None,
+                         help="liczba procesów (domyślnie wszystkie rdzenie)")
+        if name == "enumerate":
+            cmd.add_argument("out")
+            cmd.add_argument("--limit", type=int, default=None)
+            cmd.add_argument("--unique", choices=sorted(UNIQUE_MODES), default=None,
+                             help="każde ułożenie raz: bez aliasów położeń albo też bez odbić planszy")
+            cmd.add_argument("--verify", type=int, default=0, metavar="N",
+                             help="sprawdź N losowych wyników silnikiem geometrycznym")
+
+    args = parser.parse_args(argv)
+    start = time.perf_counter()
+    if args.command == "random":
+        n = sample_layouts(args.out, args.n, args.seed, workers=args.workers)
+    else:
+        fixed = parse_fix(args.fix)
+
+    if args.command == "count":
+        n = count_layouts(fixed, workers=args.workers)
+        print(f"poprawnych ułożeń: {n} ({time.perf_counter() - start:.1f} s)")
+        return 0
+
+    if args.command == "enumerate":
+        n = enumerate_layouts(args.out, fixed, limit=args.limit, workers=args.workers,
+                              unique=args.unique)
+    elapsed = time.perf_counter() - start
+    print(f"zapisano {n} ułożeń do {args.out} w {elapsed:.1f} s ({n / max(elapsed, 1e-9):.0f}/s)")
+    header = read_header(args.out)
+    print(f"zbiór {'pełny' if header['exhaustive'] else 'niepełny'}, "
+          f"przypięte figury: {', '.join(header['pinned']) or 'brak'}")
+    if args.verify:
+        bad = verify_layouts(read_layouts(args.out), sample=args.verify)
+        print(f"sprawdzono {min(args.verify, n)} ułożeń, odrzuconych: {bad}")
+        return 1 if bad else 0
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,746 @@
+"""
+Trwały magazyn pokoi w SQLite (orapa.db).
+
+Pokoje, gracze, zatwierdzone plansze i czat leżą w bazie w trybie WAL, więc
+kilka procesów Streamlit (np. za load balancerem) widzi ten sam stan, a gra
+przeżywa restart serwera. Tabele:
+
+- rooms(code, game_over, winner, version, updated_at) – jeden wiersz na pokój,
+- players(room_code, nickname, ready, answers, probes) – gracze pokoju,
+- games(game_id, secret_board, moves, updated_at) – istniejąca tabela;
+  game_id = kod pokoju, secret_board = JSON {nick: kod Board zatwierdzonej
+  planszy}, moves = początek dziennika zdarzeń ze starszych baz (już nie
+  dopisywany),
+- events(id, game_id, chunk) – dziennik zdarzeń pokoju (orapa.events):
+  jeden wiersz na pokój przy każdym zapisie, zamiast przepisywania coraz
+  dłuższego games.moves; dziennik = moves + kawałki po kolei (game_log),
+- chat(id, room_code, seq, author, text, created_at) – wiadomości, seq to
+  numer kolejny w pokoju, unikalny indeks po (room_code, seq).
+
+RoomStore trzyma w pamięci słowniki pokoi w tym samym kształcie co dawny
+get_rooms(), a zapisy wrzuca do kolejki, którą wątek w tle zapisuje co
+FLUSH_INTERVAL w jednej transakcji. Każda zmiana podbija licznik version
+pokoju (w pamięci od razu, w bazie przy zapisie), a odczyt pokoju
+porównuje go z bazą i przeładowuje pokój zmieniony przez inny proces.
+Słuchacze z add_listener (orapa.hub) dostają kod pokoju po każdej zmianie.
+
+Pokoje w pamięci to tylko pamięć podręczna bazy: wątek sprzątający co
+JANITOR_INTERVAL zdejmuje z niej pokoje bezczynne dłużej niż room_ttl, a
+liczba żywych pokoi jest ograniczona do max_rooms (wyrzucamy najdawniej
+używany). Gracze bez sygnału życia (ensure_player / touch_player) przez
+player_ttl są usuwani z pokoju także w bazie. Liczniki – stats().
+
+Wątki: każda sesja Streamlit ma swój wątek, więc zmiany pokoju idą pod
+blokadą pokoju (room_lock(code)) – jedną z ROOM_LOCKS blokad wybieraną po
+kodzie pokoju, więc różne pokoje praktycznie nie czekają na siebie, a
+pamięć na blokady jest stała. Wspólna self._lock chroni tylko indeksy
+(_rooms, _pending, _bumps, ...) i nigdy nie obejmuje zapytań do bazy.
+Kolejność: blokada pokoju, potem połączenie z puli, potem self._lock –
+room() oddaje połączenie, zanim weźmie blokadę pokoju. Czytający pokój bez
+blokady nie dostają wyjątku, ale mogą zobaczyć zmianę w połowie: nowy
+gracz to nowy słownik graczy, lista strzałów gracza jest podmieniana, a nie
+dopisywana, czat jest tylko dopisywany (orapa.chat), za to pozostałe pola
+wpisu gracza (ready, green_locked, answers) zmieniamy w miejscu, po jednym
+przypisaniu – np. ready może już być True, gdy green_locked jeszcze nie
+jest ustawione.
+"""
+import atexit
+import json
+import os
+import queue
+import sqlite3
+import sys
+import threading
+import time
+import zlib
+from collections import OrderedDict, defaultdict
+from datetime import datetime, timezone
+
+from orapa.board import Board
+from orapa.chat import CHAT_PAGE, CHAT_WINDOW, ChatLog, message_html
+from orapa.events import encode_chunk
+
+DB_PATH = os.environ.get(
+    "ORAPA_DB", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "orapa.db")
+)
+FLUSH_INTERVAL = 0.05
+POOL_SIZE = 4
+
+ROOM_TTL = 30 * 60            # s bez odczytu – pokój znika z pamięci (zostaje w bazie)
+PLAYER_TTL = 10 * 60          # s bez sygnału życia – gracz wypada z pokoju
+MAX_ROOMS = 1000              # żywych pokoi w pamięci procesu
+JANITOR_INTERVAL = 30
+PLAYER_TOUCH_INTERVAL = 60    # co ile s zapisujemy last_seen gracza do bazy
+ROOM_LOCKS = 64               # blokady pokoi (pokój -> crc32(kod) % ROOM_LOCKS)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS games (
+    game_id TEXT PRIMARY KEY,
+    secret_board TEXT,
+    moves TEXT,
+    updated_at TEXT
+);
+CREATE TABLE IF NOT EXISTS rooms (
+    code TEXT PRIMARY KEY,
+    game_over INTEGER NOT NULL DEFAULT 0,
+    winner TEXT,
+    version INTEGER NOT NULL DEFAULT 0,
+    updated_at TEXT
+);
+CREATE TABLE IF NOT EXISTS players (
+    room_code TEXT NOT NULL,
+    nickname TEXT NOT NULL,
+    ready INTEGER NOT NULL DEFAULT 0,
+    answers TEXT,
+    probes TEXT NOT NULL DEFAULT '[]',
+    last_seen REAL,
+    PRIMARY KEY (room_code, nickname)
+);
+CREATE TABLE IF NOT EXISTS chat (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    room_code TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    author TEXT NOT NULL,
+    text TEXT NOT NULL,
+    created_at TEXT NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS chat_room ON chat (room_code, seq);
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    game_id TEXT NOT NULL,
+    chunk TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS events_game ON events (game_id, id);
+"""
+
+
+def _now():
+    return datetime.now(timezone.utc).isoformat(timespec="milliseconds")
+
+
+def connect(path=DB_PATH):
+    conn = sqlite3.connect(path, timeout=5.0, isolation_level=None, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA busy_timeout=5000")
+    return conn
+
+
+def read_game_log(conn, code):
+    """Dziennik zdarzeń pokoju: games.moves ze starszych baz + kawałki z events."""
+    row = conn.execute("SELECT moves FROM games WHERE game_id = ?", (code,)).fetchone()
+    chunks = conn.execute("SELECT chunk FROM events WHERE game_id = ? ORDER BY id", (code,))
+    return "".join([row[0] if row and row[0] else ""] + [chunk for chunk, in chunks])
+
+
+def new_room(chat_window=CHAT_WINDOW):
+    return {
+        "chat": ChatLog(chat_window),
+        "players": {},
+        "game_over": False,
+        "winner": None,
+        "version": 0,
+        "last_active": time.time(),
+    }
+
+
+def new_player():
+    return {
+        "ready": False,
+        "green_locked": None,
+        "answers": None,
+        "probes": [],
+        "last_seen": time.time(),
+    }
+
+
+def _room_bytes(room):
+    """Przybliżony rozmiar pokoju w pamięci: teksty czatu i dane graczy."""
+    size = room["chat"].nbytes()
+    for player in room["players"].values():
+        size += sys.getsizeof(player)
+        if player["answers"]:
+            size += sys.getsizeof(player["answers"]) + 28 * len(player["answers"])
+        size += sum(sys.getsizeof(p) for p in player["probes"])
+    return size
+
+
+# ---------------------------------------------------------
+# Pula połączeń
+# ---------------------------------------------------------
+class ConnectionPool:
+    """Kilka połączeń do odczytu na proces; wątki skryptów Streamlit je wypożyczają."""
+
+    def __init__(self, path, size=POOL_SIZE):
+        self.path = path
+        self._free = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+        self.size = size
+
+    def acquire(self):
+        try:
+            return self._free.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._created < self.size:
+                self._created += 1
+                return connect(self.path)
+        return self._free.get()
+
+    def release(self, conn):
+        self._free.put(conn)
+
+    def close(self):
+        while True:
+            try:
+                self._free.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+# ---------------------------------------------------------
+# Magazyn pokoi
+# ---------------------------------------------------------
+class RoomStore:
+    def __init__(
+        self,
+        path=DB_PATH,
+        flush_interval=FLUSH_INTERVAL,
+        chat_window=CHAT_WINDOW,
+        room_ttl=ROOM_TTL,
+        player_ttl=PLAYER_TTL,
+        max_rooms=MAX_ROOMS,
+        janitor_interval=JANITOR_INTERVAL,
+    ):
+        self.path = path
+        self.chat_window = chat_window
+        self.flush_interval = flush_interval
+        self.room_ttl = room_ttl
+        self.player_ttl = player_ttl
+        self.max_rooms = max_rooms
+
+        self._writer = connect(path)
+        self._writer.executescript(SCHEMA)
+        self._pool = ConnectionPool(path)
+
+        self._lock = threading.RLock()              # tylko indeksy poniżej, bez I/O
+        self._room_locks = [threading.RLock() for _ in range(ROOM_LOCKS)]
+        self._rooms = OrderedDict()          # kolejność = ostatnie użycie (LRU)
+        self._synced = {}                    # wersja pokoju w bazie przy ostatnim odczycie/zapisie
+        self._pending = defaultdict(list)    # kod pokoju -> [(sql, params), ...]
+        self._bumps = defaultdict(int)       # kod pokoju -> liczba niezapisanych zmian
+        self._events = defaultdict(list)     # kod pokoju -> [(czas, rodzaj, gracz, dane), ...]
+        self._flush_lock = threading.Lock()
+        self._listeners = []
+        self._seen_written = {}              # (pokój, gracz) -> last_seen zapisany do bazy
+        self.metrics = defaultdict(int)
+
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._flush_loop, name="orapa-store", daemon=True)
+        self._thread.start()
+        self._janitor = threading.Thread(
+            target=self._janitor_loop, args=(janitor_interval,), name="orapa-janitor", daemon=True
+        )
+        self._janitor.start()
+        atexit.register(self.close)
+
+    # -------------------- odczyt --------------------
+    def _load(self, conn, code):
+        row = conn.execute(
+            "SELECT game_over, winner, version FROM rooms WHERE code = ?", (code,)
+        ).fetchone()
+        if row is None:
+            return None
+        room = new_room(self.chat_window)
+        room["game_over"], room["winner"], room["version"] = bool(row[0]), row[1], row[2]
+
+        for nick, ready, answers, probes, last_seen in conn.execute(
+            "SELECT nickname, ready, answers, probes, COALESCE(last_seen, 0) FROM players "
+            "WHERE room_code = ?",
+            (code,),
+        ):
+            entry = new_player()
+            entry["last_seen"] = last_seen
+            self._seen_written[(code, nick)] = last_seen
+            entry["ready"] = bool(ready)
+            entry["answers"] = json.loads(answers) if answers else None
+            entry["probes"] = json.loads(probes)
+            room["players"][nick] = entry
+
+        game = conn.execute("SELECT secret_board FROM games WHERE game_id = ?", (code,)).fetchone()
+        if game and game[0]:
+            for nick, board in json.loads(game[0]).items():
+                if nick in room["players"]:
+                    # starsze wpisy trzymały cały słownik planszy
+                    board = Board.from_state(board) if isinstance(board, dict) else Board.from_code(board)
+                    room["players"][nick]["green_locked"] = board
+
+        rows = conn.execute(
+            "SELECT seq, author, text FROM chat WHERE room_code = ? ORDER BY seq DESC LIMIT ?",
+            (code, self.chat_window),
+        ).fetchall()
+        for seq, author, text in reversed(rows):
+            room["chat"].append(author, text, seq)
+        self.metrics["rooms_loaded"] += 1
+        return room
+
+    def _use(self, code, room):
+        room["last_active"] = time.time()
+        self._rooms.move_to_end(code)
+        return room
+
+    def _put(self, code, room, version):
+        self._rooms[code] = room
+        self._synced[code] = version
+        self._use(code, room)
+        self._trim(keep=code)
+        return room
+
+    def _trim(self, keep=None):
+        """Limit max_rooms: wyrzuca najdawniej używane pokoje bez niezapisanych zmian."""
+        over = len(self._rooms) - self.max_rooms
+        if over <= 0:
+            return
+        victims = [c for c in self._rooms if c != keep and not self._dirty(c)][:over]
+        for code in victims:
+            self._evict(code)
+        self.metrics["rooms_evicted_lru"] += len(victims)
+
+    def _dirty(self, code):
+        """Czy pokój ma niezapisane operacje albo podbicia wersji."""
+        return bool(self._pending.get(code) or self._bumps.get(code))
+
+    def _evict(self, code):
+        room = self._rooms.pop(code)
+        self._synced.pop(code, None)
+        self._bumps.pop(code, None)
+        for nick in room["players"]:
+            self._seen_written.pop((code, nick), None)
+
+    def room_lock(self, code):
+        """Blokada pokoju; zmiany pokoju (i decyzje na jego stanie) idą pod nią."""
+        return self._room_locks[zlib.crc32(code.encode("utf-8")) % ROOM_LOCKS]
+
+    def _cached(self, code, db_version=None):
+        """Pokój z pamięci, jeśli jest aktualny (niezapisane zmiany albo ta sama wersja co w bazie)."""
+        with self._lock:
+            cached = self._rooms.get(code)
+            if cached is not None and (self._bumps[code] or db_version == self._synced[code]):
+                return self._use(code, cached)   # niezapisane zmiany – pamięć jest nowsza niż baza
+        return None
+
+    def _db_version(self, conn, code):
+        row = conn.execute("SELECT version FROM rooms WHERE code = ?", (code,)).fetchone()
+        return None if row is None else row[0]
+
+    def room(self, code):
+        """Pokój (słownik jak w dawnym get_rooms); tworzy go, jeśli nie istnieje."""
+        cached = self._cached(code)
+        if cached is not None:
+            return cached
+
+        # sprawdzenie wersji bez blokady pokoju; połączenie oddajemy przed
+        # jej wzięciem – zawsze najpierw blokada pokoju, potem połączenie z puli
+        conn = self._pool.acquire()
+        try:
+            version = self._db_version(conn, code)
+        finally:
+            self._pool.release(conn)
+        cached = self._cached(code, version)
+        if cached is not None:
+            return cached
+
+        with self.room_lock(code):
+            conn = self._pool.acquire()
+            try:
+                # inny wątek mógł pokój wczytać albo zmienić, zanim dostaliśmy blokadę
+                version = self._db_version(conn, code)
+                cached = self._cached(code, version)
+                if cached is not None:
+                    return cached
+                loaded = self._load(conn, code) if version is not None else None
+            finally:
+                self._pool.release(conn)
+            with self._lock:
+                if loaded is not None:
+                    return self._put(code, loaded, loaded["version"])
+                room = self._put(code, new_room(self.chat_window), 0)
+                self.metrics["rooms_created"] += 1
+            self._queue(code, "INSERT OR IGNORE INTO rooms (code, updated_at) VALUES (?, ?)", (code, _now()))
+            self._touch(code, room)
+            return room
+
+    def chat_history(self, code, before, limit=CHAT_PAGE):
+        """
+        [(seq, html), ...] – do `limit` wiadomości o numerze < before, od
+        najstarszej. W pamięci jest tylko okno ChatLog; starsze czytamy z bazy
+        po indeksie (room_code, seq).
+        """
+        with self._lock:
+            dirty = bool(self._bumps.get(code))
+        if dirty:
+            self.flush()
+        conn = self._pool.acquire()
+        try:
+            rows = conn.execute(
+                "SELECT seq, author, text FROM chat WHERE room_code = ? AND seq < ? "
+                "ORDER BY seq DESC LIMIT ?",
+                (code, before, limit),
+            ).fetchall()
+        finally:
+            self._pool.release(conn)
+        return [(seq, message_html(author, text)) for seq, author, text in reversed(rows)]
+
+    def ensure_player(self, code, nickname):
+        with self.room_lock(code):
+            room = self.room(code)
+            entry = self._player(code, room, nickname)
+            self._seen(code, nickname, entry)
+            return entry
+
+    def touch_player(self, code, nickname):
+        """Sygnał życia gracza (np. z okresowego sprawdzania wersji pokoju)."""
+        with self.room_lock(code):
+            room = self.room(code)
+            entry = room["players"].get(nickname)
+            if entry is not None:
+                self._seen(code, nickname, entry)
+
+    def _seen(self, code, nickname, entry):
+        now = entry["last_seen"] = time.time()
+        with self._lock:
+            due = now - self._seen_written.get((code, nickname), 0) >= PLAYER_TOUCH_INTERVAL
+            if due:
+                self._seen_written[(code, nickname)] = now
+        if due:
+            self._queue(
+                code,
+                "UPDATE players SET last_seen = ? WHERE room_code = ? AND nickname = ?",
+                (now, code, nickname),
+            )
+
+    # -------------------- zmiany --------------------
+    def _queue(self, code, sql, params):
+        with self._lock:
+            self._pending[code].append((sql, params))
+        self._wake.set()
+
+    def log_event(self, code, kind, player=None, payload=""):
+        """Zdarzenie do dziennika gry (orapa.events); nie zmienia wersji pokoju."""
+        with self._lock:
+            self._events[code].append((time.time(), kind, player, payload))
+        self._wake.set()
+
+    def game_log(self, code):
+        """Cały dziennik zdarzeń pokoju (read_game_log) – do orapa.events.replay."""
+        self.flush()
+        conn = self._pool.acquire()
+        try:
+            return read_game_log(conn, code)
+        finally:
+            self._pool.release(conn)
+
+    @property
+    def closed(self):
+        return self._stop.is_set()
+
+    def data_version(self):
+        """
+        PRAGMA data_version połączenia zapisującego: zmienia się tylko po
+        commitach innych połączeń, czyli innych procesów (ten proces pisze
+        wyłącznie tym połączeniem).
+        """
+        with self._flush_lock:
+            return self._writer.execute("PRAGMA data_version").fetchone()[0]
+
+    def add_listener(self, fn):
+        """fn(kod_pokoju) po każdej zmianie pokoju w tym procesie."""
+        self._listeners.append(fn)
+
+    def _touch(self, code, room):
+        with self._lock:
+            room["version"] += 1
+            self._bumps[code] += 1
+        for fn in self._listeners:
+            fn(code)
+
+    def _player(self, code, room, nickname):
+        """Wpis gracza; nowy gracz to nowy słownik graczy (czytający trzymają stary)."""
+        entry = room["players"].get(nickname)
+        if entry is None:
+            entry = new_player()
+            room["players"] = {**room["players"], nickname: entry}
+            with self._lock:
+                self._seen_written[(code, nickname)] = entry["last_seen"]
+            self._queue(
+                code,
+                "INSERT OR IGNORE INTO players (room_code, nickname, last_seen) VALUES (?, ?, ?)",
+                (code, nickname, entry["last_seen"]),
+            )
+            self.log_event(code, "j", nickname)
+            self._touch(code, room)
+        return entry
+
+    def _save_secrets(self, code, room):
+        secrets = {
+            nick: p["green_locked"].code for nick, p in room["players"].items()
+            if p["green_locked"] is not None
+        }
+        self._queue(
+            code,
+            "INSERT INTO games (game_id, secret_board, moves, updated_at) VALUES (?, ?, '', ?) "
+            "ON CONFLICT(game_id) DO UPDATE SET secret_board = excluded.secret_board, "
+            "updated_at = excluded.updated_at",
+            (code, json.dumps(secrets), _now()),
+        )
+
+    def append_chat(self, code, author, text):
+        with self.room_lock(code):
+            room = self.room(code)
+            room["chat"].append(author, text)
+            # seq liczymy w bazie: przy równoległym zapisie z innego procesu pokój
+            # i tak zostanie wczytany od nowa (nowy epoch czatu)
+            self._queue(
+                code,
+                "INSERT INTO chat (room_code, seq, author, text, created_at) VALUES "
+                "(?, (SELECT COALESCE(MAX(seq), 0) + 1 FROM chat WHERE room_code = ?), ?, ?, ?)",
+                (code, code, author, text, _now()),
+            )
+            self.log_event(code, "c", author, json.dumps(text, ensure_ascii=False))
+            self._touch(code, room)
+
+    def lock_board(self, code, nickname, board, answers):
+        """START: zapamiętuje zamrożoną planszę gracza i tablicę odpowiedzi."""
+        with self.room_lock(code):
+            room = self.room(code)
+            entry = self._player(code, room, nickname)
+            entry["ready"] = True
+            entry["green_locked"] = Board.from_state(board)
+            entry["answers"] = list(answers)
+            self._queue(
+                code,
+                "UPDATE players SET ready = 1, answers = ? WHERE room_code = ? AND nickname = ?",
+                (json.dumps(entry["answers"]), code, nickname),
+            )
+            self._save_secrets(code, room)
+            self.log_event(code, "s", nickname, entry["green_locked"].code)
+            self._touch(code, room)
+
+    def add_probe(self, code, nickname, entry_label, answer):
+        with self.room_lock(code):
+            room = self.room(code)
+            entry = self._player(code, room, nickname)
+            entry["probes"] = [*entry["probes"], {"entry": entry_label, "answer": answer}]
+            self._queue(
+                code,
+                "UPDATE players SET probes = ? WHERE room_code = ? AND nickname = ?",
+                (json.dumps(entry["probes"]), code, nickname),
+            )
+            self.log_event(code, "p", nickname, f"{entry_label}:{answer}")
+            self._touch(code, room)
+
+    def finish_game(self, code, winner):
+        """
+        ZAKOŃCZ: kończy grę, jeśli jeszcze trwa. Zwraca False, gdy ktoś
+        zakończył ją wcześniej (np. obaj gracze kliknęli naraz) – zostaje
+        pierwszy zwycięzca.
+        """
+        with self.room_lock(code):
+            room = self.room(code)
+            if room["game_over"]:
+                return False
+            room["game_over"] = True
+            room["winner"] = winner
+            self._queue(code, "UPDATE rooms SET game_over = 1, winner = ? WHERE code = ?", (winner, code))
+            self.log_event(code, "f", winner)
+            self._touch(code, room)
+            return True
+
+    def restart(self, code, by=None):
+        """RESTART: nowa gra w pokoju – gracze i czat zostają; `by` – kto kliknął (do dziennika)."""
+        with self.room_lock(code):
+            room = self.room(code)
+            room["game_over"] = False
+            room["winner"] = None
+            for p in room["players"].values():
+                p["ready"] = False
+                p["green_locked"] = None
+                p["answers"] = None
+                p["probes"] = []
+            self._queue(code, "UPDATE rooms SET game_over = 0, winner = NULL WHERE code = ?", (code,))
+            self._queue(
+                code,
+                "UPDATE players SET ready = 0, answers = NULL, probes = '[]' WHERE room_code = ?",
+                (code,),
+            )
+            self._save_secrets(code, room)
+            self.log_event(code, "r", by)
+            self._touch(code, room)
+
+    # -------------------- zapis do bazy --------------------
+    def flush(self):
+        """Zapisuje wszystkie zaległe zmiany w jednej transakcji."""
+        with self._flush_lock:
+            with self._lock:
+                if not self._pending and not self._events and not any(self._bumps.values()):
+                    return 0
+                pending, self._pending = self._pending, defaultdict(list)
+                bumps, self._bumps = self._bumps, defaultdict(int)
+                events, self._events = self._events, defaultdict(list)
+            # zmiana trafia do kolejki i podbija wersję osobno: podbicie bez
+            # operacji w tej paczce (operacja poszła z poprzednią) też zapisujemy
+            codes = list(pending) + [c for c, n in bumps.items() if n and c not in pending]
+
+            conn = self._writer
+            stale = []
+            synced = {}
+            try:
+                # BEGIN też bywa "database is locked" – wtedy paczka wraca do kolejki
+                conn.execute("BEGIN IMMEDIATE")
+                for code in codes:
+                    conn.execute("INSERT OR IGNORE INTO rooms (code, updated_at) VALUES (?, ?)", (code, _now()))
+                    for sql, params in pending.get(code, ()):
+                        conn.execute(sql, params)
+                    before = conn.execute("SELECT version FROM rooms WHERE code = ?", (code,)).fetchone()[0]
+                    after = before + bumps.get(code, 0)
+                    conn.execute(
+                        "UPDATE rooms SET version = ?, updated_at = ? WHERE code = ?", (after, _now(), code)
+                    )
+                    synced[code] = after
+                    if before != self._synced.get(code, 0):
+                        stale.append(code)       # w międzyczasie pisał inny proces
+                conn.executemany(
+                    "INSERT INTO events (game_id, chunk) VALUES (?, ?)",
+                    [(code, encode_chunk(items)) for code, items in events.items() if items],
+                )
+                conn.execute("COMMIT")
+                self.metrics["flushes"] += 1
+                self.metrics["ops_written"] += sum(len(ops) for ops in pending.values())
+                self.metrics["events_written"] += sum(len(items) for items in events.values())
+            except BaseException:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                with self._lock:
+                    for code in codes:
+                        self._pending[code][:0] = pending.get(code, [])
+                        self._bumps[code] += bumps.get(code, 0)
+                    for code, items in events.items():
+                        self._events[code][:0] = items
+                raise
+
+            with self._lock:
+                self._synced.update(synced)
+            for code in stale:
+                with self.room_lock(code):
+                    with self._lock:
+                        reload = code in self._rooms and not self._bumps[code]
+                    room = self._load(conn, code) if reload else None
+                    with self._lock:
+                        if room is not None and code in self._rooms and not self._bumps[code]:
+                            self._rooms[code] = room
+            with self._lock:
+                self._trim()
+            return sum(len(ops) for ops in pending.values())
+
+    def _flush_loop(self):
+        while not self._stop.is_set():
+            self._wake.wait()
+            self._stop.wait(self.flush_interval)     # zbieramy zmiany w jedną transakcję
+            self._wake.clear()
+            try:
+                self.flush()
+            except sqlite3.Error:
+                time.sleep(self.flush_interval)
+                self._wake.set()
+
+    # -------------------- sprzątanie --------------------
+    def sweep(self, now=None):
+        """Usuwa bezczynnych graczy i zdejmuje z pamięci bezczynne pokoje."""
+        now = time.time() if now is None else now
+        with self._lock:
+            stale = [
+                (code, nick)
+                for code, room in self._rooms.items()
+                for nick, p in room["players"].items()
+                if p["last_seen"] < now - self.player_ttl
+            ]
+        if stale:
+            self.flush()
+            removed = []
+            with self._flush_lock:
+                # last_seen w bazie mógł odświeżyć inny proces
+                conn = self._writer
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    for code, nick in stale:
+                        cur = conn.execute(
+                            "DELETE FROM players WHERE room_code = ? AND nickname = ? "
+                            "AND COALESCE(last_seen, 0) < ?",
+                            (code, nick, now - self.player_ttl),
+                        )
+                        if cur.rowcount:
+                            removed.append((code, nick))
+                    conn.execute("COMMIT")
+                except BaseException:
+                    conn.execute("ROLLBACK")
+                    raise
+            for code, nick in removed:
+                with self.room_lock(code):
+                    with self._lock:
+                        room = self._rooms.get(code)
+                        self._seen_written.pop((code, nick), None)
+                    if room is not None and nick in room["players"]:
+                        room["players"] = {n: p for n, p in room["players"].items() if n != nick}
+                        self._save_secrets(code, room)
+                        self._touch(code, room)
+                        self.metrics["players_evicted"] += 1
+
+        with self._lock:
+            idle = [
+                code for code, room in self._rooms.items()
+                if room["last_active"] < now - self.room_ttl and not self._dirty(code)
+            ]
+            for code in idle:
+                self._evict(code)
+            self.metrics["rooms_evicted_ttl"] += len(idle)
+            self._trim()
+
+    def _janitor_loop(self, interval):
+        while not self._stop.wait(interval):
+            try:
+                self.sweep()
+            except sqlite3.Error:
+                pass
+
+    def stats(self):
+        with self._lock:
+            out = dict(self.metrics)
+            out["live_rooms"] = len(self._rooms)
+            out["live_players"] = sum(len(r["players"]) for r in self._rooms.values())
+            out["pending_ops"] = sum(len(ops) for ops in self._pending.values())
+        return out
+
+    def room_stats(self):
+        """Wskaźniki żywych pokoi dla orapa.metrics: [(nazwa, etykiety, wartość), ...]."""
+        with self._lock:
+            rooms = list(self._rooms.items())
+        out = [("orapa_live_rooms", {}, len(rooms))]
+        for code, room in rooms:
+            labels = {"room": code}
+            out.append(("orapa_room_players", labels, len(room["players"])))
+            out.append(("orapa_room_chat_messages", labels, len(room["chat"])))
+            out.append(("orapa_room_bytes", labels, _room_bytes(room)))
+        return out
+
+    def close(self):
+        if self._stop.is_set():
+            return
+        self._stop.set()
+        self._wake.set()
+        self._thread.join(timeout=1.0)
+        self.flush()
+        self._writer.close()
+        self._pool.close()
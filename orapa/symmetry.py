@@ -0,0 +1,193 @@
+"""
+Postać kanoniczna ułożeń: to samo ułożenie zapisane raz.
+
+Dwa źródła duplikatów:
+- aliasy położeń – równoległobok jest środkowo symetryczny, więc połowa
+  jego par (r_ori, r_flip) daje dokładnie ten sam kształt co druga połowa
+  (248 z 496 położeń); aliasem jest każde położenie o tym samym zbiorze
+  wierzchołków co położenie o mniejszym indeksie,
+- symetrie planszy 10 x 8: odbicie w poziomie, w pionie i obrót o 180°.
+  Odbite ułożenie to ta sama zagadka z przenumerowanymi polami brzegowymi
+  (ale inny obrazek – do cache rysunków tylko aliasy, symmetries=False).
+
+Dla każdej figury liczymy raz tablice: indeks położenia -> indeks
+kanonicznego aliasu położenia po przekształceniu planszy (tablice położeń
+są zamknięte na odbicia). Postać kanoniczna N ułożeń to wektorowo
+najmniejsza leksykograficznie z 4 wersji, a klucz 64-bitowy to jej zapis
+w systemie o podstawach = rozmiary tablic położeń (iloczyn ~5.5e16 < 2^64),
+więc różne ułożenia mają różne klucze – bez kolizji, ale tylko w obrębie
+jednych tablic położeń (odcisk tables.fingerprint). Ułożenia spoza tablic
+dostają skrót blake2b kodu Board z najwyższym bitem ustawionym, bez
+redukcji symetrii.
+
+DedupIndex trzyma posortowane klucze (uint64) i mówi, które ułożenia z
+paczki są nowe; pojedyncze add() zbiera klucze w buforze i scala je z
+tablicą co DEDUP_BUFFER kluczy, a nie kopiuje tablicy przy każdym
+ułożeniu. solver.enumerate_layouts(unique=...) zapisuje tylko ułożenia,
+które same są swoją postacią kanoniczną.
+"""
+import hashlib
+import threading
+
+import numpy as np
+
+from orapa.board import Board
+from orapa.geometry import COLS, ROWS
+from orapa.placements import SCALE, get_tables
+
+# przekształcenia planszy na wierzchołkach w dziesiątych częściach pola
+_W, _H = COLS * SCALE, ROWS * SCALE
+TRANSFORMS = {
+    "odbicie poziome": lambda v: np.stack([_W - v[..., 0], v[..., 1]], axis=-1),
+    "odbicie pionowe": lambda v: np.stack([v[..., 0], _H - v[..., 1]], axis=-1),
+    "obrót 180°": lambda v: np.stack([_W - v[..., 0], _H - v[..., 1]], axis=-1),
+}
+OUTSIDE_BIT = np.uint64(1 << 63)     # klucze ułożeń spoza tablic położeń
+DEDUP_BUFFER = 4096                  # klucze z add() scalane z tablicą paczkami
+
+
+def _shape_key(verts):
+    return tuple(sorted(set(map(tuple, verts.tolist()))))
+
+
+class SymmetryTables:
+    def __init__(self, tables=None):
+        self.tables = tables or get_tables()
+        self.sizes = self.tables.sizes()
+        self.alias = []                 # [figura] -> (P,) indeks kanonicznego aliasu
+        self.maps = []                  # [symetria][figura] -> (P,) alias po przekształceniu
+        first = []
+        for verts in self.tables.verts:
+            index = {}
+            alias = np.empty(len(verts), dtype=np.int64)
+            for i, v in enumerate(verts):
+                alias[i] = index.setdefault(_shape_key(v), i)
+            self.alias.append(alias)
+            first.append(index)
+        for transform in TRANSFORMS.values():
+            self.maps.append([
+                np.array([index[_shape_key(transform(v.astype(np.int64)))] for v in verts], dtype=np.int64)
+                for verts, index in zip(self.tables.verts, first)
+            ])
+        radix = np.cumprod([1] + self.sizes[:-1], dtype=np.uint64)
+        self.radix = radix.astype(np.uint64)
+
+    def canonical_indices(self, idx, symmetries=True):
+        """(N, 7) kanoniczne indeksy położeń dla ułożeń (N, 7)."""
+        idx = np.atleast_2d(np.asarray(idx, dtype=np.int64))
+        best = np.stack([self.alias[p][idx[:, p]] for p in range(len(self.sizes))], axis=1)
+        if not symmetries:
+            return best
+        rows = np.arange(len(idx))
+        for maps in self.maps:
+            cand = np.stack([maps[p][idx[:, p]] for p in range(len(self.sizes))], axis=1)
+            diff = cand != best
+            col = diff.argmax(axis=1)
+            smaller = diff.any(axis=1) & (cand[rows, col] < best[rows, col])
+            best[smaller] = cand[smaller]
+        return best
+
+    def is_canonical(self, idx, symmetries=True):
+        """Które ułożenia (N, 7) same są swoją postacią kanoniczną."""
+        idx = np.atleast_2d(np.asarray(idx, dtype=np.int64))
+        return (self.canonical_indices(idx, symmetries) == idx).all(axis=1)
+
+    def keys(self, idx, symmetries=True):
+        """(N,) uint64: klucz postaci kanonicznej (różny dla różnych ułożeń)."""
+        canon = self.canonical_indices(idx, symmetries).astype(np.uint64)
+        return (canon * self.radix).sum(axis=1, dtype=np.uint64)
+
+
+_symmetry = None
+_symmetry_lock = threading.Lock()
+
+
+def get_symmetry_tables():
+    global _symmetry
+    if _symmetry is None:
+        with _symmetry_lock:
+            if _symmetry is None:
+                _symmetry = SymmetryTables()
+    return _symmetry
+
+
+# ---------------------------------------------------------
+# Pojedyncze ułożenia
+# ---------------------------------------------------------
+def canonical_board(layout, symmetries=True):
+    """Board postaci kanonicznej (słownik planszy albo Board); spoza tablic – bez zmian."""
+    board = Board.from_state(layout)
+    sym = get_symmetry_tables()
+    idx = board.to_indices(sym.tables)
+    if idx is None:
+        return board
+    return Board.from_indices(sym.canonical_indices([idx], symmetries)[0], sym.tables)
+
+
+def layout_key(layout, symmetries=True):
+    """64-bitowy klucz postaci kanonicznej ułożenia (int)."""
+    board = Board.from_state(layout)
+    sym = get_symmetry_tables()
+    idx = board.to_indices(sym.tables)
+    if idx is None:
+        digest = hashlib.blake2b(board.code.encode(), digest_size=8).digest()
+        return int(np.uint64(int.from_bytes(digest, "little")) | OUTSIDE_BIT)
+    return int(sym.keys([idx], symmetries)[0])
+
+
+# ---------------------------------------------------------
+# Indeks bez duplikatów
+# ---------------------------------------------------------
+class DedupIndex:
+    """Klucze kanoniczne widzianych ułożeń (posortowany uint64)."""
+
+    def __init__(self, symmetries=True):
+        self.symmetries = symmetries
+        self._keys = np.zeros(0, dtype=np.uint64)
+        self._buffer = set()             # klucze z add() jeszcze nie w _keys (int)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._keys) + len(self._buffer)
+
+    def _sorted_has(self, key):
+        pos = np.searchsorted(self._keys, key)
+        return bool(pos < len(self._keys) and self._keys[pos] == key)
+
+    def _merge(self):
+        if self._buffer:
+            new = np.fromiter(self._buffer, dtype=np.uint64, count=len(self._buffer))
+            self._keys = np.union1d(self._keys, new)
+            self._buffer.clear()
+
+    def __contains__(self, layout):
+        key = layout_key(layout, self.symmetries)
+        with self._lock:
+            return key in self._buffer or self._sorted_has(np.uint64(key))
+
+    def add_many(self, idx):
+        """Dodaje ułożenia (N, 7); zwraca maskę tych, których jeszcze nie było (pierwsze wystąpienia)."""
+        return self.add_keys(get_symmetry_tables().keys(idx, self.symmetries))
+
+    def add_keys(self, keys):
+        """Jak add_many, ale dla gotowych kluczy (layout_key / SymmetryTables.keys)."""
+        keys = np.asarray(keys, dtype=np.uint64)
+        uniq, first = np.unique(keys, return_index=True)
+        with self._lock:
+            self._merge()
+            new = ~np.isin(uniq, self._keys, assume_unique=True)
+            self._keys = np.union1d(self._keys, uniq[new])
+        mask = np.zeros(len(keys), dtype=bool)
+        mask[first[new]] = True
+        return mask
+
+    def add(self, layout):
+        """Dodaje jedno ułożenie (słownik planszy albo Board); True, gdy nowe."""
+        key = layout_key(layout, self.symmetries)
+        with self._lock:
+            if key in self._buffer or self._sorted_has(np.uint64(key)):
+                return False
+            self._buffer.add(key)
+            if len(self._buffer) >= DEDUP_BUFFER:
+                self._merge()
+            return True
@@ -0,0 +1,54 @@
+"""Board: zapis ułożenia w jednej liczbie i 20-znakowy kod."""
+import pytest
+
+from orapa.board import Board
+from orapa.geometry import BOARD_KEYS, make_single_board
+from orapa.legality import random_states
+from orapa.placements import get_tables
+from orapa.solver import random_layouts
+
+
+def test_code_round_trip():
+    for state in random_states(300, 3):
+        board = Board.from_state(state)
+        assert len(board.code) == 20
+        again = Board.from_code(board.code)
+        assert again == board
+        assert hash(again) == hash(board)
+        assert Board.from_state(again.to_state()) == board
+
+
+def test_state_round_trip_keeps_positions():
+    for state in random_states(100, 4):
+        restored = Board.from_state(state).to_state()
+        for key in BOARD_KEYS:
+            assert restored[key] == pytest.approx(state[key]), key
+
+
+def test_indices_round_trip():
+    tables = get_tables()
+    for idx in random_layouts(200, 1):
+        board = Board.from_indices(idx, tables)
+        assert board.to_indices(tables) == [int(i) for i in idx]
+        assert Board.from_code(board.code).to_indices(tables) == [int(i) for i in idx]
+
+
+def test_different_boards_differ():
+    a = make_single_board()
+    b = make_single_board()
+    b["lb_x"] += 1
+    assert Board.from_state(a) != Board.from_state(b)
+    assert Board.from_state(a).code != Board.from_state(b).code
+
+
+def test_immutable():
+    board = Board.from_state(make_single_board())
+    with pytest.raises(AttributeError):
+        board.packed = 0
+
+
+def test_out_of_range_position():
+    state = make_single_board()
+    state["lb_y"] = -3.0
+    with pytest.raises(ValueError):
+        Board.from_state(state)
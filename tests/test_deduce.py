@@ -0,0 +1,41 @@
+"""Dedukcja na pliku kandydatów: zawężanie po odpowiedziach i pewne figury."""
+import numpy as np
+
+from orapa.deduce import Deduction, build_answers
+from orapa.placements import PIECES
+from orapa.rays import ENTRY_LABELS
+from orapa.solver import enumerate_layouts, parse_fix
+
+FIX = ["s=6,6,0", "lb=1,1", "y=3,3,0", "w=8,2,0", "b=2,6,0"]
+
+
+def test_deduction_skips_pinned(tmp_path):
+    fixed = parse_fix(FIX)
+    path = tmp_path / "cand.bin"
+    enumerate_layouts(path, fixed, limit=3000, workers=1)
+    build_answers(str(path), workers=1)
+    ded = Deduction.open(str(path), build=False)
+    assert not ded.complete
+    truth = 17
+    for entry in ("A", "B", "C", "1", "2", "3"):
+        ded.observe(entry, int(ded.answers[ENTRY_LABELS.index(entry), truth]))
+    assert truth in set(np.asarray(ded.alive).tolist())
+    assert not set(ded.forced()) & {PIECES[p] for p in fixed}
+    assert ded.fork().pinned == ded.pinned
+
+
+def test_parallel_counts_match_serial(tmp_path, monkeypatch):
+    import orapa.deduce
+
+    path = tmp_path / "cand.bin"
+    enumerate_layouts(path, parse_fix(FIX), limit=3000, workers=1)
+    build_answers(str(path), workers=1)
+    ded = Deduction.open(str(path), build=False)
+    serial = ded.counts(workers=1)
+    hist, _ = ded.heatmap(workers=1)
+    monkeypatch.setattr(orapa.deduce, "PARALLEL_MIN", 1)
+    monkeypatch.setattr(orapa.deduce, "COUNTS_CHUNK", 700)
+    ded._heat = None
+    assert not ded.processes            # aplikacja: wątki, bez fork procesu serwera
+    assert (ded.counts(workers=4) == serial).all()
+    assert np.allclose(ded.heatmap(workers=4)[0], hist)
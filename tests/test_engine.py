@@ -0,0 +1,74 @@
+"""orapa.engine: parsowanie ułożeń z tekstu, sprawdzanie i porównywanie."""
+import json
+
+import pytest
+
+from orapa import engine
+from orapa.engine import _validate_chunk, main
+from orapa.legality import CONTACT_NONE, check_layouts, state_params
+from orapa.placements import on_grid
+
+
+def _json(state):
+    return json.dumps({k: state[k] for k in engine.BOARD_KEYS})
+
+
+def test_parse_forms_agree():
+    state = engine.random_state(seed=1)
+    board = engine.as_board(state)
+    idx = board.to_indices(engine.get_tables())
+    for text in (board.code, ",".join(map(str, idx)), _json(state)):
+        assert engine.boards_equal(engine.parse_layout(text), state)
+
+
+@pytest.mark.parametrize("text", [
+    '{"y_cx": "a"}',
+    '{"foo": 1}',
+    '{"r_flip": 2}',
+    '{"y_ori": 1.5}',
+    '{"lb_x": true}',
+    '[1, 2]',
+    "1,2,3",
+    "not-a-code",
+])
+def test_parse_rejects(text):
+    with pytest.raises(ValueError):
+        engine.parse_layout(text)
+
+
+def test_validate_reports_bad_lines():
+    good = engine.random_state(seed=2)
+    out, ok, errors = _validate_chunk([_json(good), '{"y_cx": "a"}', "xyz"])
+    assert (ok, errors) == (1, 2)
+    assert [line.split("\t")[1] for line in out] == ["ok", "error", "error"]
+
+
+def test_off_board_is_illegal():
+    state = engine.random_state(seed=3)
+    assert engine.validate_layout(state)[0]
+    state["lb_x"], state["lb_y"] = 11.0, -3.0
+    valid, msg = engine.validate_layout(state)
+    assert not valid and "poza planszę" in msg
+    assert engine.check_many([engine.parse_layout(_json(state))]) == [(valid, msg)]
+
+
+def test_compare_against_is_checked_once(capsys):
+    with pytest.raises(SystemExit) as exc:
+        main(["compare", "-", "--against", "xyz"])
+    assert exc.value.code == 2
+    assert "--against" in capsys.readouterr().err
+
+
+def test_off_grid_layout_skips_tables(monkeypatch):
+    # locate zaokrągliłby y do siatki – takie ułożenie liczy geometria
+    state = engine.random_state(seed=4)
+    moved = dict(state, y_cx=state["y_cx"] + 0.04)
+    assert on_grid(dict(state, y_cx=state["y_cx"] + 1e-12))
+    assert not on_grid(moved) and not on_grid(dict(state, y_ori=1.5))
+
+    def fail(indexed):
+        raise AssertionError("tablice dla ułożenia spoza siatki")
+
+    expected = check_layouts([state_params(moved)])[0][0] == CONTACT_NONE
+    monkeypatch.setattr(engine.get_tables(), "check_indexed", fail)
+    assert engine.validate_layout(moved)[0] == expected
@@ -0,0 +1,82 @@
+"""Dziennik zdarzeń: encode_chunk -> parse/replay odtwarza pokój."""
+import json
+
+from orapa.board import Board
+from orapa.events import encode_board, encode_chunk, encode_moves, parse, replay
+from orapa.geometry import make_single_board
+from orapa.placements import get_tables
+from orapa.solver import random_layouts
+
+T0 = 1_700_000_000.0
+
+
+def _moves_state(actions):
+    """Stan planszy po ruchach od planszy startowej – jak w aplikacji (tables.step)."""
+    state = make_single_board()
+    for piece, action in actions:
+        get_tables().step(state, piece, action)
+    return state
+
+
+def test_parse_round_trip():
+    events = [
+        (T0, "j", "ala", ""),
+        (T0 + 0.3, "c", "ala, ma kota", json.dumps("hej, ;\nco?")),
+        (T0 + 12.5, "p", "bob", "C:13"),
+    ]
+    parsed = list(parse(encode_chunk(events)))
+    assert [e[1:] for e in parsed] == [e[1:] for e in events]
+    assert [round(e[0], 1) for e in parsed] == [e[0] for e in events]
+
+
+def test_replay_game():
+    tables = get_tables()
+    moves = [("y", "right"), ("y", "right"), ("r", "rot_left"), ("r", "flip"), ("lb", "down"), ("t2", "up")]
+    secret = Board.from_indices(random_layouts(1, 2)[0], tables)
+    guess = Board.from_indices(random_layouts(1, 3)[0], tables)
+
+    first = encode_chunk([
+        (T0, "j", "ala", ""),
+        (T0 + 1, "m", "ala", encode_moves("zielona", moves)),
+        (T0 + 2, "s", "ala", secret.code),
+        (T0 + 3, "c", "ala", json.dumps("gotowa")),
+    ])
+    second = encode_chunk([
+        (T0 + 4, "j", "bob", ""),
+        (T0 + 5, "b", "bob", encode_board("fioletowa", guess)),
+        (T0 + 6, "p", "bob", "A:7"),
+        (T0 + 7, "f", "bob", ""),
+    ])
+    room = replay(first + second)
+
+    ala, bob = room["players"]["ala"], room["players"]["bob"]
+    assert ala["boards"]["zielona"] == Board.from_state(_moves_state(moves))
+    assert ala["moves"] == len(moves)
+    assert ala["ready"] and ala["green_locked"] == secret
+    assert bob["boards"]["fioletowa"] == guess
+    assert bob["probes"] == [{"entry": "A", "answer": 7}]
+    assert room["chat"][0][1:] == ("ala", "gotowa")
+    assert room["game_over"] and room["winner"] == "bob"
+    assert room["events"] == 8
+
+    # stan po części zdarzeń
+    early = replay(first + second, upto=3)
+    assert early["players"]["ala"]["ready"]
+    assert "bob" not in early["players"]
+    assert not early["game_over"]
+
+
+def test_restart_clears_game():
+    secret = Board.from_indices(random_layouts(1, 4)[0], get_tables())
+    log = encode_chunk([
+        (T0, "s", "ala", secret.code),
+        (T0 + 1, "p", "ala", "B:3"),
+        (T0 + 2, "f", "ala", ""),
+        (T0 + 3, "r", "ala", ""),
+    ])
+    room = replay(log)
+    ala = room["players"]["ala"]
+    assert not room["game_over"] and room["winner"] is None
+    assert not ala["ready"] and ala["green_locked"] is None and ala["probes"] == []
+    assert ala["boards"]["zielona"] == Board.from_state(make_single_board())
+
@@ -0,0 +1,29 @@
+"""RoomHub: budzenie sesji tylko wtedy, gdy ich skrypt nie działa."""
+import pytest
+
+from orapa.hub import RoomHub
+from orapa.store import RoomStore
+
+AppSessionState = pytest.importorskip("streamlit.runtime.app_session").AppSessionState
+
+
+class FakeSession:
+    def __init__(self, state):
+        self._state = state
+        self.reruns = 0
+
+    def request_rerun(self, client_state):
+        self.reruns += 1
+
+
+def test_running_session_is_not_interrupted(tmp_path):
+    store = RoomStore(str(tmp_path / "orapa.db"), flush_interval=60)
+    try:
+        hub = RoomHub(store)
+        idle, running = FakeSession(AppSessionState.APP_NOT_RUNNING), FakeSession(AppSessionState.APP_IS_RUNNING)
+        hub._rerun_idle(idle)
+        hub._rerun_idle(running)
+        assert (idle.reruns, running.reruns) == (1, 0)
+        assert (hub.wakeups, hub.skipped) == (1, 1)
+    finally:
+        store.close()
@@ -0,0 +1,49 @@
+"""Szybki silnik check_layout kontra wzorzec na Shapely (orapa.legality --diff)."""
+import pytest
+
+from orapa.geometry import make_single_board
+from orapa.legality import (
+    CONTACT_NONE,
+    MSG_OK,
+    check_layout,
+    check_layouts,
+    differential_check,
+    outside_board,
+    random_states,
+    state_params,
+)
+
+pytest.importorskip("shapely")
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_matches_shapely(seed):
+    assert differential_check(1500, seed) == []
+
+
+def test_sample_has_both_verdicts():
+    # losowe stany mają mieć i poprawne, i złe ułożenia – inaczej test różnicowy nic nie mówi
+    verdicts, _ = check_layouts([state_params(s) for s in random_states(1500, 0)])
+    assert (verdicts == CONTACT_NONE).any()
+    assert (verdicts != CONTACT_NONE).any()
+
+
+def test_check_layout_uses_tables_and_geometry_alike():
+    for state in random_states(200, 5):
+        verdict, pair = check_layouts([state_params(state)])
+        assert check_layout(state)[0] == (int(verdict[0]) == CONTACT_NONE)
+
+
+def test_start_board_is_rejected():
+    # plansza startowa ma figury nachodzące na siebie
+    valid, msg = check_layout(make_single_board())
+    assert not valid
+    assert msg != MSG_OK
+
+
+
+def test_outside_board():
+    state = make_single_board()
+    assert outside_board([state_params(state)])[0] == -1
+    state["lb_x"], state["lb_y"] = 11.0, -3.0
+    assert outside_board([state_params(state)])[0] == 6
@@ -0,0 +1,51 @@
+"""Pliki ułożeń z solvera: nagłówek (przypięte figury, pełność) i zawartość."""
+from orapa.placements import PIECES
+from orapa.solver import (
+    count_layouts,
+    enumerate_layouts,
+    parse_fix,
+    random_layouts,
+    read_header,
+    read_layouts,
+    sample_layouts,
+    verify_layouts,
+)
+
+FIX = ["s=6,6,0", "lb=1,1", "y=3,3,0", "w=8,2,0", "b=2,6,0"]
+
+
+def test_enumerate_content(tmp_path):
+    fixed = parse_fix(FIX)
+    path = tmp_path / "full.bin"
+    n = enumerate_layouts(path, fixed, workers=1)
+    assert n == count_layouts(fixed, workers=1)
+    layouts = read_layouts(path)
+    assert len(layouts) == n
+    for p, i in fixed.items():
+        assert (layouts[:, p] == i).all()
+    assert verify_layouts(layouts, sample=300) == 0
+
+
+def test_random_layouts_are_legal_and_seeded(tmp_path):
+    rows = random_layouts(500, 7)
+    assert verify_layouts(rows) == 0
+    assert (random_layouts(500, 7) == rows).all()
+    path = tmp_path / "sample.bin"
+    sample_layouts(path, 300, seed=3, workers=1)
+    assert verify_layouts(read_layouts(path)) == 0
+
+
+def test_enumerate_header(tmp_path):
+    fixed = parse_fix(FIX)
+    path = tmp_path / "full.bin"
+    enumerate_layouts(path, fixed, workers=1)
+    header = read_header(path)
+    assert header["exhaustive"]
+    assert set(header["pinned"]) == {PIECES[p] for p in fixed}
+
+
+def test_limit_is_not_exhaustive(tmp_path):
+    path = tmp_path / "part.bin"
+    assert enumerate_layouts(path, parse_fix(FIX), limit=100, workers=1) == 100
+    assert not read_header(path)["exhaustive"]
+    assert read_header(path)["pinned"]
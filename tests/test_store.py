@@ -0,0 +1,197 @@
+"""RoomStore: zapis do bazy, wersje pokoi, blokady i kilka procesów na jednej bazie."""
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from orapa.events import encode_chunk, replay
+from orapa.geometry import make_single_board
+from orapa.rays import answer_table
+from orapa.store import RoomStore, connect
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "orapa.db")
+
+
+@pytest.fixture
+def store(db_path):
+    s = RoomStore(db_path, flush_interval=60)       # zapisujemy ręcznie (flush)
+    yield s
+    s.close()
+
+
+def _db_version(path, code):
+    return connect(path).execute("SELECT version FROM rooms WHERE code = ?", (code,)).fetchone()[0]
+
+
+def test_flush_persists_room(store, db_path):
+    store.append_chat("ABC", "ala", "hej")
+    state = make_single_board()
+    store.lock_board("ABC", "ala", state, answer_table(state))
+    store.add_probe("ABC", "ala", "C", 13)
+    store.flush()
+
+    other = RoomStore(db_path, flush_interval=60)
+    try:
+        room = other.room("ABC")
+        assert [m["text"] for m in room["chat"]] == ["hej"]
+        entry = room["players"]["ala"]
+        assert entry["ready"] and entry["probes"] == [{"entry": "C", "answer": 13}]
+        assert room["version"] == store.room("ABC")["version"] == _db_version(db_path, "ABC")
+        assert "c,ala" in other.game_log("ABC")
+    finally:
+        other.close()
+
+
+def test_bump_after_flush_is_written(store, db_path):
+    # operacja w jednej paczce, podbicie wersji dopiero w następnej (zapis w środku append_chat)
+    room = store.room("ABC")
+    store.flush()
+    store._queue("ABC", "UPDATE rooms SET winner = NULL WHERE code = ?", ("ABC",))
+    store.flush()
+    store._touch("ABC", room)
+    store.flush()
+    assert _db_version(db_path, "ABC") == room["version"]
+
+
+def test_other_process_change_is_seen(store, db_path):
+    store.append_chat("ABC", "ala", "hej")
+    store.flush()
+    other = RoomStore(db_path, flush_interval=60)
+    try:
+        other.append_chat("ABC", "bob", "cześć")
+        other.flush()
+    finally:
+        other.close()
+    assert [m["text"] for m in store.room("ABC")["chat"]] == ["hej", "cześć"]
+
+
+def test_data_version_ignores_own_commits(store, db_path):
+    before = store.data_version()
+    store.append_chat("ABC", "ala", "hej")
+    store.flush()
+    assert store.data_version() == before
+    connect(db_path).execute("UPDATE rooms SET version = version + 1")
+    assert store.data_version() != before
+
+
+def test_room_lock_then_pool_order(store, db_path):
+    # Wątek z blokadą pokoju woła room() (jak ensure_player), a drugi wątek
+    # wczytuje ten sam nieaktualny pokój przy pustej puli połączeń – przy
+    # odwrotnej kolejności blokad oba czekały na siebie w nieskończoność.
+    store._pool.size = 1
+    store.room("ABC")
+    store.flush()
+    connect(db_path).execute("UPDATE rooms SET version = version + 5")
+
+    locked = threading.Event()
+
+    def holder():
+        with store.room_lock("ABC"):
+            locked.set()
+            time.sleep(0.2)
+            store.room("ABC")
+
+    def reader():
+        locked.wait()
+        store.room("ABC")
+
+    threads = [threading.Thread(target=f, daemon=True) for f in (holder, reader)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(5)
+    assert not any(t.is_alive() for t in threads)
+
+
+def test_concurrent_mutations(db_path):
+    store = RoomStore(db_path, flush_interval=0.001)
+    store._pool.size = 2
+    codes = [f"R{i}" for i in range(4)]
+    errors = []
+    try:
+        def worker(k):
+            try:
+                mutate(k, connect(db_path))      # własne połączenie – jak inny proces
+            except Exception as exc:
+                errors.append(exc)
+
+        def mutate(k, bumper):
+            for i in range(100):
+                code = codes[(k + i) % len(codes)]
+                if i % 2:
+                    store.append_chat(code, f"n{k}", str(i))
+                else:
+                    store.room(code)
+                if i % 10 == 0:
+                    bumper.execute("UPDATE rooms SET version = version + 1 WHERE code = ?", (code,))
+
+        threads = [threading.Thread(target=worker, args=(k,), daemon=True) for k in range(6)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join(30)
+        assert not any(t.is_alive() for t in threads)
+        assert errors == []
+        store.flush()
+        rows = connect(db_path).execute("SELECT COUNT(*) FROM chat").fetchone()[0]
+        assert rows == 6 * 50
+    finally:
+        store.close()
+
+
+def test_finish_game_once(store):
+    assert store.finish_game("ABC", "ala")
+    assert not store.finish_game("ABC", "bob")
+    assert store.room("ABC")["winner"] == "ala"
+    store.restart("ABC", by="ala")
+    room = store.room("ABC")
+    assert not room["game_over"] and room["winner"] is None
+
+
+def test_sweep_evicts_idle(db_path):
+    store = RoomStore(db_path, flush_interval=60, player_ttl=10, room_ttl=20)
+    try:
+        store.ensure_player("ABC", "ala")
+        store.flush()
+        now = time.time() + 30
+        store.sweep(now)
+        assert "ala" not in store.room("ABC")["players"]
+        # pokój z niezapisanymi zmianami zostaje w pamięci do zapisu
+        store.flush()
+        store.sweep(now)
+        assert store.stats()["live_rooms"] == 0
+        assert "ala" not in store.room("ABC")["players"]
+    finally:
+        store.close()
+
+
+def test_busy_database_keeps_batch(store, db_path):
+    store.append_chat("ABC", "ala", "hej")
+    store._writer.execute("PRAGMA busy_timeout=0")
+    other = connect(db_path)
+    other.execute("BEGIN IMMEDIATE")            # inny proces trzyma blokadę zapisu
+    try:
+        with pytest.raises(sqlite3.OperationalError):
+            store.flush()
+    finally:
+        other.execute("ROLLBACK")
+    store.flush()
+    assert connect(db_path).execute("SELECT COUNT(*) FROM chat").fetchone()[0] == 1
+
+
+def test_events_are_rows_after_legacy_moves(store, db_path):
+    legacy = encode_chunk([(1_700_000_000.0, "j", "ala", "")])
+    connect(db_path).execute("INSERT INTO games (game_id, moves) VALUES ('ABC', ?)", (legacy,))
+    store.append_chat("ABC", "ala", "hej")
+    store.flush()
+    store.append_chat("ABC", "ala", "cześć")
+    store.flush()
+    assert connect(db_path).execute("SELECT COUNT(*) FROM events").fetchone()[0] == 2
+    assert connect(db_path).execute("SELECT moves FROM games").fetchone()[0] == legacy
+    room = replay(store.game_log("ABC"))
+    assert [m[2] for m in room["chat"]] == ["hej", "cześć"]
+    assert "ala" in room["players"]
@@ -0,0 +1,102 @@
+"""Postać kanoniczna: klucze 64-bitowe, aliasy położeń i odbicia planszy."""
+import numpy as np
+
+from orapa.board import Board
+from orapa.engine import boards_equal
+from orapa.placements import PIECES, get_tables
+from orapa.solver import random_layouts
+from orapa.symmetry import DedupIndex, canonical_board, get_symmetry_tables, layout_key
+
+R = PIECES.index("r")
+
+
+def _with_alias(row):
+    """To samo ułożenie z równoległobokiem w innym położeniu o tym samym kształcie."""
+    sym = get_symmetry_tables()
+    alias = sym.alias[R]
+    twins = np.flatnonzero((alias == alias[row[R]]) & (np.arange(len(alias)) != row[R]))
+    out = row.copy()
+    out[R] = twins[0]
+    return out
+
+
+def test_every_parallelogram_shape_has_two_placements():
+    alias = get_symmetry_tables().alias[R]
+    counts = np.bincount(alias)
+    assert set(counts[counts > 0]) == {2}
+    for p, a in enumerate(get_symmetry_tables().alias):
+        if p != R:
+            assert (a == np.arange(len(a))).all()
+
+
+def test_keys_unique_for_distinct_canonical_layouts():
+    sym = get_symmetry_tables()
+    rows = random_layouts(5000, 11).astype(np.int64)
+    for symmetries in (False, True):
+        canon = sym.canonical_indices(rows, symmetries)
+        keys = sym.keys(rows, symmetries)
+        distinct = len(np.unique(canon, axis=0))
+        assert len(np.unique(keys)) == distinct
+        # klucz zależy tylko od postaci kanonicznej
+        assert (sym.keys(canon, symmetries) == keys).all()
+
+
+def test_reflections_share_key():
+    sym = get_symmetry_tables()
+    rows = random_layouts(500, 12).astype(np.int64)
+    keys = sym.keys(rows)
+    for maps in sym.maps:
+        reflected = np.stack([maps[p][rows[:, p]] for p in range(len(PIECES))], axis=1)
+        assert (sym.keys(reflected) == keys).all()
+        # odbite ułożenie to wciąż inny obrazek
+        assert not (sym.keys(reflected, symmetries=False) == sym.keys(rows, symmetries=False)).all()
+
+
+def test_alias_is_same_board():
+    tables = get_tables()
+    row = random_layouts(1, 13)[0].astype(np.int64)
+    twin = _with_alias(row)
+    a, b = Board.from_indices(row, tables), Board.from_indices(twin, tables)
+    assert a != b
+    assert canonical_board(a, symmetries=False) == canonical_board(b, symmetries=False)
+    assert layout_key(a, symmetries=False) == layout_key(b, symmetries=False)
+    assert boards_equal(a, b)
+    assert not boards_equal(a, Board.from_indices(random_layouts(1, 14)[0], tables))
+
+
+def test_is_canonical_fraction():
+    sym = get_symmetry_tables()
+    rows = random_layouts(4000, 15).astype(np.int64)
+    share = sym.is_canonical(rows).mean()
+    assert 0.08 < share < 0.17          # ~1/8: 2 aliasy x 4 symetrie planszy
+
+
+def test_dedup_index():
+    tables = get_tables()
+    rows = random_layouts(300, 16).astype(np.int64)
+    index = DedupIndex()
+    assert index.add_many(rows).all()
+    assert not index.add_many(rows).any()
+    for row in rows[:50]:
+        assert not index.add(Board.from_indices(_with_alias(row), tables))
+
+    fresh = random_layouts(5000, 17)
+    added = [index.add(Board.from_indices(row, tables)) for row in fresh[:200]]
+    assert len(index) == 300 + sum(added)
+    assert all(Board.from_indices(row, tables) in index for row in fresh[:200])
+    mask = index.add_many(fresh)
+    assert not mask[:200].any()
+    assert len(index) == len(np.unique(get_symmetry_tables().keys(np.vstack([rows, fresh]))))
+
+
+def test_dedup_index_buffer_merges(monkeypatch):
+    import orapa.symmetry
+
+    monkeypatch.setattr(orapa.symmetry, "DEDUP_BUFFER", 7)
+    tables = get_tables()
+    rows = random_layouts(60, 18)
+    index = DedupIndex()
+    added = [index.add(Board.from_indices(row, tables)) for row in rows]
+    assert sum(added) == len(index) == len(np.unique(get_symmetry_tables().keys(rows)))
+    assert (index._keys[1:] > index._keys[:-1]).all()
+    assert not any(index.add(Board.from_indices(row, tables)) for row in rows)